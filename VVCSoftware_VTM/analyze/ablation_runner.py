@@ -1,7 +1,7 @@
 
 # ablation_runner.py
 # Run VTM ablations defined in a YAML file and compute BD-Rate vs. baseline.
-import argparse, os, subprocess, shlex, json
+import argparse, os, json
 from pathlib import Path
 
 try:
@@ -10,29 +10,32 @@ except Exception as e:
     raise SystemExit("PyYAML is required. Please install with: pip install pyyaml") from e
 
 from vtm_logparser import parse_log_for_metrics
+from vtm_summary import reset_summary, summary_args
+from run_archive import resolve
 from bdrate import bd_rate
+from vtm_runner import add_runner_args, cmdline, job_spec, limits_from_args, run_job
 
 def build_cmd(vtm_bin, cfg, seq, qp, overrides, out_dir):
     out_dir.mkdir(parents=True, exist_ok=True)
     bitstream = out_dir / f"{seq['name']}_QP{qp}.vvc"
     log_path  = out_dir / f"{seq['name']}_QP{qp}.log"
 
-    # Build override string: --Key=Value pairs
+    # Override flags: --Key=Value pairs
     # Keys are case-sensitive; they must match VTM cfg names
-    ov_flags = " ".join([f"--{k}={v}" for k,v in overrides.items()]) if overrides else ""
+    ov_flags = [f"--{k}={v}" for k, v in overrides.items()] if overrides else []
+    reset_summary(log_path)
 
-    cmd = (
-        f"{vtm_bin} -c {shlex.quote(cfg)} "
-        f"-i {shlex.quote(seq['path'])} -wdt {seq['w']} -hgt {seq['h']} "
-        f"-fr {seq.get('fr', 60)} -f {seq.get('frames', 64)} -q {qp} "
-        f"-b {shlex.quote(str(bitstream))} {ov_flags} "
-        f"> {shlex.quote(str(log_path))} 2>&1"
-    )
-    return cmd, bitstream, log_path
+    argv = [
+        str(vtm_bin), "-c", str(cfg),
+        "-i", str(seq['path']), "-wdt", str(seq['w']), "-hgt", str(seq['h']),
+        "-fr", str(seq.get('fr', 60)), "-f", str(seq.get('frames', 64)), "-q", str(qp),
+        "-b", str(bitstream),
+    ] + summary_args(log_path) + ov_flags
+    return argv, bitstream, log_path
 
-def run(cmd):
-    print("[RUN]", cmd)
-    return subprocess.call(cmd, shell=True)
+def run(argv, log_path, limits):
+    print("[RUN]", cmdline(argv))
+    return run_job(job_spec(argv, log_path, **limits))["retcode"]
 
 def main():
     ap = argparse.ArgumentParser()
@@ -40,7 +43,9 @@ def main():
     ap.add_argument("--dry", action="store_true", help="Print commands only")
     ap.add_argument("--profile", choices=["RA","AI","LDB","ALL"], default="ALL")
     ap.add_argument("--summary", default="ablation_summary.csv")
+    add_runner_args(ap)
     args = ap.parse_args()
+    limits = limits_from_args(args)
 
     cfg = yaml.safe_load(Path(args.yaml).read_text())
 
@@ -78,13 +83,15 @@ def main():
 
                 for qp in qps:
                     out_dir = out_root / prof_name / seq["name"] / exp_name / f"QP{qp}"
-                    cmd, bitstream, log_path = build_cmd(vtm_bin, cfg_file, seq, qp, overrides, out_dir)
-                    if not args.dry:
-                        rc = run(cmd)
+                    argv, bitstream, log_path = build_cmd(vtm_bin, cfg_file, seq, qp, overrides, out_dir)
+                    if args.dry:
+                        print("[DRY]", cmdline(argv))
+                    else:
+                        rc = run(argv, log_path, limits)
                         if rc != 0:
                             print(f"[WARN] Encoder returned {rc} for {exp_name} QP{qp} {seq['name']} {prof_name}")
                     # Parse log
-                    if log_path.exists():
+                    if resolve(log_path):
                         br, py = parse_log_for_metrics(str(log_path))
                     else:
                         br, py = None, None
@@ -0,0 +1,306 @@
+# bench_analysis.py
+# Benchmark phía phân tích: sinh corpus log giả (vtm_fake_encoder, format 23.11) ở quy mô 1k/10k/100k run rồi đo
+#   parse    : parse_vtm_log / parse_layer_summary (text trong RAM) + parse_log_metrics (đọc file + summary) -> MB/s, logs/s
+#   crawl    : iter_logs trên cây <group>/<exp>/<seq>/QP<qp>/ -> files/s
+#   collect  : win_collect_and_analyze_v4 end-to-end (subprocess) -> giây, logs/s
+#   bdrate   : bdrate.bd_rate, v4 bd_rate (numpy), bd_rate_2qp_linear -> cặp/s
+#   report   : excel_vtm_report.build_excel trên results.csv của corpus -> giây, rows/s
+#   orchestrate: orchestrate_vtm chạy N job fake encoder (max-parallel 1) so với chạy thẳng -> ms overhead/job
+# Kết quả append vào --history (JSON list), so với entry baseline gần nhất cùng scale + host (hoặc entry trước đó);
+# chậm hơn --threshold % -> REGRESSION (--fail-on-regression: exit 1, dùng được trong CI như bench_builds.py).
+#
+# Usage:
+#   python bench_analysis.py --scales 1k,10k --corpus-dir D:\bench_corpus --history bench_history.json
+#   python3 bench_analysis.py --scales 100k --only parse,crawl,bdrate --mark-baseline --label "after v4 regex fix"
+import argparse, csv, json, math, os, platform, random, subprocess, sys, tempfile, time
+from datetime import datetime
+from pathlib import Path
+
+import vtm_fake_encoder
+from run_archive import iter_logs, read_text
+from vtm_summary import summary_path_for
+
+HERE = Path(__file__).resolve().parent
+STAGES = ("parse", "crawl", "collect", "bdrate", "report", "orchestrate")
+RESOLUTIONS = [(416, 240, 50), (832, 480, 60), (1280, 720, 60), (1920, 1080, 50)]
+QPS = [22, 27, 32, 37]
+CSV_HEADER = ["group", "tool", "seq", "qp", "bitrate_kbps", "psnr_y", "psnr_u", "psnr_v", "psnr_yuv", "enc_time_s", "retcode"]
+
+def parse_scale(s):
+    s = s.strip().lower()
+    return int(float(s[:-1]) * 1000) if s.endswith("k") else int(s)
+
+# ------------------------- corpus -------------------------
+
+def corpus_plan(n_runs, seed):
+    # ~n_runs = n_seq * (1 baseline + n_exp) * 4 QP ; exp = 1..3 cờ FLAG_MODEL lệch CTC
+    n_seq = min(50, max(2, round(math.sqrt(n_runs / len(QPS)) / 2)))
+    n_cfg = max(2, math.ceil(n_runs / len(QPS) / n_seq))
+    seqs = []
+    for i in range(n_seq):
+        w, h, fps = RESOLUTIONS[i % len(RESOLUTIONS)]
+        seqs.append({"name": f"Synth{i:03d}_{w}x{h}_{fps}", "width": w, "height": h, "fps": fps})
+    rng = random.Random(seed)
+    flags = sorted(vtm_fake_encoder.FLAG_MODEL)
+    cfgs = [("baseline", "Baseline_Ref", [])]
+    for i in range(1, n_cfg):
+        picked = rng.sample(flags, rng.randint(1, 3))
+        args = [f"--{f}={'0' if vtm_fake_encoder.FLAG_MODEL[f][0] == '1' else '1'}" for f in picked]
+        cfgs.append(("perf_ablate", f"ABLATE_{i:04d}_" + "_".join(picked), args))
+    return seqs, cfgs
+
+def build_corpus(root, n_runs, frames, seed):
+    """root/logs/<group>/<exp>/<seq>/QP<qp>/<seq>_QP<qp>.log (+ .summary.txt) và root/results.csv; dùng lại nếu đã có."""
+    marker = root / "corpus.json"
+    meta = {"runs": n_runs, "frames": frames, "seed": seed, "version": vtm_fake_encoder.VERSION}
+    if marker.exists():
+        old = json.loads(marker.read_text(encoding="utf-8"))
+        if {k: old.get(k) for k in meta} == meta:
+            return old
+    seqs, cfgs = corpus_plan(n_runs, seed)
+    t0 = time.perf_counter()
+    logs, nbytes = root / "logs", 0
+    with open(root / "results.csv", "w", newline="", encoding="utf-8") as fcsv:
+        w = csv.writer(fcsv)
+        w.writerow(CSV_HEADER)
+        for group, exp, args in cfgs:
+            grp_dir = logs / ("baselines" if group == "baseline" else group) / exp
+            for seq in seqs:
+                for qp in QPS:
+                    d = grp_dir / seq["name"] / f"QP{qp}"
+                    d.mkdir(parents=True, exist_ok=True)
+                    log = d / f"{seq['name']}_QP{qp}.log"
+                    text, summ, s = vtm_fake_encoder.emulate(
+                        ["-i", f"{seq['name']}.yuv", "-wdt", str(seq["width"]), "-hgt", str(seq["height"]),
+                         "-fr", str(seq["fps"]), "-f", str(frames), "-q", str(qp), "--PrintHexPSNR=1",
+                         f"--FakeSeed={seed}"] + args)
+                    log.write_text(text, encoding="utf-8")
+                    summary_path_for(log).write_text(summ, encoding="utf-8")
+                    nbytes += len(text)
+                    w.writerow(["Baseline" if group == "baseline" else "Perf_Ablate", "" if group == "baseline" else exp,
+                                seq["name"], qp, f"{s['bitrate']:.6f}", s["y"], s["u"], s["v"], f"{s['yuv']:.6f}",
+                                f"{s['user_s']:.3f}", 0])
+        print(f"[corpus] {root}: {len(cfgs) * len(seqs) * len(QPS)} runs, {nbytes / 1e6:.1f} MB "
+              f"in {time.perf_counter() - t0:.1f}s")
+    meta.update({"actual_runs": len(cfgs) * len(seqs) * len(QPS), "n_seq": len(seqs), "n_cfg": len(cfgs),
+                 "log_bytes": nbytes})
+    marker.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return meta
+
+# ------------------------- stages -------------------------
+
+def timed(fn, items, min_time=0.0, passes=3):
+    # -> giây của lượt nhanh nhất qua items (>= passes lượt và >= min_time tổng) -> ít nhiễu hơn trung bình, như timeit
+    best, total, n = float("inf"), 0.0, 0
+    while n < passes or total < min_time:
+        t0 = time.perf_counter()
+        for it in items:
+            fn(it)
+        el = time.perf_counter() - t0
+        best, total, n = min(best, el), total + el, n + 1
+    return best
+
+def bench_parse(root, sample, min_time):
+    from orchestrate_vtm import parse_vtm_log
+    from win_collect_and_analyze_v4 import parse_layer_summary, parse_log_metrics
+    paths = sorted(iter_logs(root / "logs"))
+    step = max(1, len(paths) // sample) if sample else 1
+    paths = paths[::step]
+    texts = [read_text(p) for p in paths]
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    out = {"parse_logs": len(paths)}
+    for name, fn, items in [("parse_vtm_log", parse_vtm_log, texts),
+                            ("parse_layer_summary", parse_layer_summary, texts),
+                            ("parse_log_metrics", lambda p: parse_log_metrics(str(p), p.parent.parent.name, 30, with_time=True), paths)]:
+        sec = timed(fn, items, min_time)
+        out[f"{name}_mb_per_s"] = mb / sec
+        out[f"{name}_logs_per_s"] = len(items) / sec
+    return out
+
+def bench_crawl(root):
+    t0 = time.perf_counter()
+    n = sum(1 for _ in iter_logs(root / "logs"))
+    sec = time.perf_counter() - t0
+    return {"crawl_sec": sec, "crawl_files_per_s": n / sec}
+
+def bench_collect(root, meta):
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, str(HERE / "win_collect_and_analyze_v4.py"), "--root", str(root / "logs"),
+                        "--out", "summary.csv", "--overview", "overview.csv"], cwd=tmp, check=True,
+                       stdout=subprocess.DEVNULL)
+        sec = time.perf_counter() - t0
+    return {"collect_v4_sec": sec, "collect_v4_logs_per_s": meta["actual_runs"] / sec}
+
+def rd_pairs(root):
+    # [(R_ref, P_ref, R_test, P_test)] theo (tool, seq) từ results.csv, PSNR-Y
+    rd = {}
+    with open(root / "results.csv", newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            k = (r["tool"], r["seq"])
+            rd.setdefault(k, {})[int(r["qp"])] = (float(r["bitrate_kbps"]), float(r["psnr_y"]))
+    pairs = []
+    for (tool, seq), pts in rd.items():
+        ref = rd.get(("", seq))
+        if not tool or not ref: continue
+        qs = sorted(set(pts) & set(ref))
+        pairs.append(([ref[q][0] for q in qs], [ref[q][1] for q in qs], [pts[q][0] for q in qs], [pts[q][1] for q in qs]))
+    return pairs
+
+def bench_bdrate(root, min_time):
+    import bdrate
+    import win_collect_and_analyze_v4 as v4
+    pairs = rd_pairs(root)
+    out = {"bd_pairs": len(pairs)}
+    for name, fn in [("bdrate", bdrate.bd_rate), ("bdrate_v4", v4.bd_rate)]:
+        out[f"{name}_pairs_per_s"] = len(pairs) / timed(lambda p: fn(*p), pairs, min_time)
+    two = [tuple(x[1:3] for x in p) for p in pairs]  # QP 27/32
+    out["bdrate_2qp_pairs_per_s"] = len(two) / timed(lambda p: v4.bd_rate_2qp_linear(*p), two, min_time)
+    return out
+
+def bench_report(root, meta):
+    try:
+        import excel_vtm_report
+    except ImportError as e:
+        print(f"[bench] report: bỏ qua ({e})")
+        return {}
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        excel_vtm_report.build_excel(str(root / "results.csv"), str(Path(tmp) / "report.xlsx"), metric="psnr_yuv", raw_mode="sample")
+        sec = time.perf_counter() - t0
+    return {"report_sec": sec, "report_rows_per_s": meta["actual_runs"] / sec}
+
+def bench_orchestrate(n_jobs, frames, seed):
+    # cùng n_jobs lệnh fake encoder: qua orchestrate_vtm (max-parallel 1) vs subprocess.run trực tiếp
+    import yaml
+    fake = HERE / "vtm_fake_encoder.py"
+    if os.name == "nt" or not os.access(fake, os.X_OK):
+        print("[bench] orchestrate: cần vtm_fake_encoder.py chạy trực tiếp được (chmod +x, POSIX) -> bỏ qua")
+        return {}
+    seqs, cfgs = corpus_plan(n_jobs * 100, seed)
+    seqs = seqs[:1]
+    cfgs = cfgs[:max(2, math.ceil(n_jobs / len(QPS)))]
+    with tempfile.TemporaryDirectory() as tmp:
+        exp = {"vtm_bin": str(fake), "base_cfg": str(HERE.parent / "cfg" / "encoder_randomaccess_vtm.cfg"),
+               "output_dir": str(Path(tmp) / "out"), "qps": QPS, "fixed_args": [f"--FakeSeed={seed}"],
+               "sequences": [dict(s, yuv=f"{s['name']}.yuv", frames=frames) for s in seqs],
+               "baselines": [{"name": cfgs[0][1], "args": []}],
+               "perf_ablate": [{"name": n, "args": a} for _, n, a in cfgs[1:]]}
+        yp = Path(tmp) / "bench.yaml"
+        yp.write_text(yaml.safe_dump(exp), encoding="utf-8")
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, str(HERE / "orchestrate_vtm.py"), "--exp", str(yp), "--max-parallel", "1",
+                        "--no-recon"], cwd=tmp, check=True, stdout=subprocess.DEVNULL)
+        orch = time.perf_counter() - t0
+        with open(Path(tmp) / "out" / "results.csv", encoding="utf-8") as f:
+            jobs = sum(1 for _ in f) - 1
+        s = seqs[0]
+        # như --no-recon của orchestrate: không ghi recon, bitstream bỏ đi, mọi file phụ nằm trong tmp
+        t0, n_direct = time.perf_counter(), len(cfgs) * len(QPS)
+        for _, _, args in cfgs:
+            for qp in QPS:
+                subprocess.run([str(fake), "-c", exp["base_cfg"], "-i", f"{s['name']}.yuv", "-wdt", str(s["width"]),
+                                "-hgt", str(s["height"]), "-fr", str(s["fps"]), "-f", str(frames), "-q", str(qp),
+                                "-b", os.devnull, "-o", "", f"--FakeSeed={seed}"] + args,
+                               cwd=tmp, stdout=subprocess.DEVNULL, check=True)
+        direct = time.perf_counter() - t0
+    # orchestrate chạy baseline 1 lần/nhóm ablate -> so trung bình mỗi job, không so tổng
+    return {"orch_jobs": jobs, "orch_ms_per_job": orch / jobs * 1e3, "enc_direct_ms_per_job": direct / n_direct * 1e3,
+            "orch_overhead_ms_per_job": (orch / jobs - direct / n_direct) * 1e3}
+
+# ------------------------- history -------------------------
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def higher_is_better(key):
+    return "_per_s" in key
+
+def pick_reference(history, entry):
+    same = [h for h in history if h["scale"] == entry["scale"] and set(h["metrics"]) & set(entry["metrics"])]
+    for cands in ([h for h in same if h.get("baseline") and h["host"] == entry["host"]],
+                  [h for h in same if h["host"] == entry["host"]], [h for h in same if h.get("baseline")], same):
+        if cands:
+            return cands[-1]
+    return None
+
+def compare(ref, entry, threshold):
+    # -> số metric REGRESSION; chỉ so các metric tốc độ (*_per_s, *_sec, *_ms_per_job)
+    print(f"\n[scale {entry['scale']}] vs {ref['ts']} ({ref.get('git') or '?'}{', baseline' if ref.get('baseline') else ''}"
+          f"{', ' + ref['label'] if ref.get('label') else ''})")
+    print(f"  {'metric':36s} {'before':>12s} {'now':>12s} {'delta':>9s}")
+    bad = 0
+    for k, v in entry["metrics"].items():
+        old = ref["metrics"].get(k)
+        if old in (None, 0) or not any(t in k for t in ("_per_s", "_sec", "_ms_per_job")):
+            continue
+        d = (v - old) / abs(old) * 100.0
+        worse = -d if higher_is_better(k) else d
+        flag = "  REGRESSION" if worse > threshold else ""
+        bad += bool(flag)
+        print(f"  {k:36s} {old:12.3f} {v:12.3f} {d:+8.1f}%{flag}")
+    return bad
+
+# ------------------------- main -------------------------
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="1k,10k", help="Số run mỗi corpus, vd 1k,10k,100k")
+    ap.add_argument("--corpus-dir", default=str(Path(tempfile.gettempdir()) / "vtm_bench_corpus"),
+                    help="Corpus sinh 1 lần rồi dùng lại (<dir>/<scale>/)")
+    ap.add_argument("--only", default=",".join(STAGES), help=f"Stage cần chạy: {','.join(STAGES)}")
+    ap.add_argument("--frames", type=int, default=17, help="Frames mỗi log giả")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--parse-sample", type=int, default=20000, help="Số log tối đa cho stage parse (0 = tất cả)")
+    ap.add_argument("--min-time", type=float, default=0.5, help="Lặp parse/bdrate đến ít nhất N giây")
+    ap.add_argument("--orch-jobs", type=int, default=40)
+    ap.add_argument("--history", default=str(HERE / "bench_history.json"))
+    ap.add_argument("--label", default="")
+    ap.add_argument("--mark-baseline", action="store_true", help="Đánh dấu lần chạy này làm baseline để so các lần sau")
+    ap.add_argument("--threshold", type=float, default=10.0, help="%% chậm hơn coi là REGRESSION")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+
+    stages = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"stage không hợp lệ: {sorted(unknown)}")
+    hist_path = Path(args.history)
+    history = json.loads(hist_path.read_text(encoding="utf-8")) if hist_path.exists() else []
+
+    regressions = 0
+    for sc in args.scales.split(","):
+        n = parse_scale(sc)
+        root = Path(args.corpus_dir) / sc.strip()
+        root.mkdir(parents=True, exist_ok=True)
+        meta = build_corpus(root, n, args.frames, args.seed)
+        m = {}
+        if "parse" in stages: m.update(bench_parse(root, args.parse_sample, args.min_time))
+        if "crawl" in stages: m.update(bench_crawl(root))
+        if "collect" in stages: m.update(bench_collect(root, meta))
+        if "bdrate" in stages: m.update(bench_bdrate(root, args.min_time))
+        if "report" in stages: m.update(bench_report(root, meta))
+        if "orchestrate" in stages: m.update(bench_orchestrate(args.orch_jobs, args.frames, args.seed))
+        entry = {"ts": datetime.now().isoformat(timespec="seconds"), "host": platform.node(),
+                 "python": platform.python_version(), "git": git_rev(), "scale": n, "runs": meta["actual_runs"],
+                 "label": args.label, "baseline": args.mark_baseline, "metrics": m}
+        print(f"\n[scale {n}] {meta['actual_runs']} runs")
+        for k, v in m.items():
+            print(f"  {k:36s} {v:12.3f}" if isinstance(v, float) else f"  {k:36s} {v:12d}")
+        ref = pick_reference(history, entry)
+        if ref is not None:
+            regressions += compare(ref, entry, args.threshold)
+        history.append(entry)
+
+    hist_path.write_text(json.dumps(history, indent=1), encoding="utf-8")
+    print(f"\n[OK] history: {hist_path} ({len(history)} entries)")
+    if regressions:
+        print(f"[REGRESSION] {regressions} metric chậm hơn {args.threshold}%")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
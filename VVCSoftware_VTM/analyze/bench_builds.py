@@ -0,0 +1,174 @@
+# bench_builds.py
+# Performance gate for a rebuilt EncoderApp: run build A (reference) and build B (candidate)
+# interleaved on a fixed sequence/QP suite under the same core pinning, then report
+#   - bitstream identity per (seq, QP) (md5) or the BD-Rate delta of B vs A,
+#   - per-sequence speed ratio B/A with a bootstrap confidence interval,
+#   - REGRESSION flags beyond the thresholds (exit code 1 -> usable in CI).
+#
+# Usage:
+#   python bench_builds.py --suite bench_suite.yaml --bin-a ./EncoderApp_old --bin-b ./EncoderApp_new ^
+#       --repeats 3 --cores 2-9 --out-dir bench_out
+import argparse, csv, hashlib, json, math, queue, sys
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yaml
+
+import timing_harness
+from run_archive import read_text
+from orchestrate_vtm import build_cmd, parse_vtm_log
+from bdrate import bd_rate
+from win_collect_and_analyze_v4 import bd_rate_2qp_linear
+from vtm_runner import add_runner_args, job_spec, limits_from_args, run_job
+
+def md5_file(p: Path):
+    if not p.exists(): return ""
+    h = hashlib.md5()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def plan(suite, bins, repeats, out_dir):
+    # block = (seq, qp) -> [A, B]; timing_harness đảo thứ tự mỗi lần lặp (ABBA)
+    blocks = []
+    for seq in suite["sequences"]:
+        for qp in suite["qps"]:
+            blocks.append([{"build": b, "seq": seq, "qp": qp} for b in ("A", "B")])
+    jobs = []
+    for rep, j in timing_harness.interleave_repeats(blocks, repeats):
+        tag = f"{j['build']}_r{rep}"
+        job_dir = out_dir / f"{tag}_{j['seq']['name']}_QP{j['qp']}"
+        extra = [f"--BitstreamFile={job_dir / 'str.bin'}"]
+        exp = {**suite, "vtm_bin": bins[j["build"]]}
+        cmd, log_path = build_cmd(exp, j["seq"], j["qp"], extra, out_dir, tag, no_recon=True)
+        jobs.append({**j, "rep": rep, "cmd": cmd, "log": log_path, "bitstream": job_dir / "str.bin"})
+    return jobs
+
+def bench_job(job, cores, limits):
+    # vtm_runner: pin core, nice/cgroup, timeout kill cả process group (không để encoder mồ côi)
+    core = cores.get() if cores is not None else None
+    try:
+        res = run_job(job_spec(job["cmd"], job["log"], core=core, **limits))
+    finally:
+        if core is not None:
+            cores.put(core)
+    wall = res["wall_s"] or 0.0
+    text = read_text(job["log"])
+    br, py, pu, pv, pyuv, tenc = parse_vtm_log(text, job["log"])
+    return {"build": job["build"], "seq": job["seq"]["name"], "qp": job["qp"], "rep": job["rep"], "core": core,
+            "retcode": res["retcode"], "status": res["status"], "bitrate_kbps": br, "psnr_y": py, "psnr_yuv": pyuv,
+            "enc_time_s": tenc if tenc == tenc else wall, "wall_s": wall,
+            "md5": md5_file(job["bitstream"]) if job["rep"] == 0 else ""}
+
+def bd_delta(ra, rb, metric):
+    qps = sorted(set(ra) & set(rb))
+    R1 = [ra[q]["bitrate_kbps"] for q in qps]; P1 = [ra[q][metric] for q in qps]
+    R2 = [rb[q]["bitrate_kbps"] for q in qps]; P2 = [rb[q][metric] for q in qps]
+    if len(qps) >= 3:
+        return bd_rate(R1, P1, R2, P2)
+    if len(qps) == 2:
+        return bd_rate_2qp_linear(R1, P1, R2, P2)
+    return None
+
+def analyze(rows, speed_thr=3.0, bd_thr=0.1, metric="psnr_y", level=0.95):
+    ok = [r for r in rows if r["retcode"] == 0]
+    by = defaultdict(dict)          # (build, seq, rep) -> {qp: row}
+    for r in ok:
+        by[(r["build"], r["seq"], r["rep"])][r["qp"]] = r
+    seqs = sorted({r["seq"] for r in rows})
+    out = []
+    for seq in seqs:
+        reps = sorted({k[2] for k in by if k[1] == seq})
+        ra0, rb0 = by.get(("A", seq, 0), {}), by.get(("B", seq, 0), {})
+        common = sorted(set(ra0) & set(rb0))
+        identical = bool(common) and all(ra0[q]["md5"] and ra0[q]["md5"] == rb0[q]["md5"] for q in common)
+        bd = 0.0 if identical else None
+        if not identical:
+            try: bd = bd_delta(ra0, rb0, metric)
+            except Exception: bd = None
+        # cặp (rep, qp) chạy xen kẽ nhau -> log ratio B/A
+        logr = []
+        for rep in reps:
+            ra, rb = by.get(("A", seq, rep), {}), by.get(("B", seq, rep), {})
+            for q in set(ra) & set(rb):
+                if ra[q]["enc_time_s"] > 0 and rb[q]["enc_time_s"] > 0:
+                    logr.append(math.log(rb[q]["enc_time_s"] / ra[q]["enc_time_s"]))
+        ratio, lo, hi = timing_harness.bootstrap_ratio_ci(logr, level)
+        flags = []
+        if lo == lo and lo > 1.0 + speed_thr / 100.0: flags.append("SLOWER")
+        if hi == hi and hi < 1.0 - speed_thr / 100.0: flags.append("FASTER")
+        if bd is not None and bd > bd_thr: flags.append("BD_REGRESSION")
+        if common and not identical: flags.append("BITSTREAM_CHANGED")
+        # mọi repeat lỗi (không chỉ rep 0) -> median/CI thiếu cặp, không được coi là đạt
+        n_failed = sum(1 for r in rows if r["seq"] == seq and r["retcode"] != 0)
+        if n_failed or len(common) < len(set(ra0) | set(rb0)) or not common: flags.append("MISSING_RUNS")
+        out.append({"seq": seq, "n_pairs": len(logr), "n_failed": n_failed, "qps_compared": ",".join(map(str, common)),
+                    "bitstreams_identical": identical, "bd_rate_B_vs_A": bd,
+                    "speed_ratio_B_over_A": ratio, "ci_lo": lo, "ci_hi": hi,
+                    "flags": "|".join(flags), "regression": any(f in flags for f in ("SLOWER", "BD_REGRESSION", "MISSING_RUNS"))})
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--suite", required=True, help="YAML: base_cfg, qps, fixed_args, sequences (như experiment YAML)")
+    ap.add_argument("--bin-a", required=True, help="EncoderApp tham chiếu (build đang deploy)")
+    ap.add_argument("--bin-b", required=True, help="EncoderApp ứng viên (build mới)")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--cores", default="", help="Core isolated để pin, vd 2-9 (mỗi job 1 core); trống = không pin")
+    ap.add_argument("--workers", type=int, default=0, help="Mặc định = số core pin (hoặc 2)")
+    ap.add_argument("--speed-threshold", type=float, default=3.0, help="%% chậm hơn (CI dưới) để báo REGRESSION")
+    ap.add_argument("--bd-threshold", type=float, default=0.1, help="BD-Rate %% tăng để báo REGRESSION")
+    ap.add_argument("--metric", default="psnr_y", choices=["psnr_y", "psnr_yuv"])
+    ap.add_argument("--out-dir", default="bench_out")
+    add_runner_args(ap)
+    args = ap.parse_args()
+    limits = limits_from_args(args)
+
+    suite = yaml.safe_load(Path(args.suite).read_text(encoding="utf-8"))
+    suite.setdefault("fixed_args", []); suite.setdefault("qps", [37, 32, 27, 22])
+    out_dir = Path(args.out_dir).expanduser().resolve(); out_dir.mkdir(parents=True, exist_ok=True)
+
+    cores = timing_harness.usable_cores(timing_harness.parse_cores(args.cores))
+    pool = None
+    if cores:
+        pool = queue.Queue()
+        for c in cores: pool.put(c)
+    workers = args.workers or (len(cores) if cores else 2)
+
+    jobs = plan(suite, {"A": args.bin_a, "B": args.bin_b}, args.repeats, out_dir)
+    print(f"[INFO] bench: {len(jobs)} runs, repeats={args.repeats}, cores={cores or 'unpinned'}, workers={workers}")
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(bench_job, j, pool, limits) for j in jobs]
+        for fut in as_completed(futs):
+            r = fut.result(); rows.append(r)
+            print(f"[{r['status']:>7}] {r['build']} r{r['rep']} {r['seq']} QP{r['qp']} {r['enc_time_s']:.1f}s")
+
+    if not rows:
+        print("[FAIL] no runs planned (suite has no sequences/qps?)")
+        sys.exit(2)
+    with open(out_dir / "bench_runs.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys())); w.writeheader(); [w.writerow(r) for r in rows]
+    report = analyze(rows, args.speed_threshold, args.bd_threshold, args.metric)
+    if not report:
+        print("[FAIL] nothing to compare -> see", out_dir / "bench_runs.csv")
+        sys.exit(2)
+    with open(out_dir / "bench_report.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(report[0].keys())); w.writeheader(); [w.writerow(r) for r in report]
+    meta = {"bin_a": args.bin_a, "bin_b": args.bin_b, "suite": args.suite, "repeats": args.repeats, "cores": cores,
+            "speed_threshold_pct": args.speed_threshold, "bd_threshold_pct": args.bd_threshold,
+            "regressions": [r["seq"] for r in report if r["regression"]]}
+    (out_dir / "bench_report.json").write_text(json.dumps({"meta": meta, "sequences": report}, indent=2), encoding="utf-8")
+
+    for r in report:
+        print(f"{r['seq']:32s} ratio={r['speed_ratio_B_over_A']:.3f} [{r['ci_lo']:.3f},{r['ci_hi']:.3f}] "
+              f"bd={r['bd_rate_B_vs_A']} {r['flags']}")
+    if meta["regressions"]:
+        print("[FAIL] regressions:", ", ".join(meta["regressions"]))
+        sys.exit(1)
+    print("[OK] no regression ->", out_dir / "bench_report.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# decode_verify.py
+# Post-encode stage: run DecoderApp on every produced bitstream (pinned worker pool), check the
+# decoded picture hash SEI (encode with --SEIDecodedPictureHash=1, CTC cfg has it off) and record
+# decode time + rusage (user/sys CPU, peak RSS) per run -> decode.csv next to the runs CSV.
+#
+# Usage:
+#   python decode_verify.py --runs runs_out_ablation\results.csv --dec-bin ..\bin\DecoderApp.exe --workers 16
+#   python decode_verify.py --runs collected_runs_snapshot.csv --dec-bin ./DecoderApp --cores 2-9
+#   (orchestrate_vtm --decode <DecoderApp> chạy bước này ngay sau mỗi encode)
+import argparse, csv, math, os, queue, re, subprocess, threading, time
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import timing_harness
+from vtm_poc_profile import load_runs, GROUP_ANCHOR
+from vvc_nal_scan import bitstream_for
+from run_archive import materialize, read_text
+
+# POC    8 LId:  0 TId: 2 ( TRAIL, B-SLICE, QP 23 ) [DT  0.012] [L0 ...] [L1 ...] [MD5:1c2d...,(OK)]
+DEC_POC_LINE = re.compile(r'^POC\s+(-?\d+)\s+LId:\s*\d+\s+TId:\s*(\d+).*?\[DT\s+([0-9.]+)\s*\]', re.M)
+HASH_STATUS  = re.compile(r'\[(MD5|CRC|Checksum)?:[0-9a-fA-F,]*\((OK|unk|\*\*\*ERROR\*\*\*)\)\]')
+DEC_TOTAL    = re.compile(r'Total Time:\s+([0-9.]+)\s+sec\.')
+DEC_MISMATCH = "***ERROR*** A decoding mismatch occured"
+
+DECODE_FIELDS = ["group", "experiment", "sequence", "qp", "bitstream", "status", "pics", "hash_type", "hash_ok",
+                 "hash_err", "hash_unk", "dec_time_s", "dt_sum_s", "wall_s", "user_s", "sys_s", "maxrss_kb",
+                 "core", "retcode"]
+
+def parse_dec_log(text):
+    pocs = DEC_POC_LINE.findall(text)
+    hs = HASH_STATUS.findall(text)
+    ok = sum(1 for _, s in hs if s == "OK"); err = sum(1 for _, s in hs if s != "OK" and s != "unk")
+    unk = sum(1 for _, s in hs if s == "unk")
+    m = DEC_TOTAL.search(text)
+    return {"pics": len(pocs), "hash_type": next((t for t, _ in hs if t), ""),
+            "hash_ok": ok, "hash_err": err, "hash_unk": unk,
+            "dec_time_s": float(m.group(1)) if m else None,
+            "dt_sum_s": sum(float(d) for _, _, d in pocs),
+            "mismatch": err > 0 or DEC_MISMATCH in text}
+
+def decode_status(p, retcode):
+    if p["mismatch"]: return "HASH_MISMATCH"
+    if retcode != 0: return "DEC_FAIL" if retcode != "TIMEOUT" else "TIMEOUT"
+    if p["pics"] == 0: return "NO_PICTURES"
+    if p["hash_ok"] == p["pics"]: return "HASH_OK"
+    if p["hash_ok"] == 0: return "NO_HASH"        # encode thiếu --SEIDecodedPictureHash=1
+    return "HASH_PARTIAL"
+
+def _wait_rusage(p, timeout):
+    """wait() that also returns (user_s, sys_s, maxrss_kb); Linux wait4, else psutil best effort."""
+    killer, fired = None, []
+    if timeout:
+        killer = threading.Timer(timeout, lambda: (fired.append(1), p.kill())); killer.start()
+    try:
+        if hasattr(os, "wait4"):
+            _, status, ru = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+            rusage = (ru.ru_utime, ru.ru_stime, ru.ru_maxrss)
+        else:
+            rusage = (None, None, None)
+            try:
+                import psutil
+                pp = psutil.Process(p.pid); mem = 0
+                while p.poll() is None:
+                    try:
+                        ct = pp.cpu_times(); mem = max(mem, pp.memory_info().peak_wset // 1024)
+                        rusage = (ct.user, ct.system, mem)
+                    except Exception:
+                        pass
+                    time.sleep(0.2)
+            except ImportError:
+                pass
+            p.wait()
+    finally:
+        if killer is not None: killer.cancel()
+    return ("TIMEOUT" if fired else p.returncode), rusage
+
+def decode_one(dec_bin, bitstream, log_path, core=None, timeout=0, extra=None):
+    """Run DecoderApp on one bitstream (no YUV output) and return the decode record fields."""
+    with materialize(bitstream) as bs, open(log_path, "wb") as logf:  # .vvc.xz (run_archive) -> file tạm
+        cmd = [str(dec_bin), "-b", str(bs), "-d", "0"] + list(extra or [])
+        t0 = time.time()
+        p = subprocess.Popen(cmd, stdout=logf, stderr=subprocess.STDOUT, preexec_fn=timing_harness.pin_preexec(core))
+        timing_harness.pin_pid(p.pid, core)
+        rc, (ut, st, rss) = _wait_rusage(p, timeout)
+        wall = time.time() - t0
+    parsed = parse_dec_log(read_text(Path(log_path)))
+    return {"bitstream": str(bitstream), "status": decode_status(parsed, rc),
+            **{k: v for k, v in parsed.items() if k != "mismatch"},
+            "wall_s": wall, "user_s": ut, "sys_s": st, "maxrss_kb": rss, "core": core, "retcode": rc}
+
+def verify_runs(runs_csv, dec_bin, workers=0, cores=None, timeout=0):
+    runs = load_runs(runs_csv)
+    pool = None
+    if cores:
+        pool = queue.Queue()
+        for c in cores: pool.put(c)
+    workers = workers or (len(cores) if cores else max(1, (os.cpu_count() or 2) // 2))
+
+    def job(r, bs):
+        core = pool.get() if pool is not None else None
+        try:
+            rec = decode_one(dec_bin, bs, Path(r["log"]).parent / "dec.log", core, timeout)
+        finally:
+            if core is not None: pool.put(core)
+        return {"group": r["group"], "experiment": r["experiment"], "sequence": r["sequence"], "qp": r["qp"], **rec}
+
+    rows, missing = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = []
+        for r in runs:
+            bs = bitstream_for(r["log"]) if r["log"] else None
+            if bs is None:
+                missing += 1; continue
+            futs.append(ex.submit(job, r, bs))
+        for fut in as_completed(futs):
+            rec = fut.result(); rows.append(rec)
+            print(f"[{rec['status']:13s}] {rec['group']} | {rec['experiment']} | {rec['sequence']} | QP{rec['qp']} "
+                  f"dec={rec['dec_time_s']}s")
+    return rows, missing
+
+def write_decode_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=DECODE_FIELDS, extrasaction="ignore"); w.writeheader(); [w.writerow(r) for r in rows]
+
+def per_tool_summary(rows):
+    # decode time / tool so với anchor của group trên cùng (sequence, qp): trung bình hình học của tỉ số
+    t = {(r["group"], r["experiment"], r["sequence"], r["qp"]): r["dec_time_s"] for r in rows
+         if r["status"] in ("HASH_OK", "NO_HASH", "HASH_PARTIAL") and r["dec_time_s"]}
+    acc = defaultdict(list)
+    for (g, e, s, q), v in t.items():
+        if g == "baseline": continue
+        ref = t.get(("baseline", GROUP_ANCHOR.get(g.lower(), "Baseline_Ref"), s, q))
+        if ref: acc[(g, e)].append(math.log(v / ref))
+    return [{"group": g, "experiment": e, "n_runs": len(l), "dec_time_ratio": math.exp(sum(l) / len(l))}
+            for (g, e), l in sorted(acc.items())]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", required=True, help="Per-run CSV (results.csv / collected_runs_snapshot.csv / quickfire_runs.csv)")
+    ap.add_argument("--dec-bin", required=True, help="DecoderApp")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--cores", default="", help="Pin mỗi decode vào 1 core, vd 2-9")
+    ap.add_argument("--timeout-sec", type=int, default=0)
+    ap.add_argument("--out", default=None, help="Mặc định decode.csv cạnh --runs")
+    args = ap.parse_args()
+
+    cores = timing_harness.usable_cores(timing_harness.parse_cores(args.cores))
+    rows, missing = verify_runs(args.runs, args.dec_bin, args.workers, cores, args.timeout_sec)
+    out = Path(args.out) if args.out else Path(args.runs).parent / "decode.csv"
+    write_decode_csv(out, rows)
+    summ = per_tool_summary(rows)
+    if summ:
+        with open(out.with_name(out.stem + "_tools.csv"), "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=["group", "experiment", "n_runs", "dec_time_ratio"]); w.writeheader(); [w.writerow(r) for r in summ]
+    bad = [r for r in rows if r["status"] not in ("HASH_OK", "NO_HASH")]
+    nohash = sum(1 for r in rows if r["status"] == "NO_HASH")
+    print(f"[OK] {len(rows)} decoded ({missing} runs without bitstream), {len(bad)} failed, "
+          f"{nohash} without hash SEI -> {out}")
+    if nohash:
+        print("[hint] encode với --SEIDecodedPictureHash=1 để kiểm tra MD5")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 # efficiency_report_v1.py
 # Read quickfire_* CSV -> compute "benefit when ON" per tool -> rank -> suggest two combos -> export flags & YAML skeleton.
-import csv, argparse, re, statistics
+# Speed groups: join BD-Rate với encode time (runs CSV / log) -> ΔTime vs ΔBD-Rate -> speed preset.
+import csv, argparse, re
 from collections import defaultdict, OrderedDict
 from pathlib import Path   # <== thêm dòng này
+import numpy as np
+
+from vtm_logparser_win import parse_log_for_time
+from run_archive import resolve
 
 
 # ---- map experiment name -> CLI flags (sửa theo tên của bạn nếu khác) ----
@@ -40,8 +45,23 @@ FLAG_MAP = {
   "ABLATE_CIIP": ["--CIIP=1"],
   "ABLATE_GEO": ["--Geo=1"],
   "ABLATE_Affine_AMVR": ["--Affine=1","--AffineAmvr=1"],
+
+  # speed_add (enable from Baseline_Min) / speed_ablate (off vs Baseline_Ref) -> fast tool ON
+  "ADD_FastSearch": ["--FastSearch=1"],
+  "ADD_FDM": ["--FDM=1"],
+  "ADD_FEN": ["--FEN=1"],
+  "ADD_LCTUFast": ["--LCTUFast=1"],
+  "ADD_FastMrg": ["--FastMrg=1"],
+  "ABLATE_FastSearch": ["--FastSearch=1","--ASR=1"],
+  "ABLATE_FDM": ["--FDM=1"],
+  "ABLATE_FEN": ["--FEN=1"],
+  "ABLATE_LCTUFast": ["--LCTUFast=1"],
+  "ABLATE_FastMrg": ["--FastMrg=1"],
 }
 
+# anchor mặc định của từng speed group (khớp group2anchor trong win_collect_and_analyze_v4)
+SPEED_GROUP_ANCHOR = {"speed_add": "Baseline_Min", "speed_ablate": "Baseline_Ref"}
+
 # parse resolution from sequence name "..._1920x1080_60"
 def parse_res(seq):
     m = re.search(r'_(\d+)x(\d+)_', seq)
@@ -62,10 +82,28 @@ def read_summary(path):
               "experiment": r["experiment"],
               "sequence": r["sequence"],
               "bd": bd,
+              "anchor": r.get("anchor",""),
               "status": r.get("status",""),
             })
     return rows
 
+def read_runs(path):
+    # per-run CSV (collected_runs_snapshot.csv / quickfire_runs.csv); thiếu enc_time_s -> đọc lại từ log
+    rows = []
+    if not path or not Path(path).exists(): return rows
+    with open(path, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            try: qp = int(float(r["qp"]))
+            except: continue
+            try: t = float(r["enc_time_s"]) if r.get("enc_time_s") else None
+            except: t = None
+            if t is None and r.get("log") and resolve(r["log"]):
+                try: t = parse_log_for_time(r["log"])
+                except Exception: t = None
+            rows.append({"group": r["group"], "experiment": r["experiment"], "sequence": r["sequence"],
+                         "qp": qp, "enc_time_s": t})
+    return rows
+
 def per_sequence_benefit(rows):
     # Convert BD-rate to "benefit when ON"
     benefits = []  # dicts: group,experiment,sequence,benefit
@@ -80,68 +118,164 @@ def per_sequence_benefit(rows):
         benefits.append({"group":r["group"],"experiment":r["experiment"],"sequence":r["sequence"],"benefit":ben})
     return benefits
 
-def aggregate_tool(benefits):
-    tool2seq = defaultdict(dict)
+def benefit_matrix(benefits):
+    """
+    Build the tools x sequences benefit matrix.
+    Returns dict: tools=[(group,exp)...], seqs=[...], values (NaN where missing), mask (bool, True = measured).
+    """
+    tools, seqs = OrderedDict(), OrderedDict()
+    for b in benefits:
+        tools.setdefault((b["group"], b["experiment"]), len(tools))
+        seqs.setdefault(b["sequence"], len(seqs))
+    vals = np.full((len(tools), len(seqs)), np.nan)
     for b in benefits:
-        tool2seq[(b["group"], b["experiment"])][b["sequence"]] = b["benefit"]
+        if b["benefit"] is None: continue
+        vals[tools[(b["group"], b["experiment"])], seqs[b["sequence"]]] = b["benefit"]
+    return {"tools": list(tools), "seqs": list(seqs), "values": vals, "mask": ~np.isnan(vals)}
 
-    agg = []
-    for (grp,exp), m in tool2seq.items():
-        vals = [v for v in m.values() if v is not None]
-        if not vals: continue
-        mean = sum(vals)/len(vals)
-        med  = statistics.median(vals)
-        pos  = sum(1 for v in vals if v>0)/len(vals)
-        std  = statistics.pstdev(vals) if len(vals)>1 else 0.0
-        agg.append({
+def aggregate_tool(bm):
+    V, W = bm["values"], bm["mask"]
+    n = W.sum(axis=1)
+    keep = n > 0
+    if not keep.any(): return []
+    V, W, n = V[keep], W[keep], n[keep]
+    tools = [t for t, k in zip(bm["tools"], keep) if k]
+    mean = np.nanmean(V, axis=1)
+    med  = np.nanmedian(V, axis=1)
+    std  = np.where(n > 1, np.nanstd(V, axis=1), 0.0)   # population std như statistics.pstdev
+    pos  = (np.where(W, V, 0.0) > 0).sum(axis=1) / n
+    agg = [{
             "group": grp, "experiment": exp,
-            "mean_benefit": mean, "median_benefit": med, "std": std,
-            "stability_ratio": pos, "n_sequences": len(vals)
-        })
+            "mean_benefit": float(mean[i]), "median_benefit": float(med[i]), "std": float(std[i]),
+            "stability_ratio": float(pos[i]), "n_sequences": int(n[i])
+        } for i, (grp, exp) in enumerate(tools)]
     return sorted(agg, key=lambda r: (-r["mean_benefit"], -r["stability_ratio"], -r["median_benefit"]))
 
-def per_class_breakdown(benefits):
-    # returns {(group,exp,cls): [benefits...]}
-    d = defaultdict(list)
-    for b in benefits:
-        _,_,cls = parse_res(b["sequence"])
-        cls = cls or "U"
-        d[(b["group"], b["experiment"], cls)].append(b["benefit"])
+def per_class_breakdown(bm):
+    # class buckets theo độ phân giải -> mean của các cột thuộc class, per tool
+    if not bm["tools"] or not bm["seqs"]:
+        return []  # sweep chỉ có speed groups: không có benefit perf nào
+    V, W = bm["values"], bm["mask"]
+    cls_of = np.array([parse_res(s)[2] or "U" for s in bm["seqs"]])
+    classes = list(OrderedDict.fromkeys(cls_of))
+    n = np.stack([W[:, cls_of == c].sum(axis=1) for c in classes], axis=1)
+    tot = np.stack([np.where(W[:, cls_of == c], V[:, cls_of == c], 0.0).sum(axis=1) for c in classes], axis=1)
     rows=[]
-    for (g,e,c), arr in d.items():
-        rows.append({"group":g,"experiment":e,"class":c,
-                     "mean": sum(arr)/len(arr), "n": len(arr)})
+    for i, (g, e) in enumerate(bm["tools"]):  # tool-major như trước khi chuyển sang ma trận
+        for k, c in enumerate(classes):
+            if n[i, k]:
+                rows.append({"group":g,"experiment":e,"class":c,
+                             "mean": float(tot[i, k]/n[i, k]), "n": int(n[i, k])})
     return rows
 
-def corr_pairs(benefits):
-    # pairwise corr across sequences between tools (same group or across groups)
-    # build sequence-aligned vectors
-    tool2seq = defaultdict(dict)
-    for b in benefits:
-        tool2seq[(b["group"], b["experiment"])][b["sequence"]] = b["benefit"]
+def pairwise_corr(bm):
+    """
+    Pearson correlation over pairwise-complete sequences, vectorised for all tool pairs.
+    Returns (corr, n_common) as (T x T) arrays.
+    """
+    if not bm["tools"] or not bm["seqs"]:
+        T = len(bm["tools"])
+        return np.full((T, T), np.nan), np.zeros((T, T), int)
+    W = bm["mask"].astype(float)
+    X = np.where(bm["mask"], bm["values"], 0.0)
+    n   = W @ W.T
+    sx  = X @ W.T               # sum x_i over seqs where both i,j measured
+    sy  = sx.T
+    sxx = (X*X) @ W.T
+    syy = sxx.T
+    sxy = X @ X.T
+    num = n*sxy - sx*sy
+    den = np.sqrt(np.maximum(1e-12, (n*sxx - sx*sx) * (n*syy - sy*sy)))
+    return num/den, n.astype(int)
 
-    tools = list(tool2seq.keys())
+def overlap_subset(n_common, min_seq=3):
+    """
+    Greedy largest set of tools whose every pair shares >= min_seq sequences:
+    repeatedly drop the tool with most short pairs (ties: fewest sequences).
+    """
+    idx = [i for i in range(n_common.shape[0]) if n_common[i, i] >= min_seq]
+    while idx:
+        bad = (n_common[np.ix_(idx, idx)] < min_seq).sum(axis=1)
+        if not bad.any():
+            break
+        worst = max(range(len(idx)), key=lambda k: (bad[k], -n_common[idx[k], idx[k]]))
+        idx.pop(worst)
+    return idx
+
+def partial_corr(corr, n_common, min_seq=3, max_cond=1e8):
+    """
+    Partial correlation (controlling for all other tools) from the precision matrix, on the largest subset of
+    tools that all overlap. Tools are added in order and kept only while C stays well-conditioned and
+    n_seq - n_tools >= 2, so a tool collinear with earlier ones (corr = 1, more tools than sequences) gets NaN
+    instead of a meaningless pinv sign.
+    """
+    T = corr.shape[0]
+    out = np.full((T, T), np.nan)
+    if T == 0:
+        return out
+    idx = []
+    for i in overlap_subset(n_common, min_seq):
+        sub = idx + [i]
+        if n_common[np.ix_(sub, sub)].min() - len(sub) < 2:
+            continue  # bậc tự do n - p < 2: partial corr chỉ còn là +-1 vô nghĩa
+        C = np.clip(corr[np.ix_(sub, sub)], -1.0, 1.0)
+        if np.isfinite(C).all() and np.linalg.cond(C) <= max_cond:
+            idx.append(i)
+    if len(idx) < 3:
+        return out
+    C = np.clip(corr[np.ix_(idx, idx)], -1.0, 1.0)
+    P = np.linalg.inv(C)
+    d = np.sqrt(np.maximum(1e-12, np.abs(np.diag(P))))
+    out[np.ix_(idx, idx)] = np.clip(-P / np.outer(d, d), -1.0, 1.0)
+    return out
+
+def cluster_tools(corr, n_common, thr=0.85, min_seq=3):
+    """
+    Average-linkage clustering on distance 1-|corr|; stops when no clusters are closer than 1-thr.
+    Returns an int label per tool.
+    """
+    T = corr.shape[0]
+    if T == 0:
+        return np.zeros(0, int)
+    D = np.where(n_common >= min_seq, 1.0 - np.abs(corr), np.inf)
+    np.fill_diagonal(D, np.inf)
+    size = np.ones(T)
+    labels = np.arange(T)
+    alive = np.ones(T, bool)
+    while alive.sum() > 1:
+        Da = np.where(alive[:,None] & alive[None,:], D, np.inf)
+        k = int(np.argmin(Da))
+        i, j = divmod(k, T)
+        if not (Da[i, j] <= 1.0 - thr): break
+        # merge j -> i (Lance-Williams, average linkage)
+        D[i, :] = (size[i]*D[i, :] + size[j]*D[j, :]) / (size[i] + size[j])
+        D[:, i] = D[i, :]; D[i, i] = np.inf
+        size[i] += size[j]; alive[j] = False
+        labels[labels == j] = i
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+def corr_pairs(bm, corr=None, n_common=None, pcorr=None, min_seq=3):
+    # pairwise corr across sequences between tools (same group or across groups)
+    if corr is None:
+        corr, n_common = pairwise_corr(bm)
+    if pcorr is None:
+        pcorr = partial_corr(corr, n_common, min_seq)
+    tools = bm["tools"]
+    iu, ju = np.triu_indices(len(tools), k=1)
+    sel = n_common[iu, ju] >= min_seq
+    iu, ju = iu[sel], ju[sel]
+    order = np.argsort(-np.abs(corr[iu, ju]), kind="stable")
     out=[]
-    import math
-    def pearson(x,y):
-        n=len(x); sx=sum(x); sy=sum(y); sxx=sum(v*v for v in x); syy=sum(v*v for v in y); sxy=sum(a*b for a,b in zip(x,y))
-        num = n*sxy - sx*sy
-        den = math.sqrt(max(1e-12,(n*sxx-sx*sx)*(n*syy-sy*sy)))
-        return num/den if den>0 else 0.0
-
-    for i in range(len(tools)):
-        for j in range(i+1,len(tools)):
-            t1, t2 = tools[i], tools[j]
-            s1, s2 = tool2seq[t1], tool2seq[t2]
-            common = sorted(set(s1.keys()) & set(s2.keys()))
-            if len(common) < 3: continue
-            x = [s1[s] for s in common]
-            y = [s2[s] for s in common]
-            out.append({"toolA_group":t1[0],"toolA":t1[1],"toolB_group":t2[0],"toolB":t2[1],
-                        "n_seq":len(common),"corr": pearson(x,y)})
-    return sorted(out, key=lambda r: -abs(r["corr"]))
-
-def classify_and_suggest(agg, corr_rows, thr_high=0.7, thr_med=0.4, stable_high=0.8, stable_med=0.6):
+    for i, j in zip(iu[order], ju[order]):
+        pc = pcorr[i, j]
+        out.append({"toolA_group":tools[i][0],"toolA":tools[i][1],"toolB_group":tools[j][0],"toolB":tools[j][1],
+                    "n_seq":int(n_common[i, j]),"corr": float(corr[i, j]),
+                    "partial_corr": None if np.isnan(pc) else float(pc)})
+    return out
+
+def classify_and_suggest(agg, bm, corr=None, n_common=None, thr_high=0.7, thr_med=0.4, stable_high=0.8, stable_med=0.6,
+                         thr_overlap=0.85, min_seq=3):
     # classify
     high=[]; med=[]; low=[]
     for r in agg:
@@ -155,22 +289,77 @@ def classify_and_suggest(agg, corr_rows, thr_high=0.7, thr_med=0.4, stable_high=
     conservative = high[:]  # High only
     aggressive   = high + med  # High + Medium
 
-    # prune highly overlapping (|corr|>0.85) in aggressive
-    # choose the one with higher mean_benefit
-    key2mean = {(r["group"], r["experiment"]): r["mean_benefit"] for r in aggressive}
-    pruned = set()
-    for c in corr_rows:
-        if abs(c["corr"]) < 0.85: continue
-        a=(c["toolA_group"], c["toolA"]); b=(c["toolB_group"], c["toolB"])
-        if a in key2mean and b in key2mean:
-            if key2mean[a] >= key2mean[b]:
-                pruned.add(b)
-            else:
-                pruned.add(a)
-    aggressive = [r for r in aggressive if (r["group"],r["experiment"]) not in pruned]
+    # prune highly overlapping (|corr|>thr_overlap) in aggressive, read straight from the matrix:
+    # với mỗi cặp trùng lặp, bỏ tool có mean_benefit thấp hơn
+    if corr is None:
+        corr, n_common = pairwise_corr(bm)
+    pos = {t: i for i, t in enumerate(bm["tools"])}
+    keys = [(r["group"], r["experiment"]) for r in aggressive]
+    idx  = np.array([pos[k] for k in keys], dtype=int)
+    if len(idx) > 1:
+        mean = np.array([r["mean_benefit"] for r in aggressive])
+        sub  = (np.abs(corr[np.ix_(idx, idx)]) >= thr_overlap) & (n_common[np.ix_(idx, idx)] >= min_seq)
+        sub  = np.triu(sub, k=1)
+        a, b = np.nonzero(sub)
+        loser = np.where(mean[a] >= mean[b], b, a)
+        pruned = np.zeros(len(idx), bool); pruned[loser] = True
+        aggressive = [r for r, p in zip(aggressive, pruned) if not p]
 
     return high, med, low, conservative, aggressive
 
+def speed_tradeoff(rows, runs, anchor_ref="Baseline_Ref", anchor_min="Baseline_Min"):
+    """
+    Per (speed tool, sequence): time ratio vs anchor (geo-mean over common QPs) joined with BD-Rate.
+    All numbers are "when the fast tool is ON": time_saving_pct > 0 = faster, bd_cost > 0 = BD-Rate loss.
+    """
+    names = {"Baseline_Ref": anchor_ref, "Baseline_Min": anchor_min}
+    times = defaultdict(dict)   # (group, exp, seq) -> {qp: t}
+    for r in runs:
+        if r["enc_time_s"] is None or r["enc_time_s"] <= 0: continue
+        times[(r["group"], r["experiment"], r["sequence"])][r["qp"]] = r["enc_time_s"]
+
+    per_seq = []
+    for r in rows:
+        if r["group"] not in SPEED_GROUP_ANCHOR or r["bd"] is None: continue
+        anchor = r["anchor"] or names[SPEED_GROUP_ANCHOR[r["group"]]]
+        t_test = times.get((r["group"], r["experiment"], r["sequence"]))
+        t_ref  = times.get(("baseline", anchor, r["sequence"]))
+        if not t_test or not t_ref: continue
+        common = sorted(set(t_test) & set(t_ref))
+        if not common: continue
+        ratio = float(np.exp(np.mean(np.log([t_test[q]/t_ref[q] for q in common]))))
+        if r["group"] == "speed_add":
+            on_ratio, cost = ratio, r["bd"]          # bật fast tool từ Baseline_Min
+        else:
+            on_ratio, cost = 1.0/ratio, -r["bd"]     # tắt fast tool từ Baseline_Ref -> đảo chiều
+        per_seq.append({"group": r["group"], "experiment": r["experiment"], "sequence": r["sequence"],
+                        "anchor": anchor, "qps_used": ",".join(map(str, common)),
+                        "time_ratio_on": on_ratio, "time_saving_pct": (1.0 - on_ratio)*100.0, "bd_cost": cost})
+
+    by_tool = defaultdict(list)
+    for p in per_seq:
+        by_tool[(p["group"], p["experiment"])].append(p)
+    agg = []
+    for (grp, exp), lst in by_tool.items():
+        gm = float(np.exp(np.mean(np.log([p["time_ratio_on"] for p in lst]))))
+        saving = (1.0 - gm)*100.0
+        cost = float(np.mean([p["bd_cost"] for p in lst]))
+        agg.append({"group": grp, "experiment": exp, "time_ratio_on": gm, "time_saving_pct": saving,
+                    "bd_cost": cost, "bd_per_pct_time": cost/saving if saving > 0 else None,
+                    "n_sequences": len(lst)})
+    # xếp hạng: tool tiết kiệm thời gian trước, BD-Rate cost / 1% thời gian tiết kiệm tăng dần
+    agg.sort(key=lambda r: (r["bd_per_pct_time"] is None,
+                            r["bd_per_pct_time"] if r["bd_per_pct_time"] is not None else 0.0,
+                            -r["time_saving_pct"]))
+    for i, r in enumerate(agg, start=1):
+        r["rank"] = i
+    return per_seq, agg
+
+def suggest_speed(speed_agg, min_saving=5.0, max_cost_per_pct=0.05):
+    return [r for r in speed_agg
+            if r["bd_per_pct_time"] is not None
+            and r["time_saving_pct"] >= min_saving and r["bd_per_pct_time"] <= max_cost_per_pct]
+
 def flags_from_combo(combo):
     flags=set()
     for r in combo:
@@ -189,30 +378,45 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--summary", default="quickfire_summary_from_logs.csv")
     ap.add_argument("--overview", default="quickfire_overview_from_logs.csv")
+    ap.add_argument("--runs", default="collected_runs_snapshot.csv", help="Per-run CSV có enc_time_s/log (cho speed groups)")
+    ap.add_argument("--anchor-ref-name", default="Baseline_Ref")
+    ap.add_argument("--anchor-min-name", default="Baseline_Min")
+    ap.add_argument("--speed_min_saving", type=float, default=5.0, help="%% thời gian tiết kiệm tối thiểu để vào speed preset")
+    ap.add_argument("--speed_max_cost", type=float, default=0.05, help="BD-Rate %% tối đa cho mỗi 1%% thời gian tiết kiệm")
     ap.add_argument("--out_dir", default="eff_report")
     ap.add_argument("--thr_high", type=float, default=0.7)
     ap.add_argument("--thr_med", type=float, default=0.4)
     ap.add_argument("--stable_high", type=float, default=0.8)
     ap.add_argument("--stable_med", type=float, default=0.6)
+    ap.add_argument("--thr_overlap", type=float, default=0.85, help="|corr| coi là trùng lặp (prune + cluster)")
     args = ap.parse_args()
 
     Path(args.out_dir).mkdir(parents=True, exist_ok=True)
 
     rows = read_summary(args.summary)
     ben  = per_sequence_benefit(rows)
-    agg  = aggregate_tool(ben)
-    cls  = per_class_breakdown(ben)
-    cor  = corr_pairs(ben)
+    bm   = benefit_matrix(ben)
+    agg  = aggregate_tool(bm)
+    cls  = per_class_breakdown(bm)
+    corr, n_common = pairwise_corr(bm)
+    pcorr = partial_corr(corr, n_common)
+    cor  = corr_pairs(bm, corr, n_common, pcorr)
+    labels = cluster_tools(corr, n_common, thr=args.thr_overlap)
+    clusters = [{"cluster": int(labels[i]), "group": g, "experiment": e, "n_sequences": int(bm["mask"][i].sum())}
+                for i, (g, e) in sorted(enumerate(bm["tools"]), key=lambda x: (labels[x[0]], x[1]))]
 
     write_csv(f"{args.out_dir}/tool_effects.csv", agg,
         header=["group","experiment","mean_benefit","median_benefit","std","stability_ratio","n_sequences"])
     write_csv(f"{args.out_dir}/per_class_breakdown.csv", cls,
         header=["group","experiment","class","mean","n"])
     write_csv(f"{args.out_dir}/pair_correlation.csv", cor,
-        header=["toolA_group","toolA","toolB_group","toolB","n_seq","corr"])
+        header=["toolA_group","toolA","toolB_group","toolB","n_seq","corr","partial_corr"])
+    write_csv(f"{args.out_dir}/tool_clusters.csv", clusters,
+        header=["cluster","group","experiment","n_sequences"])
 
     high, med, low, conservative, aggressive = classify_and_suggest(
-        agg, cor, args.thr_high, args.thr_med, args.stable_high, args.stable_med)
+        agg, bm, corr, n_common, args.thr_high, args.thr_med, args.stable_high, args.stable_med,
+        thr_overlap=args.thr_overlap)
 
     # Export flag lists
     cons_flags = flags_from_combo(conservative)
@@ -222,16 +426,31 @@ def main():
     with open(f"{args.out_dir}/eff_best_args_aggressive.txt","w",encoding="utf-8") as f:
         for fl in aggr_flags: f.write(fl+"\n")
 
+    # Speed groups: ΔTime vs ΔBD-Rate
+    sp_seq, sp_agg = speed_tradeoff(rows, read_runs(args.runs), args.anchor_ref_name, args.anchor_min_name)
+    write_csv(f"{args.out_dir}/speed_tradeoff_per_sequence.csv", sp_seq,
+        header=["group","experiment","sequence","anchor","qps_used","time_ratio_on","time_saving_pct","bd_cost"])
+    write_csv(f"{args.out_dir}/speed_tradeoff.csv", sp_agg,
+        header=["rank","group","experiment","time_ratio_on","time_saving_pct","bd_cost","bd_per_pct_time","n_sequences"])
+    speed_flags = flags_from_combo(suggest_speed(sp_agg, args.speed_min_saving, args.speed_max_cost))
+    with open(f"{args.out_dir}/eff_best_args_speed.txt","w",encoding="utf-8") as f:
+        for fl in speed_flags: f.write(fl+"\n")
+
     # Quick README for report
     with open(f"{args.out_dir}/README_report.md","w",encoding="utf-8") as f:
         f.write("# Efficiency Report (auto)\n\n")
         f.write("## Ranking (tool_effects.csv)\n")
         f.write("- mean_benefit = lợi ích khi bật tool (%% BD-Rate); stability_ratio = %% sequence cải thiện\n")
         f.write("## Per-class breakdown (per_class_breakdown.csv)\n")
-        f.write("## Pairwise correlation (pair_correlation.csv) — cảnh báo trùng lặp nếu |corr|>0.85\n")
+        f.write("## Pairwise correlation (pair_correlation.csv) — cảnh báo trùng lặp nếu |corr|>%.2f\n" % args.thr_overlap)
+        f.write("- partial_corr = tương quan sau khi loại ảnh hưởng của các tool còn lại\n")
+        f.write("## Tool clusters (tool_clusters.csv) — average-linkage trên 1-|corr|\n")
         f.write("## Suggested presets\n")
         f.write("- Conservative flags: eff_best_args_conservative.txt\n")
         f.write("- Aggressive flags:   eff_best_args_aggressive.txt\n")
+        f.write("## Speed trade-off (speed_tradeoff.csv, speed_tradeoff_per_sequence.csv)\n")
+        f.write("- time_saving_pct = %% thời gian giảm khi bật fast tool; bd_cost = %% BD-Rate mất; xếp theo bd_per_pct_time\n")
+        f.write("- Speed flags:        eff_best_args_speed.txt\n")
 
     print("[OK] Wrote:", args.out_dir)
 
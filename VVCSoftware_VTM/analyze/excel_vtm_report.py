@@ -6,12 +6,14 @@ excel_vtm_report.py
 - Chuẩn hoá dữ liệu, nhận diện Baseline: group=="Baseline" & tool trống/NaN
 - Tính BD-Rate (chuẩn poly bậc 3, fallback bậc 1 nếu chỉ có 2 điểm)
 - Xuất Excel gồm:
-  Raw, BD-Rate, BD_Missing, TimeTable, SpeedupTable, Time_vs_QP_All (column),
+  Raw, BD-Rate, BD_Missing, TimeTable, SpeedupTable, SpeedupStats (nếu có timing_summary.csv), Time_vs_QP_All (column),
   và mỗi SEQ_* có: RD curve (log-scale), Time line, Time column.
+- Ghi ở chế độ constant_memory của xlsxwriter (mỗi sheet flush theo dòng): làm sạch NaN/inf theo cột (vectorised),
+  writer cố định theo kiểu cột; Raw sheet > --raw-max-rows thì lấy mẫu đều (--raw sample) hoặc bỏ (--raw skip).
 Yêu cầu: pip install pandas numpy xlsxwriter
 """
 
-import sys
+import argparse
 from pathlib import Path
 import numpy as np
 import pandas as pd
@@ -99,34 +101,76 @@ def load_clean(csv_path):
     return df
 
 # -------- Excel writer --------
-def build_excel(csv_path, out_path, metric="psnr_yuv"):
+RAW_MODES = ("full", "sample", "skip")
+
+def _columns(df):
+    """
+    Per-column (values, kind) ready for the writer: numeric columns -> Python floats/ints with NaN/inf -> None
+    (one vectorised mask per column), everything else -> str with NaN -> None.
+    """
+    out = []
+    for c in df.columns:
+        s = df[c]
+        miss = s.isna().to_numpy()
+        if pd.api.types.is_bool_dtype(s):
+            v = s.to_numpy(dtype=object); v[miss] = None
+            out.append((v.tolist(), "bool"))
+        elif pd.api.types.is_integer_dtype(s):
+            out.append((s.tolist(), "number"))
+        elif pd.api.types.is_numeric_dtype(s):
+            a = s.to_numpy(dtype=float)
+            v = a.astype(object); v[~np.isfinite(a)] = None
+            out.append((v.tolist(), "number"))
+        else:
+            v = s.astype(str).to_numpy(dtype=object); v[miss] = None
+            out.append((v.tolist(), "string"))
+    return out
+
+def write_table(ws, df, header=None, row0=0):
+    """Header + rows of df, in row order (constant_memory); None cells are left blank. Returns the last row written."""
+    ws.write_row(row0, 0, list(df.columns) if header is None else header)
+    cols = _columns(df)
+    writers = [(j, vals, {"number": ws.write_number, "string": ws.write_string, "bool": ws.write_boolean}[kind])
+               for j, (vals, kind) in enumerate(cols)]
+    for i in range(len(df)):
+        r = row0 + 1 + i
+        for j, vals, fn in writers:
+            v = vals[i]
+            if v is not None:
+                fn(r, j, v)
+    return row0 + len(df)
+
+def _raw_rows(df, raw_mode, raw_max_rows):
+    if raw_mode == "skip" or (raw_max_rows <= 0 and raw_mode != "full"):
+        return None
+    if raw_mode == "full" or len(df) <= raw_max_rows:
+        return df
+    # lấy mẫu đều theo thứ tự gốc (giữ phân bố theo seq/tool/qp), không random
+    idx = np.linspace(0, len(df) - 1, raw_max_rows).round().astype(int)
+    return df.iloc[np.unique(idx)]
+
+def build_excel(csv_path, out_path, metric="psnr_yuv", raw_mode="sample", raw_max_rows=200_000):
     from xlsxwriter import Workbook
 
     df = load_clean(csv_path)
     if df.empty:
         raise SystemExit("CSV rỗng hoặc không hợp lệ.")
+    if raw_mode not in RAW_MODES:
+        raise ValueError(f"raw_mode must be one of {RAW_MODES}")
 
-    wb = Workbook(str(out_path), {'nan_inf_to_errors': True})
-
-    def safe(v):
-        # đổi NaN/inf → None để Excel không lỗi
-        try:
-            import math
-            if isinstance(v, float) and (math.isnan(v) or math.isinf(v)):
-                return None
-        except Exception:
-            pass
-        return v
+    # constant_memory: mỗi sheet ghi theo thứ tự dòng, dòng cũ được flush ra file tạm -> RAM không tăng theo số dòng
+    wb = Workbook(str(out_path), {'constant_memory': True, 'nan_inf_to_errors': True})
 
     # RAW
-    ws_raw = wb.add_worksheet("Raw")
-    for j, col in enumerate(df.columns): ws_raw.write(0, j, col)
-    for i, row in enumerate(df.itertuples(index=False), start=1):
-        ws_raw.write_row(i, 0, [safe(v) for v in row])
+    raw = _raw_rows(df, raw_mode, raw_max_rows)
+    if raw is not None:
+        ws_raw = wb.add_worksheet("Raw")
+        last = write_table(ws_raw, raw)
+        if len(raw) < len(df):
+            ws_raw.write_string(last + 2, 0, f"sampled {len(raw)} of {len(df)} rows (--raw full để ghi hết)")
 
     # BD-Rate & BD_Missing
     ws_bdr = wb.add_worksheet("BD-Rate")
-    ws_bdr.write_row(0, 0, ["seq","group","tool","BD-Rate_%"])
     bdr_rows, miss_rows = [], []
 
     for seq, gseq in df.groupby("seq"):
@@ -151,52 +195,41 @@ def build_excel(csv_path, out_path, metric="psnr_yuv"):
                 miss_rows.append([seq, f"{group}-{'' if pd.isna(tool) else tool}", reason, bmin, bmax, tmin, tmax])
             bdr_rows.append([seq, group, ("" if pd.isna(tool) else tool), val])
 
-    for i, row in enumerate(bdr_rows, start=1):
-        ws_bdr.write_row(i, 0, [safe(v) for v in row])
+    write_table(ws_bdr, pd.DataFrame(bdr_rows, columns=["seq","group","tool","BD-Rate_%"]))
 
     if miss_rows:
         ws_miss = wb.add_worksheet("BD_Missing")
-        ws_miss.write_row(0,0,["seq","tool","reason","base_min","base_max","tool_min","tool_max"])
-        for i, row in enumerate(miss_rows, start=1):
-            ws_miss.write_row(i, 0, [safe(v) for v in row])
+        write_table(ws_miss, pd.DataFrame(miss_rows, columns=["seq","tool","reason","base_min","base_max","tool_min","tool_max"]))
 
     # TimeTable
     ws_time = wb.add_worksheet("TimeTable")
     pivot = df.pivot_table(index=["seq","qp"], columns="tool_full",
                            values="enc_time_s", aggfunc="mean").sort_index()
-    ws_time.write_row(0,0,["seq","qp"] + list(pivot.columns))
-    for i,(idx, vals) in enumerate(pivot.iterrows(), start=1):
-        ws_time.write_row(i, 0, [idx[0], int(idx[1])] + [safe(vals[c]) for c in pivot.columns])
+    write_table(ws_time, pivot.reset_index(), ["seq","qp"] + list(pivot.columns))
 
     # SpeedupTable
     ws_sp = wb.add_worksheet("SpeedupTable")
-    sp_rows = []
-    for seq, gseq in df.groupby("seq"):
-        base = gseq[(gseq["group"]=="Baseline") & (gseq["tool"].isna())][["qp","enc_time_s"]].rename(columns={"enc_time_s":"base_time"})
-        if base.empty:
-            continue
-        for (group, tool), g in gseq.groupby(["group","tool"]):
-            if group=="Baseline" and pd.isna(tool):
-                continue
-            m = pd.merge(g[["qp","enc_time_s"]], base, on="qp", how="inner")
-            if not m.empty:
-                m["seq"]=seq; m["tool_full"]=f"{group}-{'' if pd.isna(tool) else tool}"
-                m["speedup"]=m["base_time"]/m["enc_time_s"]
-                sp_rows.append(m[["seq","qp","tool_full","speedup"]])
-    if sp_rows:
-        sp_df = pd.concat(sp_rows, ignore_index=True)
-        piv = sp_df.pivot_table(index=["seq","qp"], columns="tool_full",
-                                values="speedup", aggfunc="mean").sort_index()
-        ws_sp.write_row(0,0,["seq","qp"] + list(piv.columns))
-        for i,(idx, vals) in enumerate(piv.iterrows(), start=1):
-            ws_sp.write_row(i, 0, [idx[0], int(idx[1])] + [safe(vals[c]) for c in piv.columns])
+    # một merge cho mọi tool: (seq, qp) của tool x thời gian Baseline cùng (seq, qp)
+    is_base = (df["group"]=="Baseline") & (df["tool"].isna())
+    base_t = df.loc[is_base, ["seq","qp","enc_time_s"]].rename(columns={"enc_time_s":"base_time"})
+    m = pd.merge(df.loc[~is_base & df["tool"].notna(), ["seq","qp","tool_full","enc_time_s"]], base_t, on=["seq","qp"], how="inner")
+    if not m.empty:
+        m["speedup"] = m["base_time"]/m["enc_time_s"]
+        piv = m.pivot_table(index=["seq","qp"], columns="tool_full",
+                            values="speedup", aggfunc="mean").sort_index()
+        write_table(ws_sp, piv.reset_index(), ["seq","qp"] + list(piv.columns))
+
+    # SpeedupStats: median/MAD/p-value theo lần chạy lặp (orchestrate_vtm --timing-repeats)
+    ts_path = Path(csv_path).parent / "timing_summary.csv"
+    if ts_path.exists():
+        ts = pd.read_csv(ts_path)
+        ws_ts = wb.add_worksheet("SpeedupStats")
+        write_table(ws_ts, ts)
 
     # Time_vs_QP_All (column chart)
     ws_all = wb.add_worksheet("Time_vs_QP_All")
     avg = df.groupby(["tool_full","qp"], as_index=False)["enc_time_s"].mean().sort_values(["tool_full","qp"])
-    ws_all.write_row(0,0,["tool_full","qp","enc_time_s"])
-    for i,row in enumerate(avg.itertuples(index=False), start=1):
-        ws_all.write_row(i, 0, [safe(v) for v in row])
+    write_table(ws_all, avg)
 
     ch = wb.add_chart({"type":"column"})
     ch.set_title({"name":"Average Encoding Time vs QP (All sequences)"})
@@ -219,9 +252,7 @@ def build_excel(csv_path, out_path, metric="psnr_yuv"):
         ws = wb.add_worksheet(sheet)
         sub = gseq[["group","tool","qp","bitrate_kbps",metric if metric in gseq.columns else "psnr_y","enc_time_s"]]\
               .sort_values(["group","tool","bitrate_kbps","qp"]).reset_index(drop=True)
-        ws.write_row(0,0,["group","tool","qp","bitrate_kbps",metric,"enc_time_s"])
-        for i,row in enumerate(sub.itertuples(index=False), start=1):
-            ws.write_row(i, 0, [safe(v) for v in row])
+        write_table(ws, sub, ["group","tool","qp","bitrate_kbps",metric,"enc_time_s"])
 
         # RD curve (line, log-scale X)
         rd = wb.add_chart({"type":"line"})
@@ -287,16 +318,17 @@ def build_excel(csv_path, out_path, metric="psnr_yuv"):
 
 # -------- main --------
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Cách dùng:")
-        print("  python excel_vtm_report.py <path/to/results.csv> [metric] [output.xlsx]")
-        print("  metric: psnr_y (mặc định) | psnr_yuv | psnr_u | psnr_v")
-        sys.exit(1)
+    ap = argparse.ArgumentParser(description="python excel_vtm_report.py <path/to/results.csv> [metric] [output.xlsx]")
+    ap.add_argument("csv")
+    ap.add_argument("metric", nargs="?", default="psnr_yuv", help="psnr_yuv (mặc định) | psnr_y | psnr_u | psnr_v")
+    ap.add_argument("out", nargs="?", default=None)
+    ap.add_argument("--raw", choices=RAW_MODES, default="sample", help="Raw sheet khi vượt --raw-max-rows")
+    ap.add_argument("--raw-max-rows", type=int, default=200_000)
+    args = ap.parse_args()
 
-    csv_path = Path(sys.argv[1])
-    metric   = sys.argv[2] if len(sys.argv) >= 3 else "psnr_yuv"
-    out      = Path(sys.argv[3]) if len(sys.argv) >= 4 else (csv_path.parent / "vtm_report.xlsx")
+    csv_path = Path(args.csv)
+    out      = Path(args.out) if args.out else (csv_path.parent / "vtm_report.xlsx")
 
     print("Đang tạo Excel report…")
-    p = build_excel(str(csv_path), str(out), metric=metric)
+    p = build_excel(str(csv_path), str(out), metric=args.metric, raw_mode=args.raw, raw_max_rows=args.raw_max_rows)
     print(f"Xong: {p}")
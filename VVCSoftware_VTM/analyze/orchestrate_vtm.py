@@ -1,25 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import argparse, asyncio, csv, os, re, sys, time, yaml, hashlib, itertools
+import argparse, asyncio, csv, json, os, re, sys, time, yaml, hashlib, itertools
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
+import timing_harness
+import decode_verify
+from seq_cache import SeqCache, seq_bytes
+from concurrent.futures import ThreadPoolExecutor
+from run_archive import CODEC_SUFFIX, iter_logs, read_text, tail_text
+from vtm_runner import add_runner_args, cmdline, job_spec, limits_from_args, run_job
+from vtm_summary import encoder_metrics, reset_summary, summary_args
+from vtm_trace import Tracer, add_trace_args
+from vtm_metrics import SweepMetrics, add_metrics_args
+
 # ------------------------- parsing VTM log -------------------------
 
 PSNR_SUMMARY_RE = re.compile(
-    r"Total Frames\s*\|\s*Bitrate\s+Y-PSNR\s+U-PSNR\s+V-PSNR\s+YUV-PSNR\s*"
+    r"Total Frames\s*\|\s*Bitrate\s+Y-PSNR\s+U-PSNR\s+V-PSNR\s+YUV-PSNR[^\n]*"  # + xY/xU/xV-PSNR khi PrintHexPSNR
     r"\n\s*(\d+)\s+\S\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)",
     re.MULTILINE
 )
 TOTAL_TIME_RE = re.compile(r"Total Time:\s+([\d.]+)\s+sec\.\s+\[user\]\s+([\d.]+)\s+sec\.\s+\[elapsed\]", re.MULTILINE)
 
-def parse_vtm_log(log_text: str) -> Tuple[float, float, float, float, float, float]:
+def parse_vtm_log(log_text: str, log_path=None) -> Tuple[float, float, float, float, float, float]:
     import math
     br = py = pu = pv = pyuv = tenc = float('nan')
 
-    m = PSNR_SUMMARY_RE.search(log_text)
-    if m:
+    # ưu tiên SummaryOutFilename (+ hex PSNR); regex trên bảng console chỉ là fallback
+    s = encoder_metrics(log_path, log_text) if log_path is not None else None
+    m = PSNR_SUMMARY_RE.search(log_text) if s is None else None
+    if s is not None:
+        br, py = s["bitrate_kbps"], s["psnr_y"]
+        pu, pv, pyuv = s.get("psnr_u", pu), s.get("psnr_v", pv), s.get("psnr_yuv", pyuv)
+    elif m:
         br     = float(m.group(2))
         py     = float(m.group(3))
         pu     = float(m.group(4))
@@ -66,18 +81,101 @@ def load_experiment(yaml_path: Path) -> Dict:
     exp.setdefault("fixed_args", [])
     exp.setdefault("sequences", [])
     exp.setdefault("qps", [37,32,27,22])
-    for key in ["baselines", "perf_add", "perf_ablate", "speed_add", "speed_ablate"]:
+    for key in ["baselines", "perf_add", "perf_ablate", "speed_add", "speed_ablate", "sweeps"]:
         exp.setdefault(key, [])
+    for sw in exp["sweeps"]:
+        if sw.get("group", "speed_add") not in SWEEP_GROUPS:
+            raise ValueError(f"sweep {sw.get('name')!r}: group phải thuộc {SWEEP_GROUPS}")
+        sweep_axes(sw)  # zip lệch độ dài -> lỗi ngay lúc load
+        for expr in _as_list(sw.get("where")):
+            compile(expr, "<where>", "eval")  # lỗi cú pháp báo ngay lúc load, không phải giữa sweep
     return exp
 
+# sweeps: lưới tham số khai báo gọn, expand lazy thành item của group (không giữ cả tích Descartes):
+#   sweeps:
+#     - name: ME                      # tên tool = ME_SearchRange64_MinSearchWindow8_...
+#       group: speed_add              # perf_add | perf_ablate | speed_add | speed_ablate
+#       grid: {SearchRange: [64, 128, 256, 384], MinSearchWindow: [8, 16, 96]}     # tích Descartes
+#       zip:  {BipredSearchRange: [1, 2, 4], FastSearch: [1, 1, 3]}               # đi song song = 1 trục
+#       args: ["--ASR=1"]             # thêm vào mọi điểm
+#       where: ["MinSearchWindow <= SearchRange"]                                  # ràng buộc (biểu thức Python)
+#       limit: 200                    # tối đa N điểm (sau where + dedup)
+# Điểm trùng nhau sau apply_dependencies (vd RDOQ=0 kéo DepQuant=0) chỉ chạy 1 lần.
+SWEEP_GROUPS = ["perf_add", "perf_ablate", "speed_add", "speed_ablate"]
+
+def _as_list(x):
+    return [] if x is None else list(x) if isinstance(x, (list, tuple)) else [x]
+
+def _arg_value(v):
+    return int(v) if isinstance(v, bool) else v
+
+def sweep_axes(sw: Dict):
+    """[(key, values)]: mỗi key của grid là 1 trục; mỗi bảng zip (dict hoặc list dict) là 1 trục với key = tuple."""
+    axes = [(k, _as_list(v)) for k, v in (sw.get("grid") or {}).items()]
+    for z in _as_list(sw.get("zip")):
+        keys = tuple(z)
+        cols = [_as_list(z[k]) for k in keys]
+        if len({len(c) for c in cols}) > 1:
+            raise ValueError(f"sweep {sw.get('name')!r}: các list trong zip phải cùng độ dài {dict(zip(keys, map(len, cols)))}")
+        axes.append((keys, list(zip(*cols))))
+    return axes
+
+def expand_sweep(sw: Dict):
+    """Generator {"name", "args"} cho từng điểm thoả where; itertools.product không dựng cả lưới."""
+    axes = sweep_axes(sw)
+    where = [compile(e, "<where>", "eval") for e in _as_list(sw.get("where"))]
+    extra = normalize_args(sw.get("args", []))
+    for combo in itertools.product(*(vals for _, vals in axes)):
+        point = {}
+        for (key, _), val in zip(axes, combo):
+            point.update(zip(key, val) if isinstance(key, tuple) else [(key, val)])
+        env = {"min": min, "max": max, "abs": abs}
+        if not all(eval(c, {"__builtins__": {}, **env}, dict(point)) for c in where):
+            continue
+        name = "_".join([sw.get("name", "SWEEP")] + [f"{k}{_arg_value(v)}" for k, v in point.items()])
+        yield {"name": name, "args": extra + [f"--{k}={_arg_value(v)}" for k, v in point.items()]}
+
+def arg_key(args: List[str]) -> Tuple:
+    # tập tham số tương đương: --Key=Value sau cùng thắng (như EncoderApp), không phụ thuộc thứ tự
+    eff = {}
+    for a in args:
+        k, _, v = a.partition("=")
+        eff[k] = v
+    return tuple(sorted(eff.items()))
+
+def iter_items(exp: Dict, group_key: str, args_base: List[str]):
+    """(tool_name, merged args) của group: item viết tay + sweeps, bỏ điểm trùng sau apply_dependencies."""
+    seen = set()
+    limits = {}
+    def items():
+        yield from ((it, None) for it in exp[group_key])
+        for i, sw in enumerate(exp["sweeps"]):
+            if sw.get("group", "speed_add") == group_key:
+                yield from ((it, i) for it in expand_sweep(sw))
+    for it, sw_i in items():
+        merged = merge_args(args_base, it.get("args", []))
+        key = arg_key(merged)
+        if key in seen:
+            continue
+        if sw_i is not None:
+            lim = exp["sweeps"][sw_i].get("limit")
+            if lim is not None and limits.get(sw_i, 0) >= lim:
+                continue
+            limits[sw_i] = limits.get(sw_i, 0) + 1
+        seen.add(key)
+        yield it["name"], merged
+
 # ------------------------- command building -------------------------
 
-def build_cmd(exp, seq, qp, job_args, out_dir, tag, no_recon):
+def job_dir_for(out_dir, tag, seq, qp):
+    return out_dir / f"{tag}_{seq['name']}_QP{qp}"
+
+def build_cmd(exp, seq, qp, job_args, out_dir, tag, no_recon, recon_path=None):
     vtm_bin = str(exp["vtm_bin"])
     base_cfg = str(exp["base_cfg"])
     name = seq["name"]
 
-    job_dir = out_dir / f"{tag}_{name}_QP{qp}"
+    job_dir = job_dir_for(out_dir, tag, seq, qp)
     job_dir.mkdir(parents=True, exist_ok=True)
     log_path = job_dir / "enc.log"
 
@@ -96,104 +194,238 @@ def build_cmd(exp, seq, qp, job_args, out_dir, tag, no_recon):
                 f'--FramesToBeEncoded={seq["frames"]}',
             ]
 
-    if not no_recon:
-        rec_path = job_dir / f"{tag}_{name}_QP{qp}.yuv"
+    if no_recon:
+        # base cfg (encoder_randomaccess_vtm.cfg) đặt ReconFile: rec.yuv -> phải ghi đè bằng giá trị rỗng
+        cmd += ["--ReconFile="]
+    else:
+        rec_path = recon_path or job_dir / f"{tag}_{name}_QP{qp}.yuv"
         cmd += [f"--ReconFile={rec_path}"]
 
+    cmd += summary_args(log_path)
+    reset_summary(log_path)
     cmd += exp.get("fixed_args", [])
     cmd += job_args
     return cmd, log_path
 
 # ------------------------- job plan -------------------------
 
-def jobs_from_yaml(exp: Dict, out_dir: Path, no_recon: bool) -> List[Dict]:
-    jobs = []
+def iter_jobs(exp: Dict, out_dir: Path, no_recon: bool):
+    """Generator job theo thứ tự seq -> qp -> anchor + item; sweeps expand lại mỗi (seq, qp), không lưu.
+    Baseline dùng chung giữa Perf_* và Speed_* (cùng tag, cùng job dir) chỉ plan 1 lần."""
+    base_seen = set()  # job dir của baseline đã yield: |baselines| x |seqs| x |qps|, nhỏ
     base_ref = next((b for b in exp["baselines"] if b["name"] == "Baseline_Ref"), None)
     base_min = next((b for b in exp["baselines"] if b["name"] == "Baseline_Min"), None)
 
-    def plan_group(group_name: str, base_name: str, base_args: List[str], items: List[Dict]):
+    def plan_group(group_name: str, base_name: str, base_args: List[str], group_key: str):
+        args_base = apply_dependencies(normalize_args(base_args))
         for seq in exp["sequences"]:
             for qp in exp["qps"]:
-                args_base = apply_dependencies(normalize_args(base_args))
-                jobs.append({
-                    "group": "Baseline",
-                    "tool": base_name,
-                    "seq": seq["name"],
-                    "qp": qp,
-                    "cmd_spec": (seq, qp, args_base, out_dir, base_name, no_recon)
-                })
-                for it in items:
-                    tool_name = it["name"]
-                    merged = merge_args(args_base, it.get("args", []))
+                base_dir = job_dir_for(out_dir, base_name, seq, qp)
+                if base_dir not in base_seen:
+                    base_seen.add(base_dir)
+                    yield {
+                        "group": "Baseline",
+                        "tool": base_name,
+                        "anchor": base_name,
+                        "seq": seq["name"],
+                        "qp": qp,
+                        "cmd_spec": (seq, qp, args_base, out_dir, base_name, no_recon)
+                    }
+                for tool_name, merged in iter_items(exp, group_key, args_base):
                     tag2 = f"{group_name}_{tool_name}"
-                    jobs.append({
+                    yield {
                         "group": group_name,
                         "tool": tool_name,
+                        "anchor": base_name,
                         "seq": seq["name"],
                         "qp": qp,
                         "cmd_spec": (seq, qp, merged, out_dir, tag2, no_recon)
-                    })
+                    }
 
     if base_ref:
-        plan_group("Perf_Ablate",  "Baseline_Ref", base_ref.get("args", []), exp["perf_ablate"])
-        plan_group("Speed_Ablate", "Baseline_Ref", base_ref.get("args", []), exp["speed_ablate"])
+        yield from plan_group("Perf_Ablate",  "Baseline_Ref", base_ref.get("args", []), "perf_ablate")
+        yield from plan_group("Speed_Ablate", "Baseline_Ref", base_ref.get("args", []), "speed_ablate")
 
     if base_min:
-        plan_group("Perf_Add",  "Baseline_Min", base_min.get("args", []), exp["perf_add"])
-        plan_group("Speed_Add", "Baseline_Min", base_min.get("args", []), exp["speed_add"])
+        yield from plan_group("Perf_Add",  "Baseline_Min", base_min.get("args", []), "perf_add")
+        yield from plan_group("Speed_Add", "Baseline_Min", base_min.get("args", []), "speed_add")
 
-    return jobs
+def jobs_from_yaml(exp: Dict, out_dir: Path, no_recon: bool) -> List[Dict]:
+    return list(iter_jobs(exp, out_dir, no_recon))
+
+def plan_timing(jobs: List[Dict], repeats: int, timing_groups: List[str]) -> List[Dict]:
+    """
+    Expand timing-critical jobs (timing_groups + their anchors) into `repeats` runs,
+    ordered so anchor and tests for the same (seq, qp) alternate (ABBA across repeats).
+    Other jobs are kept once, ahead of the timing blocks.
+    """
+    blocks = {}
+    for j in jobs:
+        if j["group"] in timing_groups:
+            key = (j["anchor"], j["seq"], j["qp"])
+            blocks.setdefault(key, [])
+            blocks[key].append(j)
+    anchors = {}
+    for j in jobs:
+        key = (j["tool"], j["seq"], j["qp"])
+        if j["group"] == "Baseline" and key in blocks:
+            anchors.setdefault(key, j)
+
+    rest = [j for j in jobs
+            if j["group"] not in timing_groups and not (j["group"] == "Baseline" and (j["tool"], j["seq"], j["qp"]) in blocks)]
+    ordered = []
+    block_list = [([anchors[k]] if k in anchors else []) + tests for k, tests in blocks.items()]
+
+    for rep, j in timing_harness.interleave_repeats(block_list, repeats):
+        seq, qp, job_args, out_dir, tag, no_recon = j["cmd_spec"]
+        ordered.append({**j, "rep": rep, "timing": True,
+                        "cmd_spec": (seq, qp, job_args, out_dir, tag if rep == 0 else f"{tag}_r{rep}", no_recon)})
+    return rest + ordered
 
 # ------------------------- runner -------------------------
 
-async def run_one(job: Dict, writer, lock, args):
-    seq, qp, job_args, out_dir, tag, no_recon = job["cmd_spec"]
-    cmd, log_path = build_cmd(args.exp, seq, qp, job_args, out_dir, tag, no_recon)
-
-    t0 = time.time()
-    env = os.environ.copy()
-    if args.enc_threads:
-        env["OMP_NUM_THREADS"] = str(args.enc_threads)
-
-    if args.verbose:
-        print("[run]", " ".join(cmd))
+_FIFO_IDS = itertools.count()
 
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.STDOUT,
-        env=env
-    )
+async def start_recon_consumer(seq, qp, out_dir, tag, args):
+    """
+    --recon-fifo: EncoderApp ghi recon vào named pipe, yuv_metrics.py đọc + tính PSNR/SSIM/XPSNR
+    so với source (memmap) rồi bỏ frame. Consumer được start trước để mở pipe trước EncoderApp.
+    """
+    job_dir = job_dir_for(out_dir, tag, seq, qp)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    # tên riêng cho mỗi job: cùng tag có thể được plan 2 lần (baseline dùng chung giữa các group)
+    fifo = job_dir / f"recon_{os.getpid()}_{next(_FIFO_IDS)}.fifo"
+    os.mkfifo(fifo)
+    cmd = [sys.executable, str(Path(__file__).with_name("yuv_metrics.py")), "--fifo", str(fifo),
+           "--src", str(seq["yuv"]), f"--width={seq['width']}", f"--height={seq['height']}",
+           f"--chroma={seq.get('chroma', '420')}", f"--src-bitdepth={seq.get('bitdepth', 8)}",
+           f"--rec-bitdepth={args.recon_bitdepth}", f"--frames={seq['frames']}",
+           "--out", str(job_dir / "metrics_frames.csv"), "--summary-json", str(fifo.with_suffix(".json"))]
+    with open(job_dir / "metrics.log", "wb") as mlog:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=mlog, stderr=asyncio.subprocess.STDOUT)
+    return proc, fifo
+
+async def finish_recon_consumer(proc, fifo, timeout=300):
+    # EncoderApp chết trước khi mở pipe -> consumer kẹt ở open(): mở đầu ghi rồi đóng ngay = EOF.
+    # ENXIO = consumer chưa mở pipe (còn đang khởi động) -> thử lại tới khi nó mở hoặc đã thoát.
+    t_end = time.time() + timeout
+    while proc.returncode is None and time.time() < t_end:
+        try:
+            os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+            break
+        except OSError:
+            try:
+                await asyncio.wait_for(proc.wait(), 0.05)
+            except asyncio.TimeoutError:
+                pass
+    try:
+        await asyncio.wait_for(proc.wait(), max(1.0, t_end - time.time()))
+    except asyncio.TimeoutError:
+        proc.kill(); await proc.wait()
+    try:
+        fifo.unlink()
+    except OSError:
+        pass
+    summ = fifo.with_suffix(".json")
+    try:
+        return json.loads(summ.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    finally:
+        summ.unlink(missing_ok=True)
 
-    buff = []
-    with open(log_path, "wb") as f:
-        while True:
-            line = await proc.stdout.readline()
-            if not line:
-                break
-            f.write(line)
-            if args.verbose:
-                try:
-                    sys.stdout.buffer.write(line)
-                except Exception:
-                    pass
-            buff.append(line)
+async def run_one(job: Dict, writer, lock, args, tid=None):
+    seq, qp, job_args, out_dir, tag, no_recon = job["cmd_spec"]
+    staged = None
+    if args.seq_cache is not None and "yuv" in seq and not seq.get("seq_cfg"):
+        # copy có thể mất vài giây (GB) -> chạy trong thread, không chặn event loop
+        with args.tracer.phase(tid, "stage"):
+            staged = await asyncio.get_running_loop().run_in_executor(
+                None, args.seq_cache.acquire, seq["yuv"], seq_bytes(seq, seq.get("frames")))
+        seq = {**seq, "yuv": staged}
+    try:
+        return await _run_staged(job, seq, writer, lock, args, tid)
+    finally:
+        if staged is not None and staged != str(job["cmd_spec"][0]["yuv"]):
+            args.seq_cache.release(staged)  # acquire bypass trả path nguồn -> không có ref để trả
+
+async def _run_staged(job, seq, writer, lock, args, tid=None):
+    _, qp, job_args, out_dir, tag, no_recon = job["cmd_spec"]
+    consumer = fifo = None
+    if args.recon_fifo and not no_recon and "yuv" in seq:
+        consumer, fifo = await start_recon_consumer(seq, qp, out_dir, tag, args)
+    cmd, log_path = build_cmd(args.exp, seq, qp, job_args, out_dir, tag, no_recon, recon_path=fifo)
+    decode = args.decode and job.get("rep", 0) == 0
+    if decode:
+        # bitstream riêng cho job (cfg mặc định ghi str.bin ở cwd) + MD5 SEI để DecoderApp kiểm tra
+        cmd += [f"--BitstreamFile={log_path.parent / 'str.bin'}", "--SEIDecodedPictureHash=1"]
+
+    # timing mode: mỗi job lease 1 core riêng (isolated) và ghi lại trạng thái máy
+    core = None
+    if job.get("timing") and args.core_pool is not None:
+        core = await args.core_pool.get()
+    snap0 = timing_harness.snapshot(core) if job.get("timing") else None
+
+    env = {"OMP_NUM_THREADS": str(args.enc_threads)} if args.enc_threads else None
 
-    ret = await proc.wait()
-    t1 = time.time()
+    if args.verbose:
+        print("[run]", cmdline(cmd), f"(core {core})" if core is not None else "")
 
-    log_text = b"".join(buff).decode("utf-8", errors="ignore")
-    br, py, pu, pv, pyuv, tenc = parse_vtm_log(log_text)
+    # vtm_runner: argv exec, nice/ioprio/cgroup, pin core, kill process group khi timeout; blocking -> launch pool
+    spec = job_spec(cmd, log_path, args.log_codec, core=core, env=env, echo=args.verbose, **args.limits)
+    try:
+        res = await asyncio.get_running_loop().run_in_executor(args.launch_pool, run_job, spec)
+        snap1 = timing_harness.snapshot(core) if snap0 is not None else None
+    finally:
+        if core is not None:
+            args.core_pool.put_nowait(core)
+        metrics = await finish_recon_consumer(consumer, fifo) if consumer is not None else None
+    args.tracer.runner_phases(tid, res)
+    ret = res["retcode"]
+    if res["status"] == "TIMEOUT":
+        print(f"[timeout] {job['group']} {job['tool']} {job['seq']} QP{qp}")
+
+    with args.tracer.phase(tid, "parse"):
+        log_text = read_text(log_path)
+        br, py, pu, pv, pyuv, tenc = parse_vtm_log(log_text, log_path)
 
     if (tenc != tenc) or (tenc is None):
-        tenc = t1 - t0
+        tenc = res["wall_s"]
+    args.metrics.job_result(job, seq, res, br, py, tenc, log_text)
 
-    row = [
-        job["group"], job["tool"], job["seq"], qp,
-        br, py, pu, pv, pyuv, tenc, ret
-    ]
+    dec = None
+    if decode and ret == 0:
+        # cùng pool core với encode (timing mode), DecoderApp + wait4 chạy trong thread
+        dcore = await args.core_pool.get() if job.get("timing") and args.core_pool is not None else None
+        try:
+            with args.tracer.phase(tid, "decode"):
+                dec = await asyncio.get_running_loop().run_in_executor(
+                    None, decode_verify.decode_one, args.decode, log_path.parent / "str.bin",
+                    log_path.parent / "dec.log", dcore, args.decode_timeout)
+        finally:
+            if dcore is not None:
+                args.core_pool.put_nowait(dcore)
+
+    t_write = time.perf_counter()  # gồm cả thời gian chờ lock -> thấy được tranh chấp ghi CSV
     async with lock:
-        writer.writerow(row)
+        if job.get("rep", 0) == 0:
+            writer.writerow([
+                job["group"], job["tool"], job["seq"], qp,
+                br, py, pu, pv, pyuv, tenc, ret
+            ])
+        if metrics is not None and job.get("rep", 0) == 0:
+            args.metrics_writer.writerow({"group": job["group"], "tool": job["tool"], "seq": job["seq"], "qp": qp,
+                                          "bitrate_kbps": br, **metrics})
+        if dec is not None:
+            args.decode_writer.writerow({"group": job["group"], "experiment": job["tool"], "sequence": job["seq"],
+                                         "qp": qp, **dec})
+        if snap0 is not None:
+            args.timing_writer.writerow([
+                job["group"], job["tool"], job["anchor"], job["seq"], qp, job["rep"], core,
+                tenc, res["wall_s"], snap0["cpu_mhz"], snap1["cpu_mhz"], snap0["load"], snap1["load"], ret
+            ])
+    args.tracer.span(tid, "write", t_write, time.perf_counter())
+    return res["status"]
 
 async def main():
     ap = argparse.ArgumentParser()
@@ -201,9 +433,33 @@ async def main():
     ap.add_argument("--max-parallel", type=int, default=None)
     ap.add_argument("--enc-threads", type=int, default=None)
     ap.add_argument("--no-recon", action="store_true")
+    ap.add_argument("--recon-fifo", action="store_true",
+                    help="Recon qua named pipe -> yuv_metrics (PSNR/SSIM/XPSNR) -> metrics_runs.csv, không ghi YUV ra đĩa")
+    ap.add_argument("--recon-bitdepth", type=int, default=10, help="OutputBitDepth của recon (CTC: 10)")
+    ap.add_argument("--decode", default="", help="DecoderApp: decode + kiểm tra MD5 SEI sau mỗi encode -> decode.csv")
+    ap.add_argument("--decode-timeout", type=int, default=0)
+    ap.add_argument("--stage-dir", default="", help="Cache input YUV (tmpfs/NVMe); 'auto' = /dev/shm hoặc temp")
+    ap.add_argument("--stage-cap", default="", help="Giới hạn dung lượng cache, vd 64G")
+    ap.add_argument("--log-codec", default="", choices=[""] + list(CODEC_SUFFIX),
+                    help="Nén enc.log khi ghi (gz/xz/bz2/zst) -> enc.log.<ext>; parser đọc trong suốt")
     ap.add_argument("--verbose", action="store_true")
     ap.add_argument("--progress-interval", type=int, default=10)
+    ap.add_argument("--timing-repeats", type=int, default=0,
+                    help="Timing mode: chạy N lần các job timing-critical (xen kẽ anchor/test) -> timing.csv; N >= 6 để p < 0.05 đạt được")
+    ap.add_argument("--timing-groups", default="Speed_Add,Speed_Ablate",
+                    help="Nhóm timing-critical (kèm Baseline anchor của chúng)")
+    ap.add_argument("--timing-cores", default="",
+                    help="Core isolated để pin job timing, vd 2-13 (mỗi job 1 core)")
+    add_runner_args(ap)
+    add_trace_args(ap)
+    add_metrics_args(ap)
     args = ap.parse_args()
+    args.limits = limits_from_args(args)
+
+    if args.recon_fifo and args.no_recon:
+        ap.error("--recon-fifo và --no-recon loại trừ nhau")
+    if args.recon_fifo and not hasattr(os, "mkfifo"):
+        ap.error("--recon-fifo cần named pipe POSIX (Linux/WSL/macOS)")
 
     exp = load_experiment(Path(args.exp))
     args.exp = exp
@@ -217,39 +473,102 @@ async def main():
     if args.verbose:
         print(f"[plan] cores={cpu_count}, enc_threads={args.enc_threads}, max_parallel={max_parallel}")
 
-    jobs = jobs_from_yaml(exp, out_dir, args.no_recon)
+    timing = args.timing_repeats > 1
+    if timing:
+        # ABBA cần thấy mọi job cùng lúc -> timing mode vẫn dựng list
+        groups = [g.strip() for g in args.timing_groups.split(",") if g.strip()]
+        jobs = plan_timing(jobs_from_yaml(exp, out_dir, args.no_recon), args.timing_repeats, groups)
+        job_source = lambda: iter(jobs)
+    else:
+        # sweeps lớn: job sinh lazy từ YAML, chỉ giữ ~2*max_parallel job đang bay
+        job_source = lambda: iter_jobs(exp, out_dir, args.no_recon)
+    # 1 lượt đếm (không giữ job): tổng cho progress/metrics + số job/sequence cho seq cache
+    total, yuv_jobs = 0, {}
+    for j in job_source():
+        total += 1
+        if "yuv" in j["cmd_spec"][0]:
+            yuv_jobs[j["cmd_spec"][0]["yuv"]] = yuv_jobs.get(j["cmd_spec"][0]["yuv"], 0) + 1
     if args.verbose:
-        print(f"[plan] jobs={len(jobs)}")
+        print(f"[plan] jobs={total}")
+
+    cores = timing_harness.parse_cores(args.timing_cores) if timing else []
+    if cores and timing_harness.usable_cores(cores) != cores:
+        print(f"[warn] timing cores not available here: {sorted(set(cores) - set(timing_harness.usable_cores(cores)))}")
+        cores = timing_harness.usable_cores(cores)
+    args.core_pool = None
+    if cores:
+        args.core_pool = asyncio.Queue()
+        for c in cores:
+            args.core_pool.put_nowait(c)
+        if args.verbose:
+            print(f"[plan] timing: repeats={args.timing_repeats}, cores={cores}")
+
+    args.seq_cache = SeqCache.from_args(args.stage_dir, args.stage_cap)
+    if args.seq_cache is not None:
+        for yuv, n in yuv_jobs.items():
+            args.seq_cache.plan(yuv, n)
 
     sem = asyncio.Semaphore(max_parallel)
+    args.launch_pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="enc")
     fcsv = open(csv_path, "w", newline="", encoding="utf-8")
     writer = csv.writer(fcsv)
     writer.writerow(["group","tool","seq","qp","bitrate_kbps","psnr_y","psnr_u","psnr_v","psnr_yuv","enc_time_s","retcode"])
     lock = asyncio.Lock()
+    ftim = None
+    if timing:
+        timing_path = out_dir / "timing.csv"
+        ftim = open(timing_path, "w", newline="", encoding="utf-8")
+        args.timing_writer = csv.writer(ftim)
+        args.timing_writer.writerow(["group","tool","anchor","seq","qp","rep","core","enc_time_s","wall_s",
+                                     "cpu_mhz_start","cpu_mhz_end","load_start","load_end","retcode"])
+
+    fmet = None
+    args.metrics_writer = None
+    if args.recon_fifo:
+        import yuv_metrics
+        fmet = open(out_dir / "metrics_runs.csv", "w", newline="", encoding="utf-8")
+        args.metrics_writer = csv.DictWriter(fmet, fieldnames=yuv_metrics.RUN_FIELDS, extrasaction="ignore")
+        args.metrics_writer.writeheader()
+
+    fdec = None
+    if args.decode:
+        fdec = open(out_dir / "decode.csv", "w", newline="", encoding="utf-8")
+        args.decode_writer = csv.DictWriter(fdec, fieldnames=decode_verify.DECODE_FIELDS, extrasaction="ignore")
+        args.decode_writer.writeheader()
+
+    args.tracer = Tracer.from_args(args, "orchestrate_vtm")
+    args.metrics = SweepMetrics.from_args(args, max_parallel, total)
 
     async def gated(job):
+        t_q = time.perf_counter()
         async with sem:
-            await run_one(job, writer, lock, args)
+            tid = args.tracer.acquire()
+            t0 = time.perf_counter()
+            label = f"{job['group']}/{job['tool']} {job['seq']} QP{job['cmd_spec'][1]}"
+            args.tracer.queued(label, t_q, t0)
+            args.metrics.job_started()
+            status = "ERR"
+            try:
+                status = await run_one(job, writer, lock, args, tid)
+            finally:
+                args.metrics.job_finished(status)
+                args.tracer.span(tid, label, t0, time.perf_counter(),
+                                 {"status": status, "rep": job.get("rep", 0), "queue_wait_s": round(t0 - t_q, 3)})
+                args.tracer.release(tid)
 
     def scan_progress():
         created = 0
         finished = 0
-        for p in out_dir.rglob("enc.log"):
+        for p in iter_logs(out_dir, "enc.log"):
             created += 1
             try:
-                with open(p, "rb") as f:
-                    f.seek(0, os.SEEK_END)
-                    n = f.tell()
-                    f.seek(max(0, n - 65536), os.SEEK_SET)
-                    tail = f.read().decode("utf-8", errors="ignore")
-                    if "Total Time:" in tail:
-                        finished += 1
+                if "Total Time:" in tail_text(p):
+                    finished += 1
             except Exception:
                 pass
         return created, finished
 
     async def progress():
-        total = len(jobs)
         while True:
             await asyncio.sleep(args.progress_interval)
             created, finished = scan_progress()
@@ -259,15 +578,38 @@ async def main():
 
     prog_task = asyncio.create_task(progress())
     try:
-        await asyncio.gather(*(gated(j) for j in jobs))
+        inflight = set()
+        for j in job_source():
+            if len(inflight) >= 2 * max_parallel:
+                done, inflight = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    t.result()
+            inflight.add(asyncio.create_task(gated(j)))
+        await asyncio.gather(*inflight)
     finally:
         prog_task.cancel()
         try:
             await prog_task
         except asyncio.CancelledError:
             pass
+        args.launch_pool.shutdown(wait=True)
         fcsv.close()
+        args.tracer.close()
+        args.metrics.close()
         print("[done] CSV:", csv_path)
+        if args.seq_cache is not None:
+            print(args.seq_cache.summary())
+        if fdec is not None:
+            fdec.close()
+            print("[done] Decode:", out_dir / "decode.csv")
+        if fmet is not None:
+            fmet.close()
+            print("[done] Recon metrics:", out_dir / "metrics_runs.csv")
+        if ftim is not None:
+            ftim.close()
+            rows = timing_harness.timing_summary(timing_path)
+            timing_harness.write_summary(rows, out_dir / "timing_summary.csv")
+            print("[done] Timing:", out_dir / "timing_summary.csv")
 
 if __name__ == "__main__":
     asyncio.run(main())
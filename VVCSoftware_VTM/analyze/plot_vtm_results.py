@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import argparse, os
+import argparse, hashlib, json, os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # không cần display; an toàn trong process pool
 import matplotlib.pyplot as plt
 
 def load_and_clean(csv_path: str):
@@ -22,47 +25,107 @@ def load_and_clean(csv_path: str):
 def ensure_dir(p: Path):
     p.mkdir(parents=True, exist_ok=True)
 
-def plot_rd_curves(df: pd.DataFrame, outdir: Path, metric: str):
-    # vẽ RD cho từng sequence: bitrate vs PSNR metric
+# --- Render song song + incremental ---
+# Mỗi chart = 1 spec (dict thuần, picklable); hash của spec lưu trong <outdir>/.chart_hashes.json
+# -> lần chạy sau chỉ vẽ lại chart có dữ liệu/nhãn thay đổi hoặc PNG bị xoá.
+CHART_MANIFEST = ".chart_hashes.json"
+CHART_VERSION = 1  # tăng khi đổi style vẽ để buộc vẽ lại toàn bộ
+
+def _chart_hash(spec):
+    blob = json.dumps([CHART_VERSION, spec], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def _render(spec):
+    plt.figure()
+    for label, x, y in spec["series"]:
+        plt.plot(x, y, marker=spec["marker"], label=label)
+    plt.xlabel(spec["xlabel"])
+    plt.ylabel(spec["ylabel"])
+    plt.title(spec["title"])
+    plt.grid(True, **spec["grid"])
+    plt.legend(loc="best", fontsize=8)
+    plt.tight_layout()
+    plt.savefig(spec["file"], dpi=160)
+    plt.close()
+    return spec["file"]
+
+def render_charts(specs, outdir: Path, workers=None, force=False):
+    """Vẽ các spec có hash đổi (hoặc thiếu file) trên process pool; trả về (số vẽ lại, số bỏ qua)."""
+    ensure_dir(outdir)
+    man_path = outdir / CHART_MANIFEST
+    try:
+        manifest = json.loads(man_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    todo = []
+    for spec in specs:
+        h = _chart_hash(spec)
+        name = Path(spec["file"]).name
+        if not force and manifest.get(name) == h and Path(spec["file"]).exists():
+            continue
+        todo.append((name, h, spec))
+    workers = workers or os.cpu_count() or 1
+    if len(todo) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as ex:
+            futs = {ex.submit(_render, spec): (name, h) for name, h, spec in todo}
+            for fut in as_completed(futs):
+                fut.result()
+                name, h = futs[fut]
+                manifest[name] = h
+    else:
+        for name, h, spec in todo:
+            _render(spec)
+            manifest[name] = h
+    man_path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    return len(todo), len(specs) - len(todo)
+
+def _label(group, tool):
+    return f"{group}-{tool}" if tool != "None" else "Baseline"
+
+def rd_specs(df: pd.DataFrame, outdir: Path, metric: str):
+    # RD cho từng sequence: bitrate vs PSNR metric
+    specs = []
     for seq, gseq in df.groupby("seq"):
-        plt.figure()
+        series = []
         # sắp theo group để legend dễ đọc
         for (group, tool), gtool in gseq.groupby(["group","tool"]):
             g = gtool.sort_values("bitrate_kbps")
             y = g[metric] if metric in g.columns else g["psnr_y"]
             if y.isna().all():
                 continue
-            label = f"{group}-{tool}" if tool != "None" else "Baseline"
-            plt.plot(g["bitrate_kbps"], y, marker="o", label=label)
-        plt.xlabel("Bitrate (kbps)")
-        plt.ylabel(metric.upper() if metric.startswith("psnr") else "PSNR-Y (dB)")
-        plt.title(f"RD Curve — {seq}")
-        plt.grid(True, which="both", linewidth=0.5, linestyle="--")
-        plt.legend(loc="best", fontsize=8)
-        plt.tight_layout()
-        ensure_dir(outdir)
-        plt.savefig(outdir / f"RD_{seq}.png", dpi=160)
-        plt.close()
-
-def plot_time_vs_qp(df: pd.DataFrame, outdir: Path):
-    # vẽ độ phức tạp (thời gian) theo QP cho từng sequence
+            series.append((_label(group, tool), g["bitrate_kbps"].tolist(), y.tolist()))
+        specs.append({
+            "file": str(outdir / f"RD_{seq}.png"), "series": series, "marker": "o",
+            "xlabel": "Bitrate (kbps)",
+            "ylabel": metric.upper() if metric.startswith("psnr") else "PSNR-Y (dB)",
+            "title": f"RD Curve — {seq}",
+            "grid": {"which": "both", "linewidth": 0.5, "linestyle": "--"},
+        })
+    return specs
+
+def time_specs(df: pd.DataFrame, outdir: Path):
+    # độ phức tạp (thời gian) theo QP cho từng sequence
+    specs = []
     for seq, gseq in df.groupby("seq"):
-        plt.figure()
+        series = []
         for (group, tool), gtool in gseq.groupby(["group","tool"]):
             g = gtool.sort_values("qp")
             if "enc_time_s" not in g.columns or g["enc_time_s"].isna().all():
                 continue
-            label = f"{group}-{tool}" if tool != "None" else "Baseline"
-            plt.plot(g["qp"], g["enc_time_s"], marker="s", label=label)
-        plt.xlabel("QP")
-        plt.ylabel("Encode time (s)")
-        plt.title(f"Encoding Complexity — {seq}")
-        plt.grid(True, linestyle="--", linewidth=0.5)
-        plt.legend(loc="best", fontsize=8)
-        plt.tight_layout()
-        ensure_dir(outdir)
-        plt.savefig(outdir / f"TIME_{seq}.png", dpi=160)
-        plt.close()
+            series.append((_label(group, tool), g["qp"].tolist(), g["enc_time_s"].tolist()))
+        specs.append({
+            "file": str(outdir / f"TIME_{seq}.png"), "series": series, "marker": "s",
+            "xlabel": "QP", "ylabel": "Encode time (s)",
+            "title": f"Encoding Complexity — {seq}",
+            "grid": {"linestyle": "--", "linewidth": 0.5},
+        })
+    return specs
+
+def plot_rd_curves(df: pd.DataFrame, outdir: Path, metric: str, workers=None, force=False):
+    return render_charts(rd_specs(df, outdir, metric), outdir, workers, force)
+
+def plot_time_vs_qp(df: pd.DataFrame, outdir: Path, workers=None, force=False):
+    return render_charts(time_specs(df, outdir), outdir, workers, force)
 
 # --- BD-Rate (Bjøntegaard Delta Rate) so với baseline ---
 def _polyfit_bitrate_psnr(bitrate, psnr):
@@ -122,6 +185,8 @@ def main():
     ap.add_argument("--outdir", default=None, help="Thư mục lưu ảnh (mặc định cùng thư mục CSV, /plots)")
     ap.add_argument("--metric", default="psnr_y", choices=["psnr_y","psnr_yuv","psnr_u","psnr_v"],
                     help="PSNR dùng cho RD & BD-Rate")
+    ap.add_argument("--workers", type=int, default=None, help="Số process vẽ song song (mặc định = số CPU)")
+    ap.add_argument("--force", action="store_true", help="Vẽ lại mọi chart, bỏ qua hash cache")
     args = ap.parse_args()
 
     csv_path = Path(args.csv)
@@ -134,10 +199,12 @@ def main():
         return
 
     print("Vẽ RD curves...")
-    plot_rd_curves(df, outdir, args.metric)
+    n, skip = plot_rd_curves(df, outdir, args.metric, args.workers, args.force)
+    print(f"  {n} vẽ lại, {skip} không đổi")
 
     print("Vẽ thời gian mã hoá (complexity)...")
-    plot_time_vs_qp(df, outdir)
+    n, skip = plot_time_vs_qp(df, outdir, args.workers, args.force)
+    print(f"  {n} vẽ lại, {skip} không đổi")
 
     print("Tính BD-Rate so với Baseline...")
     bdr = compute_bdrate(df, args.metric)
@@ -0,0 +1,229 @@
+# proxy_clips.py
+# Proxy clips for cheap coarse screening: derived YUVs (frame range, temporal stride, crop window,
+# integer box downscale) generated once with NumPy and cached by (source, spec).
+# The runners swap the YAML sequence entry for its proxy, so build_cmd sees an ordinary sequence.
+#
+# Usage:
+#   # generate / list proxies for every sequence in a YAML
+#   python proxy_clips.py make --yaml experiment_ablation.yaml --fidelity half
+#   # how much to trust proxy screening: proxy vs full BD-rates (per-seq summaries from win_collect_and_analyze_v4)
+#   python proxy_clips.py report --proxy quickfire_summary_half.csv --full quickfire_summary_from_logs.csv
+import argparse, csv, hashlib, json, math, os
+from pathlib import Path
+from collections import defaultdict
+import numpy as np
+
+from yuv_io import YuvReader
+
+# mức fidelity cho screening; frames có thể bị ghi đè bởi --frames của runner
+FIDELITY_LEVELS = {
+    "full":    None,
+    "half":    {"frames": 16, "scale": 2},             # 1/4 số pixel
+    "quarter": {"frames": 16, "scale": 4},             # 1/16 số pixel
+    "center":  {"frames": 16, "crop": 0.5},            # cửa sổ giữa 50% x 50%, giữ nguyên độ phân giải
+    "half_t2": {"frames": 16, "scale": 2, "stride": 2}, # + bỏ 1 frame / 2 (chuyển động mạnh hơn)
+}
+ALIGN = 8  # VTM: kích thước phải là bội của min CU size
+
+def parse_fidelity(level):
+    """Level name from FIDELITY_LEVELS or 'frames=16,scale=2,stride=1,start=0,crop=0.5|x:y:w:h'."""
+    if level in (None, "", "full"): return None
+    if level in FIDELITY_LEVELS: return dict(FIDELITY_LEVELS[level])
+    spec = {}
+    for part in level.split(","):
+        k, v = part.split("=", 1)
+        k = k.strip()
+        if k == "crop":
+            spec[k] = [int(x) for x in v.split(":")] if ":" in v else float(v)
+        else:
+            spec[k] = int(v)
+    return spec
+
+def normalize_spec(seq, spec, frames=None):
+    """Resolve crop window (luma, aligned so the downscaled size is a multiple of 8)."""
+    w, h = int(seq["width"]), int(seq["height"])
+    scale = int(spec.get("scale", 1)); stride = int(spec.get("stride", 1))
+    crop = spec.get("crop")
+    if crop is None:
+        x, y, cw, ch = 0, 0, w, h
+    elif isinstance(crop, (int, float)):
+        cw, ch = int(w * crop), int(h * crop); x, y = (w - cw) // 2, (h - ch) // 2
+    else:
+        x, y, cw, ch = crop
+    step = ALIGN * scale
+    cw2, ch2 = cw // step * step, ch // step * step
+    if cw2 == 0 or ch2 == 0:
+        raise ValueError(f"{seq['name']}: crop {cw}x{ch} too small for scale {scale}")
+    # cắt đều 2 bên cho tròn bội, giữ tọa độ chẵn (4:2:0)
+    x += (cw - cw2) // 2 // 2 * 2; y += (ch - ch2) // 2 // 2 * 2
+    n = int(frames or spec.get("frames") or seq.get("frames", 64))
+    return {"start": int(spec.get("start", 0)), "frames": n, "stride": stride,
+            "crop": [x, y, cw2, ch2], "scale": scale}
+
+def proxy_key(seq, nspec):
+    st = os.stat(seq["yuv"])
+    blob = json.dumps({"src": os.path.abspath(str(seq["yuv"])), "size": st.st_size, "mtime": st.st_mtime,
+                       "bitdepth": int(seq.get("bitdepth", 8)), "chroma": str(seq.get("chroma", "420")),
+                       **nspec}, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+
+def downscale(x, s):
+    """Box-filter integer downscale of a (T, H, W) block; rounds back to the input dtype."""
+    if s == 1: return x
+    t, h, w = x.shape
+    y = x[:, :h // s * s, :w // s * s].reshape(t, h // s, s, w // s, s).mean(axis=(2, 4), dtype=np.float32)
+    return np.rint(y).astype(x.dtype)
+
+def make_proxy(seq, spec, cache_dir, frames=None, chunk=8):
+    """
+    Return a sequence entry pointing at the proxy YUV (generated on first use).
+    Name stays the same so anchors / results join with full-resolution runs.
+    """
+    nspec = normalize_spec(seq, spec, frames)
+    key = proxy_key(seq, nspec)
+    x, y, cw, ch = nspec["crop"]; s = nspec["scale"]
+    pw, ph = cw // s, ch // s
+    fps = max(1, int(round(float(seq["fps"]) / nspec["stride"])))
+    cache_dir = Path(cache_dir); cache_dir.mkdir(parents=True, exist_ok=True)
+    out = cache_dir / f"{seq['name']}_{pw}x{ph}_{key}.yuv"
+    meta = out.with_suffix(".json")
+
+    if not (out.exists() and meta.exists()):
+        src = YuvReader.from_seq(seq, path=seq["yuv"])
+        stop = min(len(src), nspec["start"] + nspec["frames"] * nspec["stride"])
+        tmp = out.with_name(out.name + ".part")
+        n = 0
+        with open(tmp, "wb") as f:
+            for _, pl in src.iter_chunks(chunk, nspec["start"], stop, nspec["stride"], crop=(x, y, cw, ch)):
+                blk = [downscale(v, s) for v in pl.values()]
+                np.concatenate([b.reshape(b.shape[0], -1) for b in blk], axis=1).tofile(f)
+                n += blk[0].shape[0]
+        os.replace(tmp, out)
+        meta.write_text(json.dumps({"source": str(seq["yuv"]), "name": seq["name"], "width": pw, "height": ph,
+                                    "fps": fps, "frames": n, "spec": nspec,
+                                    "pixel_ratio": (pw * ph * n) / (int(seq["width"]) * int(seq["height"]) * nspec["frames"])},
+                                   indent=1), encoding="utf-8")
+    info = json.loads(meta.read_text(encoding="utf-8"))
+    return {**seq, "yuv": str(out), "width": pw, "height": ph, "fps": fps, "frames": info["frames"],
+            "proxy_of": str(seq["yuv"]), "proxy_spec": nspec}
+
+def apply_fidelity(sequences, level, cache_dir, frames=None):
+    """Runner hook: full -> sequences unchanged; otherwise each entry with a .yuv source -> its proxy."""
+    spec = parse_fidelity(level)
+    if spec is None: return list(sequences)
+    out = []
+    for seq in sequences:
+        if "yuv" not in seq or not str(seq["yuv"]).lower().endswith(".yuv"):
+            out.append(seq); continue
+        p = make_proxy(seq, spec, cache_dir, frames)
+        print(f"[proxy] {seq['name']}: {seq['width']}x{seq['height']} -> {p['width']}x{p['height']} "
+              f"x{p['frames']}f @ {p['fps']}fps ({Path(p['yuv']).name})")
+        out.append(p)
+    return out
+
+# ------------------------- proxy vs full report -------------------------
+
+def read_bd(path):
+    # per-seq summary của win_collect_and_analyze_v4: group, experiment, sequence, bd_rate_psnrY_percent, status
+    out = {}
+    with open(path, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            if not str(r.get("status", "OK")).startswith("OK"): continue
+            try: bd = float(r["bd_rate_psnrY_percent"])
+            except (TypeError, ValueError): continue
+            if math.isfinite(bd):
+                out[(r["group"], r["experiment"], r["sequence"])] = bd
+    return out
+
+def _rank(x):
+    order = np.argsort(x, kind="mergesort")
+    r = np.empty(len(x)); r[order] = np.arange(len(x))
+    # ties -> rank trung bình
+    for v in np.unique(x):
+        m = x == v
+        if m.sum() > 1: r[m] = r[m].mean()
+    return r
+
+def agreement(p, f):
+    p, f = np.asarray(p, float), np.asarray(f, float)
+    n = len(p)
+    if n < 3:
+        return {"n": n, "pearson": None, "spearman": None, "sign_agree": None, "mae": None, "bias": None, "slope": None}
+    pear = float(np.corrcoef(p, f)[0, 1]) if p.std() > 0 and f.std() > 0 else None
+    rp, rf = _rank(p), _rank(f)
+    spear = float(np.corrcoef(rp, rf)[0, 1]) if rp.std() > 0 and rf.std() > 0 else None
+    slope = float(np.polyfit(p, f, 1)[0]) if p.std() > 0 else None
+    return {"n": n, "pearson": pear, "spearman": spear, "sign_agree": float(np.mean(np.sign(p) == np.sign(f))),
+            "mae": float(np.mean(np.abs(p - f))), "bias": float(np.mean(p - f)), "slope": slope}
+
+def proxy_report(proxy_csv, full_csv, topk=5):
+    P, F = read_bd(proxy_csv), read_bd(full_csv)
+    common = sorted(set(P) & set(F))
+    pairs = [{"group": g, "experiment": e, "sequence": s, "bd_proxy": P[(g, e, s)], "bd_full": F[(g, e, s)],
+              "delta": P[(g, e, s)] - F[(g, e, s)]} for g, e, s in common]
+
+    stats = {"per_sequence": agreement([r["bd_proxy"] for r in pairs], [r["bd_full"] for r in pairs])}
+    # mức tool (trung bình qua sequence chung) - đây là thứ screening dùng để chọn
+    tool = defaultdict(lambda: ([], []))
+    for r in pairs:
+        tool[(r["group"], r["experiment"])][0].append(r["bd_proxy"]); tool[(r["group"], r["experiment"])][1].append(r["bd_full"])
+    tool_rows = [{"group": g, "experiment": e, "n_seq": len(a), "bd_proxy": float(np.mean(a)), "bd_full": float(np.mean(b))}
+                 for (g, e), (a, b) in sorted(tool.items())]
+    stats["per_tool"] = agreement([r["bd_proxy"] for r in tool_rows], [r["bd_full"] for r in tool_rows])
+    # top-k theo nhóm: proxy chọn bao nhiêu tool giống full
+    stats["topk_overlap"] = {}
+    for g in sorted({r["group"] for r in tool_rows}):
+        rs = [r for r in tool_rows if r["group"] == g]
+        k = min(topk, len(rs))
+        tp = {r["experiment"] for r in sorted(rs, key=lambda r: r["bd_proxy"])[:k]}
+        tf = {r["experiment"] for r in sorted(rs, key=lambda r: r["bd_full"])[:k]}
+        stats["topk_overlap"][g] = {"k": k, "overlap": len(tp & tf)}
+    # theo sequence: proxy nào đáng tin nhất
+    stats["per_seq_name"] = {}
+    for s in sorted({r["sequence"] for r in pairs}):
+        rs = [r for r in pairs if r["sequence"] == s]
+        stats["per_seq_name"][s] = agreement([r["bd_proxy"] for r in rs], [r["bd_full"] for r in rs])
+    return pairs, tool_rows, stats
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mk = sub.add_parser("make", help="Tạo proxy cho mọi sequence trong YAML")
+    mk.add_argument("--yaml", required=True)
+    mk.add_argument("--fidelity", default="half", help=f"{list(FIDELITY_LEVELS)} hoặc frames=16,scale=2,...")
+    mk.add_argument("--frames", type=int, default=0)
+    mk.add_argument("--proxy-dir", default="", help="Mặc định <output_dir>/proxy_cache")
+    rp = sub.add_parser("report", help="Proxy vs full BD-rate agreement")
+    rp.add_argument("--proxy", required=True, help="Per-seq summary CSV từ run proxy")
+    rp.add_argument("--full", required=True, help="Per-seq summary CSV từ run full-res")
+    rp.add_argument("--topk", type=int, default=5)
+    rp.add_argument("--out", default="proxy_vs_full.csv")
+    args = ap.parse_args()
+
+    if args.cmd == "make":
+        import yaml
+        cfg = yaml.safe_load(Path(args.yaml).read_text(encoding="utf-8"))
+        cache = args.proxy_dir or Path(cfg.get("output_dir", "./runs_out_ablation")) / "proxy_cache"
+        apply_fidelity(cfg["sequences"], args.fidelity, cache, args.frames or None)
+        return
+
+    pairs, tool_rows, stats = proxy_report(args.proxy, args.full, args.topk)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["group","experiment","sequence","bd_proxy","bd_full","delta"])
+        w.writeheader(); [w.writerow(r) for r in pairs]
+    tools_out = Path(args.out).with_name(Path(args.out).stem + "_tools.csv")
+    with open(tools_out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["group","experiment","n_seq","bd_proxy","bd_full"])
+        w.writeheader(); [w.writerow(r) for r in tool_rows]
+    Path(args.out).with_suffix(".json").write_text(json.dumps(stats, indent=2), encoding="utf-8")
+    fmt = lambda v: "n/a" if v is None else f"{v:.3f}"
+    for lvl in ("per_sequence", "per_tool"):
+        s = stats[lvl]
+        print(f"[{lvl}] n={s['n']} pearson={fmt(s['pearson'])} spearman={fmt(s['spearman'])} "
+              f"sign={fmt(s['sign_agree'])} mae={fmt(s['mae'])} bias={fmt(s['bias'])}")
+    for g, o in stats["topk_overlap"].items():
+        print(f"[top{o['k']}] {g}: {o['overlap']}/{o['k']} giống full-res")
+    print(f"[OK] {args.out}, {tools_out}, {Path(args.out).with_suffix('.json')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# results_db.py
+# Một kho kết quả SQLite cho mọi layout: orchestrate_vtm results.csv (group,tool,seq,...,retcode),
+# win_* / collectors (group,experiment,sequence,...,psnrY_dB[,status],log) và log thô (win layout
+# <root>/<group>/<exp>/<seq>/QP<qp>/<seq>_QP<qp>.log). Schema chuẩn hoá:
+#   sweeps(name, build, root)  configs(group, experiment, args)  config_flags(key, value)
+#   sequences(name, width, height, fps, class)  runs(sweep, config, sequence, qp, rep, metrics...)  frames(run, poc, ...)
+# runs có index (sweep_id, config_id, sequence_id, qp); config_flags (key, value); sequences (class)
+# -> "ALF tắt trên Class B qua 10 build gần nhất" là lookup theo index, không quét nhiều CSV.
+#
+#   python results_db.py import-csv --db results.sqlite runs_out_ablation\results.csv --sweep ra_2410 --build vtm23.11-a1b2 --yaml experiment_ablation.yaml
+#   python results_db.py import-logs --db results.sqlite --root runs_out_ablation\COARSE --sweep coarse_2410 --frames
+#   python results_db.py query --db results.sqlite --flag ALF=0 --class B --last-builds 10 --out alf_off_classB.csv
+import argparse, csv, json, re, sqlite3, sys, time
+from pathlib import Path
+
+from run_archive import iter_logs, plain_name, read_text, resolve
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+  id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, build TEXT NOT NULL DEFAULT '',
+  root TEXT, imported_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS configs (
+  id INTEGER PRIMARY KEY, grp TEXT NOT NULL, experiment TEXT NOT NULL, args TEXT NOT NULL DEFAULT '',
+  UNIQUE (grp, experiment, args));
+CREATE TABLE IF NOT EXISTS config_flags (
+  config_id INTEGER NOT NULL REFERENCES configs(id), key TEXT NOT NULL, value TEXT NOT NULL,
+  PRIMARY KEY (config_id, key));
+CREATE TABLE IF NOT EXISTS sequences (
+  id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, width INTEGER, height INTEGER, fps INTEGER, class TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  sweep_id INTEGER NOT NULL REFERENCES sweeps(id), config_id INTEGER NOT NULL REFERENCES configs(id),
+  sequence_id INTEGER NOT NULL REFERENCES sequences(id), qp INTEGER NOT NULL, rep INTEGER NOT NULL DEFAULT 0,
+  bitrate_kbps REAL, psnr_y REAL, psnr_u REAL, psnr_v REAL, psnr_yuv REAL, enc_time_s REAL,
+  retcode INTEGER, status TEXT, log TEXT,
+  UNIQUE (sweep_id, config_id, sequence_id, qp, rep));
+CREATE TABLE IF NOT EXISTS frames (
+  run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE, poc INTEGER NOT NULL, lid INTEGER, tid INTEGER,
+  nal TEXT, slice TEXT, slice_qp INTEGER, bits INTEGER, psnr_y REAL, et_s REAL,
+  PRIMARY KEY (run_id, lid, poc)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_key ON runs (sweep_id, config_id, sequence_id, qp);
+CREATE INDEX IF NOT EXISTS runs_seq ON runs (sequence_id, config_id);
+CREATE INDEX IF NOT EXISTS configs_exp ON configs (experiment);
+CREATE INDEX IF NOT EXISTS flags_kv ON config_flags (key, value);
+CREATE INDEX IF NOT EXISTS seq_class ON sequences (class);
+CREATE INDEX IF NOT EXISTS sweeps_build ON sweeps (build, imported_at);
+CREATE VIEW IF NOT EXISTS v_runs AS
+  SELECT r.id AS run_id, r.config_id, w.name AS sweep, w.build, c.grp AS "group", c.experiment, s.name AS sequence, s.class,
+         r.qp, r.rep, r.bitrate_kbps, r.psnr_y, r.psnr_u, r.psnr_v, r.psnr_yuv, r.enc_time_s, r.retcode, r.status, r.log
+  FROM runs r JOIN sweeps w ON w.id = r.sweep_id JOIN configs c ON c.id = r.config_id
+  JOIN sequences s ON s.id = r.sequence_id;
+"""
+RUN_FIELDS = ["bitrate_kbps", "psnr_y", "psnr_u", "psnr_v", "psnr_yuv", "enc_time_s", "retcode", "status", "log"]
+SEQ_RE = re.compile(r'_(\d+)x(\d+)(?:_(\d+))?')
+QP_DIR_RE = re.compile(r'^QP(\d+)$', re.I)
+# CTC class theo độ phân giải (A1/A2 cùng 3840x2160 -> "A")
+CTC_CLASS = {(3840, 2160): "A", (1920, 1080): "B", (832, 480): "C", (416, 240): "D", (1280, 720): "E"}
+
+def connect(db_path):
+    con = sqlite3.connect(str(db_path))
+    con.execute("PRAGMA journal_mode=WAL"); con.execute("PRAGMA synchronous=NORMAL"); con.execute("PRAGMA foreign_keys=ON")
+    con.executescript(SCHEMA)
+    return con
+
+def _num(v, cast=float):
+    if v in (None, ""): return None
+    try:
+        x = cast(float(v))
+    except (TypeError, ValueError):
+        return None
+    return None if x != x else x  # NaN -> NULL
+
+def norm_group(g):
+    # orchestrate dùng Perf_Add/Baseline, win_* dùng perf_add/baselines -> một dạng lower-case
+    g = (g or "").strip().lower()
+    return "baseline" if g in ("baseline", "baselines") else g
+
+# ------------------------- dimension rows -------------------------
+
+def sweep_id(con, name, build="", root=None):
+    con.execute("INSERT INTO sweeps(name, build, root, imported_at) VALUES (?,?,?,?) "
+                "ON CONFLICT(name) DO UPDATE SET build=excluded.build, root=excluded.root, imported_at=excluded.imported_at",
+                (name, build, str(root) if root else None, time.time()))
+    return con.execute("SELECT id FROM sweeps WHERE name=?", (name,)).fetchone()[0]
+
+def sequence_id(con, name, cache):
+    if name in cache: return cache[name]
+    m = SEQ_RE.search(name)
+    w, h, fps = (int(m.group(1)), int(m.group(2)), _num(m.group(3), int)) if m else (None, None, None)
+    con.execute("INSERT OR IGNORE INTO sequences(name, width, height, fps, class) VALUES (?,?,?,?,?)",
+                (name, w, h, fps, CTC_CLASS.get((w, h))))
+    cache[name] = con.execute("SELECT id FROM sequences WHERE name=?", (name,)).fetchone()[0]
+    return cache[name]
+
+def flags_of(args):
+    # ["--ALF=0", "--CCALF=0"] -> {"ALF": "0", "CCALF": "0"}; cờ sau ghi đè cờ trước như EncoderApp
+    out = {}
+    for a in args or []:
+        if a.startswith("--") and "=" in a:
+            k, v = a[2:].split("=", 1); out[k] = v
+    return out
+
+def config_id(con, grp, experiment, args, cache):
+    key = (grp, experiment)
+    if key in cache: return cache[key]
+    js = json.dumps(list(args)) if args is not None else ""
+    # import không --yaml (args='') và có --yaml cho cùng (grp, experiment) dùng chung 1 config:
+    # biết args -> điền vào row args='' sẵn có; không biết args -> dùng row đã có (row '' trước, rồi row mới nhất)
+    rows = dict(con.execute("SELECT args, id FROM configs WHERE grp=? AND experiment=? ORDER BY id", (grp, experiment)))
+    if js in rows:
+        cid = rows[js]
+    elif not js and rows:
+        cid = list(rows.values())[-1]
+    elif js and "" in rows:
+        cid = rows[""]
+        con.execute("UPDATE configs SET args=? WHERE id=?", (js, cid))
+    else:
+        cid = con.execute("INSERT INTO configs(grp, experiment, args) VALUES (?,?,?)", (grp, experiment, js)).lastrowid
+    con.executemany("INSERT OR IGNORE INTO config_flags(config_id, key, value) VALUES (?,?,?)",
+                    [(cid, k, v) for k, v in flags_of(args).items()])
+    cache[key] = cid
+    return cid
+
+def config_args_from_yaml(yaml_path):
+    """(group, experiment) -> full EncoderApp args (baseline + item, sau apply_dependencies) theo đúng plan của orchestrate_vtm.
+    Key có group vì tên tool có thể lặp giữa các group (cùng item trong perf_ablate và speed_ablate, khác baseline)."""
+    from orchestrate_vtm import iter_jobs, load_experiment
+    exp = load_experiment(Path(yaml_path))
+    return {(norm_group(j["group"]), j["tool"]): j["cmd_spec"][2] for j in iter_jobs(exp, Path("."), True)}
+
+# ------------------------- importers -------------------------
+
+def rows_from_csv(csv_path):
+    """Per-run rows of any runner/collector CSV in the common schema; summary (BD-rate) CSVs are rejected."""
+    csv_path = Path(csv_path); root = csv_path.parent
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rd = csv.DictReader(f)
+        cols = set(rd.fieldnames or [])
+        if "qp" not in cols or "bitrate_kbps" not in cols:
+            raise ValueError(f"{csv_path}: not a per-run CSV (columns {sorted(cols)})")
+        for r in rd:
+            qp = _num(r["qp"], int)
+            if qp is None: continue
+            if "experiment" in cols:  # win_* / collectors
+                grp, exp, seq, log = r["group"], r["experiment"], r["sequence"], r.get("log") or None
+                py = r.get("psnrY_dB", r.get("psnr_y"))
+            else:                     # orchestrate_vtm results.csv
+                grp, exp, seq = r["group"], r["tool"], r["seq"]
+                tag = exp if grp == "Baseline" else f"{grp}_{exp}"
+                log = str(root / f"{tag}_{seq}_QP{qp}" / "enc.log")
+                py = r.get("psnr_y")
+            yield {"group": norm_group(grp), "experiment": exp, "sequence": seq, "qp": qp, "rep": _num(r.get("rep"), int) or 0,
+                   "bitrate_kbps": _num(r["bitrate_kbps"]), "psnr_y": _num(py),
+                   "psnr_u": _num(r.get("psnr_u")), "psnr_v": _num(r.get("psnr_v")), "psnr_yuv": _num(r.get("psnr_yuv")),
+                   "enc_time_s": _num(r.get("enc_time_s")), "retcode": _num(r.get("retcode"), int),
+                   "status": r.get("status") or None, "log": log}
+
+def rows_from_logs(root):
+    """win layout: <root>/<group>/<exp>/<seq>/QP<qp>/<seq>_QP<qp>.log[.xz] (group 'baselines' -> baseline)."""
+    from orchestrate_vtm import parse_vtm_log
+    for p in iter_logs(root):
+        m = QP_DIR_RE.match(p.parent.name)
+        if not m: continue
+        seq = p.parent.parent.name; exp_dir = p.parent.parent.parent
+        br, py, pu, pv, pyuv, tenc = parse_vtm_log(read_text(p), p)
+        yield {"group": norm_group(exp_dir.parent.name), "experiment": exp_dir.name, "sequence": seq,
+               "qp": int(m.group(1)), "rep": 0, "bitrate_kbps": _num(br), "psnr_y": _num(py), "psnr_u": _num(pu),
+               "psnr_v": _num(pv), "psnr_yuv": _num(pyuv), "enc_time_s": _num(tenc), "retcode": None,
+               "status": "ok" if br == br else "no_metrics", "log": str(plain_name(p))}
+
+def import_rows(con, sweep, rows, build="", root=None, yaml_args=None, frames=False):
+    """Upsert rows into one sweep (re-import replaces metrics, keeps run ids). Returns (runs, frames) imported."""
+    from vtm_poc_profile import parse_poc_lines
+    sid = sweep_id(con, sweep, build, root)
+    scache, ccache = {}, {}
+    n = nf = 0
+    with con:
+        for r in rows:
+            args = yaml_args.get((r["group"], r["experiment"])) if yaml_args else None
+            cid = config_id(con, r["group"], r["experiment"], args, ccache)
+            qid = sequence_id(con, r["sequence"], scache)
+            vals = [r[k] for k in RUN_FIELDS]
+            con.execute(f"INSERT INTO runs(sweep_id, config_id, sequence_id, qp, rep, {', '.join(RUN_FIELDS)}) "
+                        f"VALUES (?,?,?,?,?{',?' * len(RUN_FIELDS)}) "
+                        f"ON CONFLICT(sweep_id, config_id, sequence_id, qp, rep) DO UPDATE SET "
+                        + ", ".join(f"{k}=excluded.{k}" for k in RUN_FIELDS),
+                        [sid, cid, qid, r["qp"], r["rep"]] + vals)
+            n += 1
+            if frames and r["log"] and resolve(r["log"]):
+                rid = con.execute("SELECT id FROM runs WHERE sweep_id=? AND config_id=? AND sequence_id=? AND qp=? AND rep=?",
+                                  (sid, cid, qid, r["qp"], r["rep"])).fetchone()[0]
+                fr = parse_poc_lines(read_text(r["log"]))
+                con.execute("DELETE FROM frames WHERE run_id=?", (rid,))
+                con.executemany("INSERT OR REPLACE INTO frames VALUES (?,?,?,?,?,?,?,?,?,?)",
+                                [(rid, f["poc"], f["lid"], f["tid"], f["nal"], f["slice"], f["slice_qp"],
+                                  f["bits"], f["psnr_y"], f["et_s"]) for f in fr])
+                nf += len(fr)
+    return n, nf
+
+# ------------------------- queries -------------------------
+
+def query_runs(con, sweep=None, experiment=None, group=None, sequence=None, seq_class=None, qp=None,
+               flags=(), last_builds=None, ok_only=False):
+    """Rows of v_runs (dicts) filtered through the indexed columns; flags = ["ALF=0", ...] (all must match)."""
+    where, params = [], []
+    def add(cond, *p): where.append(cond); params.extend(p)
+    if sweep:      add("sweep = ?", sweep)
+    if experiment: add("experiment = ?", experiment)
+    if group:      add('"group" = ?', norm_group(group))
+    if sequence:   add("sequence = ?", sequence)
+    if seq_class:  add("class = ?", seq_class)
+    if qp is not None: add("qp = ?", qp)
+    for fl in flags:
+        k, v = fl.lstrip("-").split("=", 1)
+        add("config_id IN (SELECT config_id FROM config_flags WHERE key = ? AND value = ?)", k, v)
+    if last_builds:
+        add("build IN (SELECT build FROM sweeps GROUP BY build ORDER BY MAX(imported_at) DESC LIMIT ?)", last_builds)
+    if ok_only:
+        add("bitrate_kbps IS NOT NULL AND COALESCE(retcode, 0) = 0")
+    sql = "SELECT * FROM v_runs" + (" WHERE " + " AND ".join(where) if where else "") + \
+          ' ORDER BY sweep, "group", experiment, sequence, qp, rep'
+    cur = con.execute(sql, params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur]
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("import-csv", "import-logs"):
+        p = sub.add_parser(name)
+        p.add_argument("--db", required=True)
+        p.add_argument("--sweep", default=None, help="Tên sweep (mặc định: tên thư mục chứa CSV / root)")
+        p.add_argument("--build", default="", help="Nhãn build encoder (vd git hash) cho truy vấn --last-builds")
+        p.add_argument("--yaml", default=None, help="Experiment YAML -> lưu args + cờ --Key=Value của mỗi experiment")
+        p.add_argument("--frames", action="store_true", help="Import per-POC rows từ log (bảng frames)")
+        if name == "import-csv":
+            p.add_argument("csv", nargs="+")
+        else:
+            p.add_argument("--root", required=True)
+    q = sub.add_parser("query")
+    q.add_argument("--db", required=True)
+    q.add_argument("--sweep"); q.add_argument("--experiment"); q.add_argument("--group"); q.add_argument("--sequence")
+    q.add_argument("--class", dest="seq_class", help="CTC class: A/B/C/D/E")
+    q.add_argument("--qp", type=int)
+    q.add_argument("--flag", action="append", default=[], help="Key=Value trên args của config, lặp được (AND)")
+    q.add_argument("--last-builds", type=int, default=None)
+    q.add_argument("--ok-only", action="store_true")
+    q.add_argument("--out", default=None, help="CSV; mặc định in ra stdout")
+    args = ap.parse_args()
+
+    con = connect(args.db)
+    if args.cmd == "query":
+        rows = query_runs(con, args.sweep, args.experiment, args.group, args.sequence, args.seq_class, args.qp,
+                          args.flag, args.last_builds, args.ok_only)
+        f = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+        w = csv.writer(f)
+        if rows:
+            w.writerow(rows[0].keys()); w.writerows(r.values() for r in rows)
+        if args.out:
+            f.close(); print(f"[OK] {len(rows)} runs -> {args.out}")
+        return
+
+    yaml_args = config_args_from_yaml(args.yaml) if args.yaml else None
+    if args.cmd == "import-csv":
+        for c in args.csv:
+            sweep = args.sweep or Path(c).resolve().parent.name
+            n, nf = import_rows(con, sweep, rows_from_csv(c), args.build, Path(c).resolve().parent, yaml_args, args.frames)
+            print(f"[OK] {c}: {n} runs, {nf} frames -> sweep '{sweep}'")
+    else:
+        sweep = args.sweep or Path(args.root).resolve().name
+        n, nf = import_rows(con, sweep, rows_from_logs(args.root), args.build, Path(args.root).resolve(), yaml_args, args.frames)
+        print(f"[OK] {args.root}: {n} runs, {nf} frames -> sweep '{sweep}'")
+
+if __name__ == "__main__":
+    main()
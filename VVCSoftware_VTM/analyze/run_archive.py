@@ -0,0 +1,259 @@
+# run_archive.py
+# Compressed logs / bitstreams for the runs trees (runs_out_ablation, runs_out_ra):
+#   - one opener every parser/crawler goes through: plain, .gz, .xz, .bz2 (stdlib), .zst (if `zstandard`
+#     is installed); asking for "x.log" also finds "x.log.gz" etc. once a run has been archived
+#   - streaming writer for runner logs (EncoderApp stdout -> compressor, nothing uncompressed on disk)
+#   - archiver: compress finished run directories in place (same layout, crawlers keep working)
+#
+# Usage:
+#   python run_archive.py --root runs_out_ablation --codec xz --workers 8
+#   python run_archive.py --root runs_out_ra --codec zst --bitstreams --min-age-min 30
+#   python run_archive.py --root runs_out_ablation --restore
+import argparse, bz2, gzip, lzma, os, shutil, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_SUFFIX = {"gz": ".gz", "xz": ".xz", "bz2": ".bz2", "zst": ".zst"}
+SUFFIX_CODEC = {v: k for k, v in CODEC_SUFFIX.items()}
+LOG_PATTERNS = ("*.log",)
+BITSTREAM_PATTERNS = ("*.vvc", "str.bin")
+
+def codec_of(path):
+    return SUFFIX_CODEC.get(Path(path).suffix.lower())
+
+def available_codecs():
+    return [c for c in CODEC_SUFFIX if c != "zst" or zstandard is not None]
+
+def _check_codec(codec):
+    if codec not in CODEC_SUFFIX:
+        raise ValueError(f"unknown codec {codec!r} (expected one of {list(CODEC_SUFFIX)})")
+    if codec == "zst" and zstandard is None:
+        raise ValueError("codec 'zst' needs the zstandard package (pip install zstandard)")
+
+def resolve(path):
+    """
+    Existing file for `path`: itself or an archived variant path+.gz/.xz/.bz2/.zst; None if none exists.
+    Several variants (enc.log cũ của lần chạy không nén + enc.log.gz mới) -> bản mới nhất theo mtime.
+    """
+    p = Path(path)
+    best, best_mtime = None, None
+    for q in [p] + [p.with_name(p.name + suf) for suf in CODEC_SUFFIX.values()]:
+        try:
+            m = q.stat().st_mtime
+        except OSError:
+            continue
+        if best is None or m > best_mtime:
+            best, best_mtime = q, m
+    return best
+
+def _drop_variants(path, keep):
+    # bản log cũ dạng khác (plain / codec khác) bên cạnh -> xoá để không che bản đang ghi
+    p = Path(path)
+    for q in [p] + [p.with_name(p.name + suf) for suf in CODEC_SUFFIX.values()]:
+        if q != keep:
+            q.unlink(missing_ok=True)
+
+def open_any(path, mode="rb"):
+    """Binary reader for a plain or compressed file (resolved like `resolve`)."""
+    p = resolve(path)
+    if p is None:
+        raise FileNotFoundError(str(path))
+    c = codec_of(p)
+    if c == "gz": return gzip.open(p, mode)
+    if c == "xz": return lzma.open(p, mode)
+    if c == "bz2": return bz2.open(p, mode)
+    if c == "zst":
+        if zstandard is None:
+            raise OSError(f"{p}: zstandard not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(p, "rb"), closefd=True)
+    return open(p, mode)
+
+def read_bytes(path):
+    # stream bị cắt (runner bị kill khi đang ghi .gz/.xz) -> trả phần đã giải nén được
+    out = []
+    with open_any(path) as f:
+        try:
+            while True:
+                b = f.read(1 << 20)
+                if not b: break
+                out.append(b)
+        except (EOFError, lzma.LZMAError, OSError):
+            pass
+    return b"".join(out)
+
+def read_text(path):
+    """Log text (utf-8, then utf-16-le for PowerShell-redirected logs); '' when missing/unreadable."""
+    try:
+        data = read_bytes(path)
+    except (OSError, ValueError):
+        return ""
+    if data[:2] in (b"\xff\xfe", b"\xfe\xff") or (len(data) > 3 and data[1:4:2] == b"\x00\x00"):
+        return data.decode("utf-16", errors="ignore")
+    return data.decode("utf-8", errors="ignore")
+
+def tail_text(path, nbytes=65536):
+    p = resolve(path)
+    if p is None: return ""
+    if codec_of(p) is None:
+        with open(p, "rb") as f:
+            f.seek(0, os.SEEK_END); n = f.tell()
+            f.seek(max(0, n - nbytes), os.SEEK_SET)
+            return f.read().decode("utf-8", errors="ignore")
+    return read_text(p)[-nbytes:]
+
+def iter_files(root, patterns=LOG_PATTERNS):
+    """rglob over plain + archived names; an archived copy is skipped when the plain file is still there."""
+    root = Path(root); seen = set()
+    for pat in patterns:
+        for suf in ("",) + tuple(CODEC_SUFFIX.values()):
+            for p in root.rglob(pat + suf):
+                plain = p.with_name(p.name[:-len(suf)]) if suf else p
+                if plain in seen or (suf and plain.exists()): continue
+                seen.add(plain)
+                yield p
+
+def iter_logs(root, pattern="*.log"):
+    return iter_files(root, (pattern,))
+
+def plain_name(path):
+    # "x_QP32.log.xz" -> Path("x_QP32.log"): crawler lấy QP/sequence từ tên/thư mục như cũ
+    p = Path(path)
+    return p.with_suffix("") if codec_of(p) else p
+
+# ------------------------- writers -------------------------
+
+def open_writer(path, codec=None, level=None):
+    """Binary writer; codec None -> plain file at `path`, else path+suffix."""
+    p = Path(path)
+    if not codec: return open(p, "wb")
+    _check_codec(codec)
+    p = p.with_name(p.name + CODEC_SUFFIX[codec])
+    if codec == "gz": return gzip.open(p, "wb", compresslevel=6 if level is None else level)
+    if codec == "xz": return lzma.open(p, "wb", preset=3 if level is None else level)
+    if codec == "bz2": return bz2.open(p, "wb", compresslevel=9 if level is None else level)
+    return zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(open(p, "wb"), closefd=True)
+
+@contextmanager
+def log_sink(path, codec=None):
+    """
+    File object to hand to subprocess stdout. Plain: the log file itself. Compressed: write end of an OS pipe;
+    a thread streams it through the compressor, joined on exit (after the child has exited).
+    """
+    if not codec:
+        _drop_variants(path, Path(path))
+        with open(path, "wb") as f:
+            yield f
+        return
+    _drop_variants(path, Path(str(path) + CODEC_SUFFIX[codec]))
+    out = open_writer(path, codec)
+    r, w = os.pipe()
+    err = []
+    def pump():
+        # lỗi ghi (ENOSPC, ...) -> vẫn đọc hết pipe để child không bị chặn, báo lỗi sau join
+        with os.fdopen(r, "rb") as fr:
+            while True:
+                b = fr.read(1 << 16)
+                if not b: break
+                if err: continue
+                try:
+                    out.write(b)
+                except Exception as e:
+                    err.append(e)
+    t = threading.Thread(target=pump, daemon=True); t.start()
+    wf = os.fdopen(w, "wb")
+    try:
+        yield wf
+    finally:
+        wf.close()
+        t.join()
+        try:
+            out.close()
+        except Exception as e:
+            err.append(e)
+        if err:
+            raise err[0]
+
+# ------------------------- archiver -------------------------
+
+def compress_file(p, codec, level=None):
+    """x -> x.<suffix> (atomic via temp name), original removed; returns (old_bytes, new_bytes)."""
+    p = Path(p)
+    dst = p.with_name(p.name + CODEC_SUFFIX[codec])
+    tmp = p.with_name(p.name + ".part")
+    with open(p, "rb") as fi, open_writer(tmp, codec, level) as fo:
+        shutil.copyfileobj(fi, fo, 1 << 20)
+    os.replace(tmp.with_name(tmp.name + CODEC_SUFFIX[codec]), dst)
+    shutil.copystat(p, dst)
+    old = p.stat().st_size
+    p.unlink()
+    return old, dst.stat().st_size
+
+def decompress_file(p):
+    p = Path(p)
+    dst = plain_name(p)
+    tmp = dst.with_name(dst.name + ".part")
+    with open_any(p) as fi, open(tmp, "wb") as fo:
+        shutil.copyfileobj(fi, fo, 1 << 20)
+    os.replace(tmp, dst)
+    shutil.copystat(p, dst)
+    old = p.stat().st_size
+    p.unlink()
+    return old, dst.stat().st_size
+
+@contextmanager
+def materialize(path):
+    """Plain on-disk path for tools that need one (DecoderApp): archived files go to a temp copy."""
+    p = resolve(path)
+    if p is None or codec_of(p) is None:
+        yield p
+        return
+    fd, tmp = tempfile.mkstemp(suffix=plain_name(p).suffix)
+    try:
+        with os.fdopen(fd, "wb") as fo, open_any(p) as fi:
+            shutil.copyfileobj(fi, fo, 1 << 20)
+        yield Path(tmp)
+    finally:
+        os.unlink(tmp)
+
+def archive_tree(root, codec="xz", bitstreams=False, min_age_s=0, workers=4, restore=False, level=None):
+    """Compress (or restore) logs [+ bitstreams] under root; files newer than min_age_s are left alone (jobs still running)."""
+    pats = LOG_PATTERNS + (BITSTREAM_PATTERNS if bitstreams else ())
+    now = time.time()
+    if restore:
+        todo = [p for p in iter_files(root, pats) if codec_of(p)]
+        fn = decompress_file
+    else:
+        _check_codec(codec)
+        todo = [p for p in iter_files(root, pats)
+                if codec_of(p) is None and p.stat().st_size > 0 and now - p.stat().st_mtime >= min_age_s]
+        fn = lambda p: compress_file(p, codec, level)
+    tot_old = tot_new = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:  # zlib/lzma/bz2 nhả GIL khi nén
+        for old, new in ex.map(fn, todo):
+            tot_old += old; tot_new += new
+    return len(todo), tot_old, tot_new
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", required=True, help="runs_out_ablation / runs_out_ra / một thư mục sweep")
+    ap.add_argument("--codec", default="xz", choices=list(CODEC_SUFFIX))
+    ap.add_argument("--level", type=int, default=None)
+    ap.add_argument("--bitstreams", action="store_true", help="Nén cả *.vvc / str.bin")
+    ap.add_argument("--min-age-min", type=float, default=10, help="Bỏ qua file sửa đổi gần đây (job đang chạy)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--restore", action="store_true", help="Giải nén về file gốc")
+    args = ap.parse_args()
+
+    n, old, new = archive_tree(args.root, args.codec, args.bitstreams, args.min_age_min * 60, args.workers,
+                               args.restore, args.level)
+    verb = "restored" if args.restore else f"archived ({args.codec})"
+    print(f"[OK] {n} files {verb}: {old / (1 << 20):.1f} MiB -> {new / (1 << 20):.1f} MiB")
+
+if __name__ == "__main__":
+    main()
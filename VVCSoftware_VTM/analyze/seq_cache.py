@@ -0,0 +1,250 @@
+# seq_cache.py
+# Staging cache for input sequences: copy (or hard-link) each source YUV into a fast local
+# directory (tmpfs /dev/shm, local NVMe) before its first job, reference-count the jobs using it,
+# and evict idle entries in LRU order to stay under a size cap.
+#
+# Runners use it as:
+#   cache = SeqCache.from_args(args.stage_dir, args.stage_cap)     # None if staging is off
+#   cache.plan(seq["yuv"], n_jobs)                                 # optional: jobs still to come
+#   with cache.staged(seq["yuv"], nbytes) as yuv: ... run EncoderApp -i yuv ...
+#
+#   python seq_cache.py --stage-dir /dev/shm/vtm_seq            # list entries
+#   python seq_cache.py --stage-dir /dev/shm/vtm_seq --clear
+import argparse, hashlib, json, os, shutil, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+from yuv_io import CHROMA_SUBSAMPLING
+
+def parse_size(s):
+    """'64G' / '512M' / '1.5T' / '1000000' -> bytes; '' / 0 -> None (no cap)."""
+    s = str(s or "").strip().upper().rstrip("B")
+    if not s or s == "0": return None
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    if s[-1] in mult:
+        return int(float(s[:-1]) * mult[s[-1]])
+    return int(float(s))
+
+def default_stage_dir():
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    return base / "vtm_seq_cache"
+
+def seq_bytes(seq, frames=None):
+    """Bytes EncoderApp reads for `frames` frames of a YAML sequence entry (None = whole file)."""
+    if not frames: return None
+    w, h = int(seq["width"]), int(seq["height"])
+    sub = CHROMA_SUBSAMPLING[str(seq.get("chroma", "420"))]
+    samples = w * h + (2 * ((w + sub[0] - 1) // sub[0]) * ((h + sub[1] - 1) // sub[1]) if sub else 0)
+    return samples * (2 if int(seq.get("bitdepth", 8)) > 8 else 1) * (int(seq.get("frame_skip", 0)) + int(frames))
+
+class SeqCache:
+    def __init__(self, root=None, cap_bytes=None, link=True):
+        self.root = Path(root) if root else default_stage_dir()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.cap = cap_bytes
+        self.link = link
+        self._cv = threading.Condition()
+        self._index_path = self.root / "index.json"
+        # key -> {src, path, size, src_size, src_mtime, linked, refs, pending, last_used, state}
+        self.entries = {}
+        self.stats = {"hits": 0, "staged": 0, "evicted": 0, "bypass": 0}
+        self._planned = {}  # key -> số job đã khai báo trước khi entry được stage
+        self._load_index()
+
+    @classmethod
+    def from_args(cls, stage_dir, stage_cap=""):
+        # runner CLI: --stage-dir trống = tắt staging; "auto" = /dev/shm (hoặc temp)
+        if not stage_dir: return None
+        return cls(None if stage_dir == "auto" else stage_dir, parse_size(stage_cap))
+
+    # ------------------------- index -------------------------
+
+    def _key(self, src):
+        src = os.path.abspath(str(src))
+        return hashlib.sha1(src.encode("utf-8")).hexdigest()[:12] + "_" + Path(src).name
+
+    def _load_index(self):
+        # entry của lần chạy trước vẫn dùng được nếu file nguồn chưa đổi (size + mtime)
+        try:
+            old = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except Exception:
+            old = {}
+        for key, e in old.items():
+            p = Path(e["path"])
+            try:
+                st = os.stat(e["src"])
+            except OSError:
+                st = None
+            if p.exists() and st and st.st_size == e["src_size"] and st.st_mtime == e["src_mtime"]:
+                self.entries[key] = {**e, "linked": os.path.samefile(p, e["src"]), "refs": 0, "pending": 0, "state": "ready"}
+            elif p.exists():
+                p.unlink()
+
+    def _save_index(self):
+        keep = ("src", "path", "size", "src_size", "src_mtime", "linked", "last_used")
+        data = {k: {f: e[f] for f in keep} for k, e in self.entries.items() if e["state"] == "ready"}
+        tmp = self._index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1), encoding="utf-8")
+        os.replace(tmp, self._index_path)
+
+    @staticmethod
+    def _cost(e):
+        # hard link không chiếm thêm chỗ trên stage fs -> không tính vào cap
+        return 0 if e.get("linked") else e["size"]
+
+    def used_bytes(self):
+        return sum(self._cost(e) for e in self.entries.values())
+
+    # ------------------------- eviction -------------------------
+
+    def _evict_for(self, need):
+        """
+        Free space for `need` bytes under the cap (if any) and on the stage filesystem (tmpfs đầy -> encode fail);
+        idle entries without pending jobs go first, then LRU. Caller holds the lock.
+        """
+        if need == 0: return True
+        if self.cap is not None:
+            busy = sum(self._cost(e) for e in self.entries.values() if e["refs"] > 0 or e["state"] != "ready")
+            if busy + need > self.cap: return False   # không evict vô ích khi đằng nào cũng không vừa
+        # copy đang chạy ngoài lock chưa ghi xong -> trừ trước phần đã giữ chỗ
+        free = shutil.disk_usage(self.root).free - sum(self._cost(e) for e in self.entries.values() if e["state"] == "staging")
+        fits = lambda: (self.cap is None or self.used_bytes() + need <= self.cap) and need < free
+        idle = sorted((e["pending"] > 0, e["last_used"], k) for k, e in self.entries.items()
+                      if e["refs"] == 0 and e["state"] == "ready" and not e.get("linked"))  # bỏ link không trả lại chỗ
+        for _, _, k in idle:
+            if fits(): break
+            e = self.entries.pop(k)
+            Path(e["path"]).unlink(missing_ok=True)
+            free += self._cost(e)
+            self.stats["evicted"] += 1
+        return fits()
+
+    # ------------------------- staging -------------------------
+
+    def _copy(self, src, dst, nbytes, link=False):
+        if link:
+            os.link(src, dst)  # cùng volume (NVMe cache cạnh Sequences): không tốn chỗ, không copy
+            return
+        tmp = dst.with_name(dst.name + f".part{threading.get_ident()}")
+        with open(src, "rb") as fi, open(tmp, "wb") as fo:
+            if nbytes is None:
+                shutil.copyfileobj(fi, fo, 16 << 20)
+            else:
+                left = nbytes
+                while left > 0:
+                    b = fi.read(min(left, 16 << 20))
+                    if not b: break
+                    fo.write(b); left -= len(b)
+        os.replace(tmp, dst)
+
+    def plan(self, src, n_jobs=1):
+        """Declare jobs that will need `src` later; such entries are evicted last."""
+        with self._cv:
+            e = self.entries.get(self._key(src))
+            if e is not None:
+                e["pending"] += n_jobs
+            else:
+                self._planned[self._key(src)] = self._planned.get(self._key(src), 0) + n_jobs
+
+    def acquire(self, src, nbytes=None):
+        """
+        Staged path for `src` (refcount +1). nbytes = prefix EncoderApp actually reads (coarse runs: 16 frames).
+        Falls back to the original path when the entry cannot fit under the cap or the copy fails.
+        """
+        src = str(src)
+        key = self._key(src)
+        try:
+            st = os.stat(src)
+        except OSError:
+            return src
+        want = st.st_size if nbytes is None else min(int(nbytes), st.st_size)
+        with self._cv:
+            while True:
+                e = self.entries.get(key)
+                if e is None: break
+                if e["state"] == "staging":
+                    self._cv.wait(); continue
+                if e["size"] >= want and e["src_size"] == st.st_size and e["src_mtime"] == st.st_mtime:
+                    e["refs"] += 1; e["pending"] = max(0, e["pending"] - 1); e["last_used"] = time.time()
+                    self.stats["hits"] += 1
+                    return e["path"]
+                if e["refs"] > 0:
+                    # bản staged ngắn hơn đang được dùng -> job này đọc thẳng từ nguồn
+                    self.stats["bypass"] += 1
+                    return src
+                Path(self.entries.pop(key)["path"]).unlink(missing_ok=True)
+            # cả file, cùng filesystem -> chỉ hard link (copy sang cùng đĩa không nhanh hơn); link fail -> bypass
+            link = self.link and want == st.st_size and os.stat(self.root).st_dev == st.st_dev
+            if not self._evict_for(0 if link else want):
+                self.stats["bypass"] += 1
+                return src
+            dst = self.root / key
+            pending = self._planned.pop(key, 0)
+            self.entries[key] = {"src": src, "path": str(dst), "size": want, "src_size": st.st_size,
+                                 "src_mtime": st.st_mtime, "linked": link, "refs": 1, "pending": max(0, pending - 1),
+                                 "last_used": time.time(), "state": "staging"}
+        # copy ngoài lock: các sequence khác vẫn stage song song
+        try:
+            self._copy(src, dst, None if want == st.st_size else want, link)
+            ok = True
+        except OSError as ex:
+            print(f"[stage] {'link' if link else 'copy'} failed for {src}: {ex}")
+            ok = False
+        with self._cv:
+            if ok:
+                self.entries[key]["state"] = "ready"
+                self.stats["staged"] += 1
+                self._save_index()
+            else:
+                self.entries.pop(key, None)
+                dst.unlink(missing_ok=True)
+                self.stats["bypass"] += 1
+            self._cv.notify_all()
+        return str(dst) if ok else src
+
+    def release(self, path):
+        # chỉ theo path staged: path nguồn (acquire bypass) không giữ ref nào -> không được trừ ref của job khác
+        with self._cv:
+            for e in self.entries.values():
+                if path == e["path"] and e["refs"] > 0:
+                    e["refs"] -= 1; e["last_used"] = time.time()
+                    break
+            self._cv.notify_all()
+
+    @contextmanager
+    def staged(self, src, nbytes=None):
+        path = self.acquire(src, nbytes)
+        try:
+            yield path
+        finally:
+            if path != str(src):
+                self.release(path)
+
+    def clear(self):
+        with self._cv:
+            for k in [k for k, e in self.entries.items() if e["refs"] == 0 and e["state"] == "ready"]:
+                Path(self.entries.pop(k)["path"]).unlink(missing_ok=True)
+            self._save_index()
+
+    def summary(self):
+        return (f"[stage] {self.root}: {len(self.entries)} seq, {self.used_bytes() / (1 << 30):.2f} GiB"
+                f"{'' if self.cap is None else f' / cap {self.cap / (1 << 30):.2f} GiB'}, "
+                f"hits={self.stats['hits']} staged={self.stats['staged']} "
+                f"evicted={self.stats['evicted']} bypass={self.stats['bypass']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stage-dir", default="auto", help="Thư mục cache (mặc định /dev/shm/vtm_seq_cache)")
+    ap.add_argument("--clear", action="store_true")
+    args = ap.parse_args()
+
+    cache = SeqCache.from_args(args.stage_dir)
+    if args.clear:
+        cache.clear()
+    for k, e in sorted(cache.entries.items(), key=lambda kv: -kv[1]["last_used"]):
+        print(f"{e['size'] / (1 << 20):10.1f} MiB  {time.strftime('%Y-%m-%d %H:%M', time.localtime(e['last_used']))}  {e['src']}")
+    print(cache.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# seq_features.py
+# Content features per sequence (SI/TI per ITU-T P.910, motion, texture, colour) from the YUV with
+# vectorised NumPy kernels, cached in a JSON index; k-medoids clustering picks a small representative
+# subset for screening, and a report checks how well that subset predicts per-class results
+# (parse_res class buckets of efficiency_report_v1).
+#
+# Usage:
+#   python seq_features.py --yaml experiment_ablation.yaml --k 4 --out-dir seq_select
+#   python seq_features.py --yaml experiment_ablation.yaml --k 4 --out-dir seq_select ^
+#       --summary quickfire_summary_from_logs.csv          # + subset_prediction.csv
+import argparse, csv, json, os
+from pathlib import Path
+from collections import OrderedDict, defaultdict
+import numpy as np
+
+from yuv_io import YuvReader
+from efficiency_report_v1 import parse_res, read_summary, per_sequence_benefit, benefit_matrix, per_class_breakdown
+
+FEATURES = ["si_mean", "si_max", "ti_mean", "ti_max", "mad_mean", "moving_ratio",
+            "block_var", "grad_energy", "luma_mean", "luma_std", "chroma_std"]
+# đặc trưng dùng để phân cụm (log cho SI/TI/var vì phân bố lệch)
+CLUSTER_FEATURES = ["si_mean", "ti_mean", "moving_ratio", "block_var", "chroma_std"]
+LOG_FEATURES = {"si_mean", "ti_mean", "block_var"}
+
+# ------------------------- kernels -------------------------
+
+def _sobel_mag(y):
+    # (T, H, W) -> (T, H-2, W-2) độ lớn gradient Sobel
+    gx = (y[:, :-2, 2:] + 2 * y[:, 1:-1, 2:] + y[:, 2:, 2:]) - (y[:, :-2, :-2] + 2 * y[:, 1:-1, :-2] + y[:, 2:, :-2])
+    gy = (y[:, 2:, :-2] + 2 * y[:, 2:, 1:-1] + y[:, 2:, 2:]) - (y[:, :-2, :-2] + 2 * y[:, :-2, 1:-1] + y[:, :-2, 2:])
+    return np.sqrt(gx * gx + gy * gy)
+
+def _block_var(y, b=8):
+    t, h, w = y.shape
+    blk = y[:, :h // b * b, :w // b * b].reshape(t, h // b, b, w // b, b)
+    return blk.var(axis=(2, 4)).mean(axis=(1, 2))
+
+def frame_features(y, y_prev, u=None, v=None, moving_thr=3.0):
+    """Per-frame arrays for a (T, H, W) float luma block on the 8-bit scale; y_prev = frames n-1 (same shape)."""
+    g = _sobel_mag(y)
+    d = y - y_prev
+    out = {"si": g.std(axis=(1, 2)), "grad_energy": (g * g).mean(axis=(1, 2)),
+           "ti": d.std(axis=(1, 2)), "mad": np.abs(d).mean(axis=(1, 2)),
+           "moving": (np.abs(d) > moving_thr).mean(axis=(1, 2)),
+           "block_var": _block_var(y), "luma_mean": y.mean(axis=(1, 2)), "luma_std": y.std(axis=(1, 2))}
+    if u is not None:
+        out["chroma_std"] = 0.5 * (u.std(axis=(1, 2)) + v.std(axis=(1, 2)))
+    return out
+
+def sequence_features(seq, max_frames=64, step=1, chunk=8):
+    r = YuvReader.from_seq(seq)
+    stop = min(len(r), max_frames * step) if max_frames else len(r)
+    scale = 1.0 / (1 << (r.bitdepth - 8))
+    acc = defaultdict(list)
+    prev_last = None
+    for s, pl in r.iter_chunks(chunk, 0, stop, step):
+        y = pl["y"].astype(np.float32) * scale
+        first = prev_last if prev_last is not None else y[:1]
+        yp = np.concatenate([first, y[:-1]])
+        f = frame_features(y, yp, *(p.astype(np.float32) * scale for p in (pl.get("u"), pl.get("v")) if p is not None))
+        if prev_last is None:
+            # frame đầu không có frame trước -> bỏ khỏi thống kê thời gian
+            for k in ("ti", "mad", "moving"): f[k] = f[k][1:]
+        for k, v in f.items(): acc[k].append(v)
+        prev_last = y[-1:]
+    a = {k: np.concatenate(v) for k, v in acc.items()}
+    nz = lambda x, fn: float(fn(x)) if len(x) else 0.0
+    return {"si_mean": nz(a["si"], np.mean), "si_max": nz(a["si"], np.max),
+            "ti_mean": nz(a["ti"], np.mean), "ti_max": nz(a["ti"], np.max),
+            "mad_mean": nz(a["mad"], np.mean), "moving_ratio": nz(a["moving"], np.mean),
+            "block_var": nz(a["block_var"], np.mean), "grad_energy": nz(a["grad_energy"], np.mean),
+            "luma_mean": nz(a["luma_mean"], np.mean), "luma_std": nz(a["luma_std"], np.mean),
+            "chroma_std": nz(a.get("chroma_std", []), np.mean), "frames_used": int(len(a["si"]))}
+
+# ------------------------- index -------------------------
+
+def load_index(path):
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def index_features(sequences, index_path, max_frames=64, step=1):
+    """Features for every YAML sequence; recomputed only when the YUV (size/mtime) or sampling changed."""
+    idx = load_index(index_path)
+    out = OrderedDict()
+    for seq in sequences:
+        if "yuv" not in seq or not Path(seq["yuv"]).exists():
+            print(f"[skip] {seq['name']}: no YUV"); continue
+        st = os.stat(seq["yuv"])
+        sig = {"size": st.st_size, "mtime": st.st_mtime, "max_frames": max_frames, "step": step,
+               "width": int(seq["width"]), "height": int(seq["height"]), "bitdepth": int(seq.get("bitdepth", 8))}
+        e = idx.get(seq["name"])
+        if e is None or e.get("sig") != sig:
+            print(f"[feat] {seq['name']} ...")
+            e = {"sig": sig, "yuv": str(seq["yuv"]), "features": sequence_features(seq, max_frames, step)}
+            idx[seq["name"]] = e
+        out[seq["name"]] = e["features"]
+    Path(index_path).write_text(json.dumps(idx, indent=1), encoding="utf-8")
+    return out
+
+# ------------------------- clustering / selection -------------------------
+
+def feature_matrix(feats, names=CLUSTER_FEATURES):
+    seqs = list(feats)
+    X = np.array([[feats[s][f] for f in names] for s in seqs], float)
+    for j, f in enumerate(names):
+        if f in LOG_FEATURES: X[:, j] = np.log1p(np.maximum(X[:, j], 0.0))
+    sd = X.std(axis=0); sd[sd == 0] = 1.0
+    return seqs, (X - X.mean(axis=0)) / sd
+
+def kmedoids(D, k, n_iter=100):
+    """PAM (BUILD + SWAP) on a distance matrix; deterministic. Returns (medoid indices, labels)."""
+    n = D.shape[0]
+    k = max(1, min(k, n))
+    med = [int(np.argmin(D.sum(axis=1)))]
+    while len(med) < k:
+        cur = D[:, med].min(axis=1)
+        gain = np.maximum(cur[:, None] - D, 0.0).sum(axis=0)
+        gain[med] = -1
+        med.append(int(np.argmax(gain)))
+    cost = D[:, med].min(axis=1).sum()
+    for _ in range(n_iter):
+        best = (cost, None, None)
+        for i in range(k):
+            others = med[:i] + med[i + 1:]
+            base = D[:, others].min(axis=1) if others else np.full(n, np.inf)
+            # cost nếu thay medoid i bằng từng ứng viên h (vector hóa trên h)
+            c = np.minimum(base[:, None], D).sum(axis=0)
+            c[med] = np.inf
+            h = int(np.argmin(c))
+            if c[h] < best[0] - 1e-12: best = (c[h], i, h)
+        if best[1] is None: break
+        cost = best[0]; med[best[1]] = best[2]
+    labels = np.argmin(D[:, med], axis=1)
+    return med, labels
+
+def select_representatives(feats, k, per_class=False, max_dist=None):
+    """k medoids; with max_dist, the smallest k whose every sequence lies within max_dist (z-score units) of its medoid."""
+    seqs, Z = feature_matrix(feats)
+    D = np.sqrt(((Z[:, None, :] - Z[None, :, :]) ** 2).sum(axis=-1))
+    if max_dist is not None:
+        for kk in range(1, len(seqs) + 1):
+            med, labels = kmedoids(D, kk)
+            if D[np.arange(len(seqs)), np.array(med)[labels]].max() <= max_dist: break
+    else:
+        med, labels = kmedoids(D, k)
+    if per_class:
+        # bảo đảm mỗi class (B/C/D/...) có ít nhất 1 đại diện: thêm sequence gần tâm class nhất
+        cls = np.array([parse_res(s)[2] or "U" for s in seqs])
+        for c in OrderedDict.fromkeys(cls):
+            if not any(cls[m] == c for m in med):
+                idx = np.nonzero(cls == c)[0]
+                med.append(int(idx[np.argmin(D[np.ix_(idx, idx)].sum(axis=1))]))
+        labels = np.argmin(D[:, med], axis=1)
+    rows = [{"sequence": s, "class": parse_res(s)[2] or "U", "cluster": int(labels[i]),
+             "representative": seqs[med[labels[i]]], "is_representative": i in med,
+             "distance": float(D[i, med[labels[i]]]), "weight": int((labels == labels[i]).sum()) if i in med else 0}
+            for i, s in enumerate(seqs)]
+    return [seqs[m] for m in med], rows
+
+# ------------------------- subset prediction report -------------------------
+
+def subset_prediction(summary_csv, assign):
+    """
+    assign: sequence -> representative. Each sequence's benefit is predicted by its representative's;
+    compare predicted vs actual per (tool, class) means and per-class tool ranking.
+    """
+    bm = benefit_matrix(per_sequence_benefit(read_summary(summary_csv)))
+    full = {(r["group"], r["experiment"], r["class"]): r["mean"] for r in per_class_breakdown(bm)}
+    col = {s: j for j, s in enumerate(bm["seqs"])}
+    V = bm["values"]
+    P = np.full_like(V, np.nan)
+    for s, j in col.items():
+        rep = assign.get(s)
+        if rep in col: P[:, j] = V[:, col[rep]]
+    pred = {(r["group"], r["experiment"], r["class"]): r["mean"]
+            for r in per_class_breakdown({**bm, "values": P, "mask": ~np.isnan(P)})}
+    rows = [{"group": g, "experiment": e, "class": c, "actual": full[(g, e, c)], "predicted": pred[(g, e, c)],
+             "error": pred[(g, e, c)] - full[(g, e, c)]} for (g, e, c) in full if (g, e, c) in pred]
+    stats = {}
+    for c in sorted({r["class"] for r in rows}) + ["ALL"]:
+        rs = [r for r in rows if c == "ALL" or r["class"] == c]
+        a = np.array([r["actual"] for r in rs]); p = np.array([r["predicted"] for r in rs])
+        st = {"n": len(rs), "mae": float(np.abs(p - a).mean()) if len(rs) else None,
+              "pearson": float(np.corrcoef(a, p)[0, 1]) if len(rs) > 2 and a.std() > 0 and p.std() > 0 else None,
+              "sign_agree": float(np.mean(np.sign(a) == np.sign(p))) if len(rs) else None}
+        if len(rs) > 2:
+            ra, rp = np.argsort(np.argsort(-a)), np.argsort(np.argsort(-p))
+            st["spearman"] = float(np.corrcoef(ra, rp)[0, 1]) if ra.std() > 0 else None
+        stats[c] = st
+    return rows, stats
+
+def write_csv(path, rows, header):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=header, extrasaction="ignore"); w.writeheader(); [w.writerow(r) for r in rows]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--yaml", required=True, help="Experiment YAML (sequences: name, yuv, width, height, ...)")
+    ap.add_argument("--k", type=int, default=4, help="Số sequence đại diện")
+    ap.add_argument("--max-dist", type=float, default=None,
+                    help="Tự chọn k nhỏ nhất sao cho mọi sequence cách đại diện <= max-dist (đơn vị z-score); bỏ qua --k")
+    ap.add_argument("--per-class", action="store_true", help="Bảo đảm mỗi class có ít nhất 1 đại diện")
+    ap.add_argument("--max-frames", type=int, default=64, help="Số frame phân tích mỗi sequence (0 = tất cả)")
+    ap.add_argument("--step", type=int, default=1, help="Lấy mẫu thời gian (TI tính giữa các frame được lấy)")
+    ap.add_argument("--index", default="seq_features.json", help="Cache đặc trưng")
+    ap.add_argument("--summary", default="", help="Per-seq BD summary (quickfire_summary_*.csv) để kiểm tra subset")
+    ap.add_argument("--out-dir", default="seq_select")
+    args = ap.parse_args()
+
+    import yaml
+    cfg = yaml.safe_load(Path(args.yaml).read_text(encoding="utf-8"))
+    out = Path(args.out_dir); out.mkdir(parents=True, exist_ok=True)
+
+    feats = index_features(cfg["sequences"], args.index, args.max_frames, args.step)
+    if not feats:
+        raise SystemExit("No sequence with a readable YUV")
+    write_csv(out / "seq_features.csv", [{"sequence": s, "class": parse_res(s)[2] or "U", **f} for s, f in feats.items()],
+              ["sequence", "class", *FEATURES, "frames_used"])
+
+    reps, rows = select_representatives(feats, args.k, args.per_class, args.max_dist)
+    write_csv(out / "seq_clusters.csv", rows,
+              ["sequence", "class", "cluster", "representative", "is_representative", "distance", "weight"])
+    subset = [s for s in cfg["sequences"] if s["name"] in reps]
+    (out / "sequences_subset.yaml").write_text(
+        yaml.safe_dump({"sequences": subset}, sort_keys=False, allow_unicode=True), encoding="utf-8")
+    print(f"[OK] {len(reps)}/{len(feats)} representatives: {', '.join(reps)}")
+
+    if args.summary:
+        assign = {r["sequence"]: r["representative"] for r in rows}
+        pr, stats = subset_prediction(args.summary, assign)
+        write_csv(out / "subset_prediction.csv", pr, ["group", "experiment", "class", "actual", "predicted", "error"])
+        (out / "subset_prediction.json").write_text(json.dumps(stats, indent=2), encoding="utf-8")
+        for c, st in stats.items():
+            print(f"[predict] class {c}: n={st['n']} mae={st['mae']} pearson={st['pearson']} "
+                  f"spearman={st.get('spearman')} sign={st['sign_agree']}")
+
+if __name__ == "__main__":
+    main()
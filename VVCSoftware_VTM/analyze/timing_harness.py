@@ -0,0 +1,249 @@
+# timing_harness.py
+# Helpers for timing-critical encodes: core pinning, CPU frequency/load snapshots,
+# robust statistics (median, MAD) and a paired sign-flip permutation test for anchor-vs-test speed ratios.
+#
+# Offline report from an orchestrate_vtm timing.csv:
+#   python timing_harness.py --timing runs_out_ablation\timing.csv
+import argparse, csv, itertools, math, os, random, statistics
+from pathlib import Path
+from collections import defaultdict
+
+# ------------------------- cores / machine state -------------------------
+
+def parse_cores(spec: str):
+    """'2-5,8,10-11' -> [2,3,4,5,8,10,11]"""
+    cores = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part: continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            cores += list(range(int(a), int(b) + 1))
+        else:
+            cores.append(int(part))
+    return sorted(set(cores))
+
+def usable_cores(cores):
+    # bỏ core không nằm trong affinity mask của tiến trình hiện tại (Linux)
+    if hasattr(os, "sched_getaffinity"):
+        allowed = os.sched_getaffinity(0)
+        return [c for c in cores if c in allowed]
+    return [c for c in cores if c < (os.cpu_count() or 1)]
+
+def pin_preexec(core):
+    """preexec_fn for subprocess on Linux; None where affinity must be set after spawn."""
+    if core is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    return lambda: os.sched_setaffinity(0, {core})
+
+def pin_pid(pid, core):
+    # Windows / macOS: optional psutil, best effort
+    if core is None or hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        import psutil
+        psutil.Process(pid).cpu_affinity([core])
+    except Exception:
+        pass
+
+def cpu_mhz(core=None):
+    if core is not None:
+        p = Path(f"/sys/devices/system/cpu/cpu{core}/cpufreq/scaling_cur_freq")
+        try:
+            return int(p.read_text().strip()) / 1000.0
+        except Exception:
+            pass
+    try:
+        mhz = [float(ln.split(":")[1]) for ln in Path("/proc/cpuinfo").read_text().splitlines()
+               if ln.lower().startswith("cpu mhz")]
+        if mhz:
+            return mhz[core] if core is not None and core < len(mhz) else sum(mhz) / len(mhz)
+    except Exception:
+        pass
+    try:
+        import psutil
+        f = psutil.cpu_freq()
+        return f.current if f else None
+    except Exception:
+        return None
+
+def load_avg():
+    try:
+        return os.getloadavg()[0]
+    except Exception:
+        return None
+
+def snapshot(core=None):
+    return {"cpu_mhz": cpu_mhz(core), "load": load_avg()}
+
+# ------------------------- job ordering -------------------------
+
+def interleave_repeats(blocks, repeats):
+    """
+    blocks: list of job lists that must be compared with each other (anchor first, then tests).
+    Returns rep-major order; every other repeat runs the block reversed (ABBA) so slow drift
+    (thermal, background load) hits anchor and test equally.
+    """
+    out = []
+    for rep in range(repeats):
+        for block in blocks:
+            seq = block if rep % 2 == 0 else block[::-1]
+            out += [(rep, j) for j in seq]
+    return out
+
+# ------------------------- statistics -------------------------
+
+def median(xs):
+    return statistics.median(xs) if xs else float("nan")
+
+def mad(xs):
+    """Median absolute deviation (unscaled)."""
+    if not xs: return float("nan")
+    m = statistics.median(xs)
+    return statistics.median([abs(x - m) for x in xs])
+
+def permutation_pvalue(a, b, max_exact=20000, n_random=20000, seed=0):
+    """
+    Two-sided permutation test on the difference of medians of log(time).
+    Exact enumeration when the number of splits is small, else seeded Monte-Carlo.
+    """
+    la = [math.log(x) for x in a]; lb = [math.log(x) for x in b]
+    if len(la) < 2 or len(lb) < 2:
+        return float("nan")
+    pooled = la + lb
+    n, k = len(pooled), len(la)
+    obs = abs(statistics.median(lb) - statistics.median(la))
+
+    def stat(idx_a):
+        sa = set(idx_a)
+        xa = [pooled[i] for i in idx_a]
+        xb = [pooled[i] for i in range(n) if i not in sa]
+        return abs(statistics.median(xb) - statistics.median(xa))
+
+    if math.comb(n, k) <= max_exact:
+        splits = itertools.combinations(range(n), k)
+        total = math.comb(n, k)
+    else:
+        rng = random.Random(seed)
+        splits = (rng.sample(range(n), k) for _ in range(n_random))
+        total = n_random
+    hits = sum(1 for s in splits if stat(s) >= obs - 1e-12)
+    return hits / total
+
+def signflip_pvalue(log_ratios, max_exact=16, n_random=20000, seed=0):
+    """
+    Two-sided paired permutation test: flip the sign of each per-repeat log(test/anchor) under H0
+    (no speed difference), statistic = |sum|. Exact over 2^n flips when small, else seeded Monte-Carlo.
+    Smallest attainable p = 2 / 2^n (n = pairs).
+    """
+    d = list(log_ratios)
+    n = len(d)
+    if n < 2:
+        return float("nan")
+    obs = abs(sum(d))
+    if n <= max_exact:
+        signs = itertools.product((1, -1), repeat=n)
+        total = 2 ** n
+    else:
+        rng = random.Random(seed)
+        signs = ([rng.choice((1, -1)) for _ in range(n)] for _ in range(n_random))
+        total = n_random
+    hits = sum(1 for sg in signs if abs(sum(x * y for x, y in zip(sg, d))) >= obs - 1e-12)
+    return hits / total
+
+def min_pairs(alpha=0.05):
+    """Số cặp tối thiểu để sign-flip test có thể cho p < alpha."""
+    n = 1
+    while 2.0 / 2 ** n >= alpha:
+        n += 1
+    return n
+
+def bootstrap_ratio_ci(log_ratios, level=0.95, n_boot=5000, seed=0):
+    """
+    Geometric-mean ratio exp(mean(log_ratios)) with a seeded percentile-bootstrap CI.
+    Returns (ratio, lo, hi); NaNs when there is nothing to resample.
+    """
+    if not log_ratios:
+        return float("nan"), float("nan"), float("nan")
+    n = len(log_ratios)
+    point = math.exp(sum(log_ratios) / n)
+    if n < 2:
+        return point, float("nan"), float("nan")
+    rng = random.Random(seed)
+    boots = sorted(math.exp(sum(rng.choice(log_ratios) for _ in range(n)) / n) for _ in range(n_boot))
+    lo = boots[int((1.0 - level) / 2 * (n_boot - 1))]
+    hi = boots[int((1.0 + level) / 2 * (n_boot - 1))]
+    return point, lo, hi
+
+def speed_ratio_stats(anchor_times, test_times, alpha=0.05, log_ratios=None):
+    """
+    ratio = median(test)/median(anchor) (<1 = faster) + MADs + p-value.
+    log_ratios (per-repeat log(test/anchor), ABBA pairs) -> paired sign-flip test; else unpaired permutation test.
+    """
+    a = [t for t in anchor_times if t and t > 0]
+    b = [t for t in test_times if t and t > 0]
+    ma, mb = median(a), median(b)
+    p = signflip_pvalue(log_ratios) if log_ratios is not None else permutation_pvalue(a, b)
+    return {"n_anchor": len(a), "n_test": len(b), "n_pairs": len(log_ratios) if log_ratios is not None else 0,
+            "median_anchor_s": ma, "mad_anchor_s": mad(a),
+            "median_test_s": mb, "mad_test_s": mad(b),
+            "speed_ratio": mb / ma if a and b else float("nan"),
+            "p_value": p, "significant": (p == p) and p < alpha}
+
+# ------------------------- report -------------------------
+
+def timing_summary(timing_csv, alpha=0.05):
+    """
+    timing.csv from orchestrate_vtm --timing-repeats: one row per repeat.
+    Compares every non-baseline (group, tool) with its group's baseline on the same (seq, qp).
+    """
+    times = defaultdict(dict)   # key -> {rep: enc_time_s}
+    anchor_of = {}
+    with open(timing_csv, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            if str(r.get("retcode", "0")) != "0": continue
+            try: t = float(r["enc_time_s"])
+            except: continue
+            if not t > 0: continue
+            key = (r["group"], r["tool"], r["seq"], int(r["qp"]))
+            times[key][int(r.get("rep") or len(times[key]))] = t
+            anchor_of[(r["group"], r["tool"])] = r.get("anchor", "")
+    rows = []
+    for (grp, tool, seq, qp), ts in sorted(times.items()):
+        if grp == "Baseline": continue
+        anchor = anchor_of.get((grp, tool), "")
+        ref = times.get(("Baseline", anchor, seq, qp))
+        if not ref: continue
+        # ABBA: anchor và test cùng rep chạy sát nhau -> ghép cặp theo rep
+        pairs = [math.log(ts[k] / ref[k]) for k in sorted(ts.keys() & ref.keys())]
+        st = speed_ratio_stats(list(ref.values()), list(ts.values()), alpha, pairs)
+        rows.append({"group": grp, "tool": tool, "anchor": anchor, "seq": seq, "qp": qp, **st})
+    need = min_pairs(alpha)
+    short = sum(1 for r in rows if r["n_pairs"] < need)
+    if short:
+        print(f"[warn] timing: {short}/{len(rows)} comparisons have < {need} paired repeats -> "
+              f"p < {alpha} is unreachable there (min p = 2/2^n); use --timing-repeats {need} or more")
+    return rows
+
+SUMMARY_HEADER = ["group","tool","anchor","seq","qp","n_anchor","n_test","n_pairs","median_anchor_s","mad_anchor_s",
+                  "median_test_s","mad_test_s","speed_ratio","p_value","significant"]
+
+def write_summary(rows, out_csv):
+    with open(out_csv, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_HEADER); w.writeheader(); [w.writerow(r) for r in rows]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--timing", required=True, help="timing.csv (orchestrate_vtm --timing-repeats)")
+    ap.add_argument("--out", default=None, help="mặc định: timing_summary.csv cạnh timing.csv")
+    ap.add_argument("--alpha", type=float, default=0.05)
+    args = ap.parse_args()
+
+    out = Path(args.out) if args.out else Path(args.timing).parent / "timing_summary.csv"
+    rows = timing_summary(args.timing, args.alpha)
+    write_summary(rows, out)
+    sig = sum(1 for r in rows if r["significant"])
+    print(f"[OK] {len(rows)} comparisons ({sig} significant at alpha={args.alpha}) -> {out}")
+
+if __name__ == "__main__":
+    main()
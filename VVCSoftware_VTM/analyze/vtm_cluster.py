@@ -0,0 +1,371 @@
+# vtm_cluster.py
+# Chạy sweep của orchestrate_vtm trên nhiều máy: coordinator giữ hàng đợi job + journal kết quả,
+# worker trên các host khác kéo job qua TCP (JSON lines), chạy EncoderApp tại chỗ (vtm_runner) rồi gửi lại
+# result record + enc.log + summary file (zlib). Coordinator ghi log/summary vào layout orchestrate
+# (<out_dir>/<tag>_<seq>_QP<qp>/enc.log) và parse bằng parse_vtm_log -> results.csv y như chạy 1 máy.
+#
+#   lease: job được giao kèm hạn --lease giây; worker gửi heartbeat mỗi lease/3 giây cho các job đang chạy.
+#          Hết hạn (worker chết / mất mạng) -> job quay lại hàng đợi (tối đa --max-attempts lần giao).
+#   journal: <out_dir>/journal.jsonl, mỗi job xong 1 dòng; chạy lại coordinator = resume (bỏ job đã có trong journal).
+#   Bitstream ở lại trên worker (<work-dir>); timing / recon-fifo / decode vẫn dùng orchestrate_vtm 1 máy.
+#
+#   python vtm_cluster.py coordinator --exp experiment_ablation.yaml --bind 0.0.0.0:7070 --token s3cret --lease 120
+#   python vtm_cluster.py worker --connect coord-host:7070 --token s3cret --slots 24 --work-dir /scratch/vtm \
+#       --vtm-bin /opt/vtm/EncoderApp --path-map "C:/Users/LQ Duy/Documents/Project/VideoCoding/Setup/Sequences=/mnt/seq"
+#   python vtm_cluster.py local --exp experiment_ra_test.yaml --workers 3 --slots 2     # test trên localhost
+import argparse, asyncio, base64, csv, json, os, socket, subprocess, sys, threading, time, uuid, zlib
+from collections import deque
+from pathlib import Path
+
+from orchestrate_vtm import build_cmd, iter_jobs, job_dir_for, load_experiment, parse_vtm_log
+from run_archive import CODEC_SUFFIX, open_writer, read_bytes, resolve
+from vtm_runner import add_runner_args, job_spec, limits_from_args, run_job
+from vtm_summary import summary_path_for
+
+RESULT_HEADER = ["group","tool","seq","qp","bitrate_kbps","psnr_y","psnr_u","psnr_v","psnr_yuv","enc_time_s","retcode"]
+
+def _pack(b):
+    return base64.b64encode(zlib.compress(b, 6)).decode("ascii")
+
+def _unpack(s):
+    return zlib.decompress(base64.b64decode(s)) if s else b""
+
+def job_id(job, out_dir):
+    seq, qp, _, _, tag, _ = job["cmd_spec"]
+    return job_dir_for(out_dir, tag, seq, qp).name
+
+# ------------------------- coordinator -------------------------
+
+class Coordinator:
+    """Job queue + leases + journal; one asyncio server, every message = one JSON line request -> one reply."""
+
+    def __init__(self, exp, out_dir, token="", lease_s=120, max_attempts=3, log_codec=None, verbose=False):
+        self.exp, self.out_dir, self.token = exp, Path(out_dir), token
+        self.lease_s, self.max_attempts, self.log_codec, self.verbose = lease_s, max_attempts, log_codec, verbose
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = {}                     # id -> job (orchestrate plan); baseline lặp giữa các group = 1 job
+        for j in iter_jobs(exp, self.out_dir, True):
+            self.jobs.setdefault(job_id(j, self.out_dir), j)
+        self.journal_path = self.out_dir / "journal.jsonl"
+        done = set()
+        if self.journal_path.exists():
+            for ln in self.journal_path.read_text(encoding="utf-8").splitlines():
+                try: done.add(json.loads(ln)["job_id"])
+                except (ValueError, KeyError): pass
+        self.done = done & set(self.jobs)
+        self.pending = deque(i for i in self.jobs if i not in self.done)
+        self.leases = {}                   # id -> {"worker", "deadline", "attempts"}
+        self.attempts = {}
+        self.workers = {}                  # worker id -> last seen
+        self.failed = set()
+        self.conns = set()
+        csv_path = self.out_dir / "results.csv"
+        resume = bool(self.done) and csv_path.exists()
+        self.fcsv = open(csv_path, "a" if resume else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.fcsv)
+        if not resume:
+            self.writer.writerow(RESULT_HEADER)
+        self.fjournal = open(self.journal_path, "a", encoding="utf-8")
+        self.finished = asyncio.Event()
+        print(f"[coord] {len(self.jobs)} jobs, {len(self.done)} already in journal, {len(self.pending)} queued")
+
+    def _exp_globals(self):
+        return {k: self.exp.get(k) for k in ("vtm_bin", "base_cfg", "fixed_args")}
+
+    def _check_finished(self):
+        if not self.pending and not self.leases:
+            self.finished.set()
+
+    def handle(self, msg):
+        op = msg.get("op")
+        if self.token and msg.get("token") != self.token:
+            return {"op": "error", "error": "bad token"}
+        w = msg.get("worker", "?")
+        self.workers[w] = time.time()
+        if op == "hello":
+            return {"op": "welcome", "exp": self._exp_globals(), "lease_s": self.lease_s}
+        if op == "lease":
+            if not self.pending:
+                return {"op": "done"} if not self.leases else {"op": "wait", "s": min(5, self.lease_s / 3)}
+            jid = self.pending.popleft()
+            n = self.attempts[jid] = self.attempts.get(jid, 0) + 1
+            self.leases[jid] = {"worker": w, "deadline": time.time() + self.lease_s, "attempts": n}
+            seq, qp, job_args, _, tag, _ = self.jobs[jid]["cmd_spec"]
+            if self.verbose:
+                print(f"[lease] {jid} -> {w} (attempt {n})")
+            return {"op": "job", "job_id": jid, "seq": seq, "qp": qp, "args": job_args, "tag": tag}
+        if op == "heartbeat":
+            now = time.time()
+            for jid in msg.get("jobs", []):
+                l = self.leases.get(jid)
+                if l is not None and l["worker"] == w:
+                    l["deadline"] = now + self.lease_s
+            return {"op": "ok"}
+        if op == "result":
+            return self._result(w, msg)
+        return {"op": "error", "error": f"unknown op {op!r}"}
+
+    def _result(self, w, msg):
+        jid = msg["job_id"]
+        if jid in self.done or jid not in self.jobs:
+            return {"op": "ok", "dup": True}  # lease cũ đã giao lại và job đã xong ở worker khác
+        self.leases.pop(jid, None)
+        job = self.jobs[jid]
+        seq, qp, _, _, tag, _ = job["cmd_spec"]
+        log_path = job_dir_for(self.out_dir, tag, seq, qp) / "enc.log"
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_bytes = _unpack(msg.get("log"))
+        with open_writer(log_path, self.log_codec) as f:
+            f.write(log_bytes)
+        summ = _unpack(msg.get("summary"))
+        sp = Path(summary_path_for(log_path))
+        if summ:
+            sp.write_bytes(summ)
+        else:
+            sp.unlink(missing_ok=True)
+        res = msg.get("result") or {}
+        br, py, pu, pv, pyuv, tenc = parse_vtm_log(log_bytes.decode("utf-8", errors="ignore"), log_path)
+        if tenc != tenc and res.get("wall_s") is not None:
+            tenc = res["wall_s"]
+        self.writer.writerow([job["group"], job["tool"], job["seq"], qp, br, py, pu, pv, pyuv, tenc, res.get("retcode")])
+        self.fcsv.flush()
+        self.fjournal.write(json.dumps({"job_id": jid, "worker": w, "attempt": self.attempts.get(jid, 1), **res}) + "\n")
+        self.fjournal.flush()
+        self.done.add(jid)
+        if res.get("status") != "DONE":
+            self.failed.add(jid)
+        print(f"[{res.get('status', '?'):8s}] {jid} <- {w}  ({len(self.done)}/{len(self.jobs)})")
+        self._check_finished()
+        return {"op": "ok"}
+
+    def reap(self):
+        """Requeue jobs whose lease expired (no heartbeat); give up after max_attempts."""
+        now = time.time()
+        for jid, l in list(self.leases.items()):
+            if l["deadline"] > now: continue
+            del self.leases[jid]
+            if l["attempts"] >= self.max_attempts:
+                print(f"[lost] {jid}: lease expired {l['attempts']}x (last worker {l['worker']}), giving up")
+                self.failed.add(jid); self.done.add(jid)
+                self.fjournal.write(json.dumps({"job_id": jid, "worker": l["worker"], "attempt": l["attempts"],
+                                                "status": "LOST", "retcode": None}) + "\n")
+                self.fjournal.flush()
+            else:
+                print(f"[requeue] {jid}: lease of {l['worker']} expired")
+                self.pending.appendleft(jid)
+        self._check_finished()
+
+    async def _client(self, reader, writer):
+        self.conns.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try:
+                    reply = self.handle(json.loads(line))
+                except Exception as e:  # request hỏng không được làm chết coordinator
+                    reply = {"op": "error", "error": f"{e.__class__.__name__}: {e}"}
+                writer.write((json.dumps(reply) + "\n").encode()); await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.conns.discard(writer)
+            writer.close()
+
+    async def serve(self, host, port, ready=None, linger_s=2.0):
+        server = await asyncio.start_server(self._client, host, port, limit=1 << 28)
+        port = server.sockets[0].getsockname()[1]
+        print(f"[coord] listening on {host}:{port}")
+        if ready is not None: ready(port)
+        self._check_finished()
+        async def reaper():
+            while True:
+                await asyncio.sleep(1.0); self.reap()
+        rt = asyncio.create_task(reaper())
+        try:
+            await self.finished.wait()
+            await asyncio.sleep(linger_s)  # worker đang hỏi lease nhận "done" rồi tự thoát
+        finally:
+            rt.cancel(); server.close()
+            for wr in list(self.conns): wr.close()  # heartbeat / worker còn giữ kết nối -> EOF
+            await server.wait_closed()
+            self.fcsv.close(); self.fjournal.close()
+        print(f"[coord] done: {len(self.done) - len(self.failed)} ok, {len(self.failed)} failed/lost -> {self.out_dir / 'results.csv'}")
+        return not self.failed
+
+# ------------------------- worker -------------------------
+
+class Conn:
+    """Blocking JSON-lines client (one per slot / heartbeat thread)."""
+
+    def __init__(self, addr, token, worker):
+        host, port = addr.rsplit(":", 1)
+        self.sock = socket.create_connection((host, int(port)), timeout=60)
+        self.f = self.sock.makefile("rwb")
+        self.token, self.worker = token, worker
+
+    def call(self, op, **kw):
+        self.f.write((json.dumps({"op": op, "worker": self.worker, "token": self.token, **kw}) + "\n").encode())
+        self.f.flush()
+        line = self.f.readline()
+        if not line:
+            raise ConnectionError("coordinator closed the connection")
+        reply = json.loads(line)
+        if reply.get("op") == "error":
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def close(self):
+        try: self.f.close(); self.sock.close()
+        except OSError: pass
+
+def map_path(p, path_map):
+    s = str(p)
+    for src, dst in path_map:
+        if s.replace("\\", "/").startswith(src.replace("\\", "/")):
+            return dst + s.replace("\\", "/")[len(src.replace("\\", "/")):]
+    return s
+
+def run_worker(addr, token="", slots=1, work_dir="vtm_work", vtm_bin=None, base_cfg=None, path_map=(),
+               limits=None, worker=None, keep_logs=False):
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+    work_dir = Path(work_dir).resolve()
+    limits = limits or {}
+    c0 = Conn(addr, token, worker)
+    hello = c0.call("hello"); c0.close()
+    exp = dict(hello["exp"])
+    exp["vtm_bin"] = vtm_bin or map_path(exp["vtm_bin"], path_map)
+    exp["base_cfg"] = base_cfg or map_path(exp["base_cfg"], path_map)
+    exp["fixed_args"] = exp.get("fixed_args") or []
+    hb_every = max(1.0, hello["lease_s"] / 3)
+    running, lock, stop = set(), threading.Lock(), threading.Event()
+    print(f"[worker {worker}] {slots} slots, work dir {work_dir}")
+
+    def heartbeat():
+        c = None
+        while not stop.wait(hb_every):
+            with lock: ids = list(running)
+            if not ids: continue
+            try:
+                c = c or Conn(addr, token, worker)
+                c.call("heartbeat", jobs=ids)
+            except (OSError, ConnectionError, RuntimeError) as e:
+                # lỗi tạm (mạng, coordinator bận) -> nối lại ở nhịp sau, không bỏ heartbeat của job đang chạy
+                print(f"[worker {worker}] heartbeat: {e.__class__.__name__}: {e}")
+                if c: c.close()
+                c = None
+        if c: c.close()
+
+    def slot(k):
+        c = Conn(addr, token, worker)
+        n = 0
+        while True:
+            try:
+                r = c.call("lease")
+            except (OSError, ConnectionError):
+                break  # coordinator đã đóng
+            if r["op"] == "done": break
+            if r["op"] == "wait":
+                time.sleep(r["s"]); continue
+            jid, seq = r["job_id"], dict(r["seq"])
+            for key in ("yuv", "seq_cfg"):
+                if seq.get(key): seq[key] = map_path(seq[key], path_map)
+            with lock: running.add(jid)
+            lp = None
+            try:
+                argv, log_path = build_cmd(exp, seq, r["qp"], r["args"], work_dir, r["tag"], True)
+                res = run_job(job_spec(argv, log_path, cwd=str(log_path.parent), **limits))
+                lp = resolve(log_path)
+                log = read_bytes(lp) if lp else b""
+                sp = Path(summary_path_for(log_path))
+                summ = sp.read_bytes() if sp.exists() else b""
+            except Exception as e:
+                # build_cmd / đọc log hỏng -> báo job fail như run_job (ERR:<Exc>), slot vẫn chạy tiếp
+                res = {"retcode": None, "status": f"ERR:{e.__class__.__name__}"}
+                log, summ = f"[worker {worker}] {e.__class__.__name__}: {e}\n".encode(), b""
+            finally:
+                with lock: running.discard(jid)
+            res = {k: v for k, v in res.items() if not k.startswith("t_")}  # mốc perf_counter chỉ có nghĩa trên host worker
+            try:
+                c.call("result", job_id=jid, result=res, log=_pack(log), summary=_pack(summ))
+            except (OSError, ConnectionError):
+                break  # coordinator đã đóng; lease hết hạn -> job giao lại
+            except RuntimeError as e:
+                print(f"[worker {worker}] result {jid} rejected: {e}")
+            if not keep_logs and lp:
+                lp.unlink(missing_ok=True)
+            n += 1
+        c.close()
+        return n
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    threads, counts = [], [0] * slots
+    for k in range(slots):
+        t = threading.Thread(target=lambda k=k: counts.__setitem__(k, slot(k)), daemon=True); t.start(); threads.append(t)
+    for t in threads: t.join()
+    stop.set()
+    print(f"[worker {worker}] finished {sum(counts)} jobs")
+    return sum(counts)
+
+# ------------------------- CLI -------------------------
+
+def _coordinator(args, ready=None):
+    exp = load_experiment(Path(args.exp))
+    out_dir = Path(args.out_dir or exp["output_dir"]).expanduser().resolve()
+    coord = Coordinator(exp, out_dir, args.token, args.lease, args.max_attempts, args.log_codec or None, args.verbose)
+    host, port = args.bind.rsplit(":", 1)
+    return asyncio.run(coord.serve(host, int(port), ready))
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("coordinator", "local"):
+        c = sub.add_parser(name)
+        c.add_argument("--exp", required=True, help="YAML experiment file (orchestrate_vtm)")
+        c.add_argument("--out-dir", default="", help="Mặc định output_dir của YAML")
+        c.add_argument("--bind", default="127.0.0.1:7070" if name == "coordinator" else "127.0.0.1:0")
+        c.add_argument("--token", default="", help="Shared secret (worker gửi kèm mỗi message)")
+        c.add_argument("--lease", type=float, default=120, help="Lease giây; worker heartbeat mỗi lease/3")
+        c.add_argument("--max-attempts", type=int, default=3, help="Số lần giao lại khi lease hết hạn")
+        c.add_argument("--log-codec", default="", choices=[""] + list(CODEC_SUFFIX))
+        c.add_argument("--verbose", action="store_true")
+        if name == "local":
+            c.add_argument("--workers", type=int, default=2)
+            c.add_argument("--slots", type=int, default=1)
+            c.add_argument("--work-dir", default="", help="Mặc định <out_dir>/_workers")
+    w = sub.add_parser("worker")
+    w.add_argument("--connect", required=True, help="host:port của coordinator")
+    w.add_argument("--token", default="")
+    w.add_argument("--slots", type=int, default=os.cpu_count() or 1, help="Số encode song song trên host này")
+    w.add_argument("--work-dir", default="vtm_work")
+    w.add_argument("--vtm-bin", default=None, help="EncoderApp trên host này (mặc định vtm_bin của YAML)")
+    w.add_argument("--base-cfg", default=None)
+    w.add_argument("--path-map", action="append", default=[], help="SRC=DST: đổi prefix đường dẫn YUV/cfg của YAML")
+    w.add_argument("--keep-logs", action="store_true", help="Giữ enc.log trên worker sau khi đã gửi")
+    w.add_argument("--name", default=None)
+    add_runner_args(w)
+    args = ap.parse_args()
+
+    if args.cmd == "coordinator":
+        sys.exit(0 if _coordinator(args) else 1)
+    if args.cmd == "worker":
+        pm = [tuple(x.split("=", 1)) for x in args.path_map]
+        run_worker(args.connect, args.token, args.slots, args.work_dir, args.vtm_bin, args.base_cfg, pm,
+                   limits_from_args(args), args.name, args.keep_logs)
+        return
+    # local: coordinator ở process này + N worker process trên localhost
+    procs = []
+    def spawn(port):
+        work = args.work_dir or str(Path(args.out_dir or load_experiment(Path(args.exp))["output_dir"]).resolve() / "_workers")
+        for i in range(args.workers):
+            procs.append(subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "worker",
+                                           "--connect", f"127.0.0.1:{port}", "--token", args.token,
+                                           "--slots", str(args.slots), "--work-dir", f"{work}/w{i}", "--name", f"local{i}"]))
+    ok = _coordinator(args, spawn)
+    for p in procs:
+        try: p.wait(timeout=30)
+        except subprocess.TimeoutExpired: p.kill()
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# vtm_fake_encoder.py
+# Stand-in cho EncoderApp (VTM 23.11) để test runner / parser / report ở quy mô 100k job mà không tốn CPU-giờ.
+# Nhận đúng CLI mà build_cmd của các runner sinh ra (-c cfg..., -i/-wdt/-hgt/-fr/-f/-q/-b/-o, --Key=Value),
+# đọc GOP + IntraQPOffset từ cfg, và in log cùng format 23.11: banner, TOOL CFG, dòng POC, bảng LayerId, Total Time;
+# --SummaryOutFilename / --PrintHexPSNR như thật. Bitrate/PSNR theo mô hình RD của QP + cờ tool (bảng FLAG_MODEL,
+# cờ lạ -> hiệu ứng nhỏ theo hash), kết quả chỉ phụ thuộc seed + sequence + QP + cờ (không phụ thuộc đường dẫn output).
+#
+# Cấu hình: biến môi trường FAKE_VTM_* hoặc --Fake<Name>=... trên dòng lệnh (vd đặt trong fixed_args):
+#   FAKE_VTM_SEED=0          seed
+#   FAKE_VTM_TIME_SCALE=0    wall time = thời gian encode mô hình * scale (0 = chạy ngay; 0.001 = 1 giây/1000 giây)
+#   FAKE_VTM_SLEEP=0         cộng thêm N giây wall time mỗi job
+#   FAKE_VTM_BURN=0          phần wall time đốt CPU (busy loop) thay vì sleep, 0..1
+#   FAKE_VTM_MEM_MB=0        cấp phát + chạm N MiB (test cgroup memory / memory.peak)
+#   FAKE_VTM_FAIL=0          xác suất job lỗi (quyết định theo hash job -> chạy lại vẫn lỗi đúng job đó)
+#   FAKE_VTM_FAIL_MODES=exit,crash,hang,truncate
+#                            exit: "ERROR" + exit 1 giữa chừng; crash: abort(); hang: treo FAKE_VTM_HANG_S giây;
+#                            truncate: log dừng giữa chừng, exit 0, không có summary
+#
+# Dùng:
+#   chmod +x vtm_fake_encoder.py ; vtm_bin: /path/analyze/vtm_fake_encoder.py   (YAML)
+#   FAKE_VTM_TIME_SCALE=0.001 FAKE_VTM_FAIL=0.01 python3 orchestrate_vtm.py --exp experiment_fake.yaml --max-parallel 64
+#   python vtm_fake_encoder.py -c ..\cfg\encoder_randomaccess_vtm.cfg -i BQMall_832x480_60.yuv -wdt 832 -hgt 480 -fr 60 -f 33 -q 32
+import hashlib, math, os, random, re, stat, struct, sys, time
+from pathlib import Path
+
+VERSION = "23.11"
+IO_KEYS = {"InputFile", "BitstreamFile", "ReconFile", "SummaryOutFilename", "SummaryPicFilenameBase",
+           "PrintHexPSNR", "QP", "FramesToBeEncoded", "SourceWidth", "SourceHeight", "FrameRate", "FrameSkip",
+           "InputBitDepth", "OutputBitDepth", "InternalBitDepth", "InputChromaFormat", "Level", "TraceFile"}
+SHORT = {"-i": "InputFile", "-b": "BitstreamFile", "-o": "ReconFile", "-wdt": "SourceWidth", "-hgt": "SourceHeight",
+         "-fr": "FrameRate", "-f": "FramesToBeEncoded", "-q": "QP", "-fs": "FrameSkip", "-v": "Verbosity"}
+
+# cờ -> (giá trị CTC, tăng bitrate cùng chất lượng khi lệch CTC, hệ số thời gian khi lệch CTC);
+# chỉ tính cờ truyền trên CLI khác giá trị trong cfg (hoặc CTC nếu cfg không có)
+FLAG_MODEL = {
+    "ALF": ("1", 0.045, 0.97), "CCALF": ("1", 0.008, 0.99), "SAO": ("1", 0.010, 0.995),
+    "DeblockingFilterDisable": ("0", 0.025, 0.98), "DepQuant": ("1", 0.018, 0.92),
+    "RDOQ": ("1", 0.040, 0.86), "RDOQTS": ("1", 0.003, 0.99), "LMCSEnable": ("1", 0.012, 0.99),
+    "MTS": ("1", 0.009, 0.85), "LFNST": ("1", 0.011, 0.90), "ISP": ("1", 0.004, 0.93), "MIP": ("1", 0.004, 0.94),
+    "Affine": ("1", 0.020, 0.85), "SbTMVP": ("1", 0.004, 0.98), "BIO": ("1", 0.007, 0.97), "DMVR": ("1", 0.009, 0.98),
+    "Geo": ("1", 0.006, 0.93), "CIIP": ("1", 0.003, 0.96), "MMVD": ("1", 0.003, 0.96), "SBT": ("1", 0.004, 0.92),
+    "JointCbCr": ("1", 0.002, 0.98), "DualITree": ("1", 0.003, 0.99), "TemporalFilter": ("1", 0.030, 0.99),
+    "FastSearch": ("1", -0.001, 3.00), "FEN": ("1", -0.0005, 1.15), "FDM": ("1", -0.0003, 1.05),
+    "ASR": ("1", 0.000, 1.10), "LCTUFast": ("1", -0.0002, 1.05), "FastMrg": ("1", -0.001, 1.10),
+}
+# nhãn trong dòng TOOL CFG -> option CLI
+CFG_LABELS = {"RDQ": "RDOQ", "RDQTS": "RDOQTS", "DQ": "DepQuant", "Reshape": "LMCSEnable"}
+TOOL_CFG = [
+    "TOOL CFG: IBD:1 HAD:1 RDQ:1 RDQTS:1 LQP:0 SQP:0 ASR:1 MinSearchWindow:96 RestrictMESampling:0 FEN:1 ECU:0 FDM:1 ESD:0 TransformSkip:1 TransformSkipFast:1 TransformSkipLog2MaxSize:5 ChromaTS:1 BDPCM:0 Tiles: 1x1 Slices: 1 MCTS:0 SAO:1 ALF:1 CCALF:1 MaxNumALFAPS 8 AlfapsIDShift 0 ConstantJointCbCrSignFlagWPP:0 WPB:0 PME:2  WaveFrontSynchro:0 WaveFrontSubstreams:1 ScalingList:0 TMVPMode:1  DQ:1  SignBitHidingFlag:0 RecalQP:0 ",
+    "TOOL CFG: LFNST:1 MMVD:1 Affine:1 AffineType:1 AdaptBypassAffineMe:0 PROF:1 SbTMVP:1 DualITree:1 IMV:1 BIO:1 LMChroma:1 HorCollocatedChroma:1 VerCollocatedChroma:0 MTS:1(explicit intra) SBT:1 ISP:1 SMVD:1 CompositeLTReference:0 Bcw:1 BcwFast:1 LADF:0 CIIP:1 Geo:1 AllowDisFracMMVD:1 AffineAmvr:1 AffineAmvrEncOpt:1 AffineAmvp:1 DMVR:1 MmvdDisNum:6 JointCbCr:1 ACT:0 PLT:0 IBC:0 HashME:0 WrapAround:0 VirtualBoundariesEnabledFlag:0 VirtualBoundariesPresentInSPSFlag:1 vertical virtual boundaries:[ ] horizontal virtual boundaries:[ ] Reshape:1 (Signal:SDR Opt:0 CSoffset:6) MRL:1 MIP:1 EncDbOpt:1 AlfLambdaOpt:0 ",
+    "FAST TOOL CFG: LCTUFast:1 FastMrg:0 MaxMergeRdCandNumTotal:7 MergeRdCandQuotaRegular:4 MergeRdCandQuotaRegularSmallBlk:4 MergeRdCandQuotaSubBlk:2 MergeRdCandQuotaCiip:1 MergeRdCandQuotaGpm:8 PBIntraFast:1 IMV4PelFast:1 MTSMaxCand: 4(intra) 4(inter) ISPFast:0 FastLFNST:0 AMaxBT:1 E0023FastEnc:1 ContentBasedFastQtbt:0 UseNonLinearAlfLuma:1 UseNonLinearAlfChroma:1 MaxNumAlfAlternativesChroma:8 FastMIP:0 TTFastSkip:31 TTFastSkipThr:1.075 FastLocalDualTree:1 RPR:0 TemporalFilter:4/4 SEI CTI:0 BIM:0 SEI FGC:0 SEI processing Order:0 DPF:0 ",
+]
+# GOP RA 32 của encoder_randomaccess_vtm.cfg (POC, QPoffset, ModelOff, ModelScale, TId) khi không đọc được cfg
+RA_GOP = [(32, -1, 0.0, 0.0, 0), (16, 0, -4.9309, 0.2265, 1), (8, 1, -4.5, 0.19, 2), (4, 3, -5.4095, 0.2571, 3),
+          (2, 5, -4.4895, 0.1947, 4), (1, 6, -5.4429, 0.2429, 5), (3, 6, -5.4429, 0.2429, 5),
+          (6, 5, -4.4895, 0.1947, 4), (5, 6, -5.4429, 0.2429, 5), (7, 6, -5.4429, 0.2429, 5),
+          (12, 3, -5.4095, 0.2571, 3), (10, 5, -4.4895, 0.1947, 4), (9, 6, -5.4429, 0.2429, 5),
+          (11, 6, -5.4429, 0.2429, 5), (14, 5, -4.4895, 0.1947, 4), (13, 6, -5.4429, 0.2429, 5),
+          (15, 6, -5.4429, 0.2429, 5), (24, 1, -4.5, 0.19, 2), (20, 3, -5.4095, 0.2571, 3),
+          (18, 5, -4.4895, 0.1947, 4), (17, 6, -5.4429, 0.2429, 5), (19, 6, -5.4429, 0.2429, 5),
+          (22, 5, -4.4895, 0.1947, 4), (21, 6, -5.4429, 0.2429, 5), (23, 6, -5.4429, 0.2429, 5),
+          (28, 3, -5.4095, 0.2571, 3), (26, 5, -4.4895, 0.1947, 4), (25, 6, -5.4429, 0.2429, 5),
+          (27, 6, -5.4429, 0.2429, 5), (30, 5, -4.4895, 0.1947, 4), (29, 6, -5.4429, 0.2429, 5),
+          (31, 6, -5.4429, 0.2429, 5)]
+FRAME_RE = re.compile(r'^Frame\d+\s*:\s*(.*)$')
+FAKE_DEFAULTS = {"Seed": "0", "TimeScale": "0", "Sleep": "0", "Burn": "0", "MemMb": "0", "Fail": "0",
+                 "FailModes": "exit,crash,hang,truncate", "HangS": "3600"}
+
+# ------------------------- CLI / cfg -------------------------
+
+def read_cfg(path, opts, gop):
+    # "Key : value  # comment" ; FrameN : B POC QPoffset ModelOff ModelScale ... temporal_id ...
+    for ln in Path(path).read_text(encoding="utf-8", errors="replace").splitlines():
+        ln = ln.split("#", 1)[0].strip()
+        if not ln or ":" not in ln: continue
+        m = FRAME_RE.match(ln)
+        if m:
+            c = m.group(1).split()
+            gop.append((c[0], int(c[1]), int(c[2]), float(c[3]), float(c[4]), int(c[14])))
+            continue
+        k, v = ln.split(":", 1)
+        opts[k.strip()] = v.strip()
+
+def parse_argv(argv):
+    opts, cli, cfg, gop, fake = {}, {}, {}, [], {}
+    i = 0
+    while i < len(argv):
+        a = argv[i]
+        if a in ("-c", "--c") and i + 1 < len(argv):
+            if Path(argv[i + 1]).is_file():
+                vals, gop_cfg = {}, []
+                read_cfg(argv[i + 1], vals, gop_cfg)
+                cfg.update(vals); opts.update(vals)
+                if gop_cfg: gop = gop_cfg
+            i += 2; continue
+        if a in SHORT and i + 1 < len(argv):
+            opts[SHORT[a]] = argv[i + 1]; i += 2; continue
+        if a.startswith("--"):
+            k, eq, v = a[2:].partition("=")
+            if not eq and i + 1 < len(argv) and not argv[i + 1].startswith("-"):
+                v = argv[i + 1]; i += 1
+            if k.startswith("Fake"):
+                fake[k[4:]] = v
+            else:
+                opts[k] = cli[k] = v
+        i += 1
+    return opts, cli, cfg, gop, fake
+
+def fake_cfg(cli):
+    # --Fake<Name> > FAKE_VTM_<NAME> > mặc định
+    env = lambda n: os.environ.get("FAKE_VTM_" + re.sub(r'(?<!^)([A-Z])', r'_\1', n).upper())
+    return {n: cli.get(n, env(n) or d) for n, d in FAKE_DEFAULTS.items()}
+
+# ------------------------- mô hình RD -------------------------
+
+def _unit(*parts):
+    # số giả ngẫu nhiên [0, 1) cố định theo các phần tử
+    h = hashlib.sha256("\x1f".join(map(str, parts)).encode()).digest()
+    return int.from_bytes(h[:8], "little") / 2.0 ** 64
+
+def flag_effects(cli, cfg, seed):
+    # (hệ số bitrate, hệ số thời gian) của các cờ CLI so với cfg/CTC
+    rate, tm = 1.0, 1.0
+    for k, v in sorted(cli.items()):
+        if k in IO_KEYS or v == cfg.get(k, FLAG_MODEL.get(k, ("",))[0]): continue
+        if k in FLAG_MODEL:
+            _, dr, dt = FLAG_MODEL[k]
+            rate *= 1 + dr; tm *= dt
+        elif re.fullmatch(r'-?\d+', v or ""):
+            # cờ không có trong bảng: hiệu ứng nhỏ, cố định theo (seed, tên, giá trị) -> ablation vẫn phân biệt được
+            rate *= 1 + (_unit(seed, "rate", k, v) - 0.5) * 0.01
+            tm *= 1 + (_unit(seed, "time", k, v) - 0.5) * 0.1
+    return rate, tm
+
+def coding_order(gop, frames, intra_period):
+    # -> [(poc, slice, nal, qp_offset, model_off, model_scale, tid)]
+    if not gop:
+        gop = [("B",) + g for g in RA_GOP]
+    gop_size = max(g[1] for g in gop)
+    order = [(0, "I", "IDR_N_LP", 0, 0.0, 0.0, 0)]
+    if intra_period == 1:
+        return [(p, "I", "IDR_N_LP", 0, 0.0, 0.0, 0) for p in range(frames)]
+    start = 0
+    while start + 1 < frames:
+        for typ, poc, qo, mo, ms, tid in gop:
+            p = start + poc
+            if p >= frames: continue
+            if intra_period > 1 and p % intra_period == 0:
+                order.append((p, "I", "CRA", 0, 0.0, 0.0, 0))
+            else:
+                nal = "STSA" if tid == 1 and gop_size == 32 else "TRAIL"
+                order.append((p, typ, nal, qo, mo, ms, tid))
+        start += gop_size
+    return order
+
+def simulate(opts, cli, cfg, gop, fake):
+    seed = fake["Seed"]
+    w, h = int(opts.get("SourceWidth", 416)), int(opts.get("SourceHeight", 240))
+    fps = float(opts.get("FrameRate", 50))
+    frames = int(opts.get("FramesToBeEncoded", 33))
+    qp = int(float(opts.get("QP", 32)))
+    intra_period = int(opts.get("IntraPeriod", -1))
+    intra_off = int(opts.get("IntraQPOffset", 0))
+    name = Path(opts.get("InputFile", f"seq_{w}x{h}")).stem
+
+    # độ phức tạp nội dung cố định theo tên sequence
+    cplx = 0.6 * 3.0 ** _unit(seed, "cplx", name)
+    chroma = (_unit(seed, "u", name) - 0.3) * 2.5, (_unit(seed, "v", name) - 0.3) * 2.5
+    rate_k, time_k = flag_effects(cli, cfg, seed)
+    bpp = 0.06 * cplx * 2 ** (-(qp - 32) / 5.5) * (4.0 if intra_period == 1 else 1.0)
+    psnr = 36.0 - 2.2 * math.log2(cplx) - 0.45 * (qp - 32)
+    t_frame = 100.0 * (w * h) / (832 * 480) * 2 ** (-(qp - 32) / 12) * math.sqrt(cplx) * time_k
+
+    rng = random.Random(f"{seed}|{name}|{qp}|{rate_k:.9f}|{time_k:.9f}")
+    top_tid = max((g[-1] for g in gop), default=0)  # RA: TId cao nhất không được picture nào tham chiếu
+    pics = []
+    for poc, sl, nal, qo, mo, ms, tid in coding_order(gop, frames, intra_period):
+        fqp = qp + (intra_off if sl == "I" else qo + int(math.floor(mo + ms * qp + 0.5)))
+        wt = 2 ** (-(fqp - qp) / 6) * (1.4 if sl == "I" else 1.0) * rng.uniform(0.9, 1.1)
+        py = psnr - 0.35 * (fqp - qp) + rng.gauss(0, 0.15)
+        et = 2 ** (-(fqp - qp) / 8) * (0.7 if sl == "I" else 1.0) * rng.uniform(0.9, 1.1)
+        pics.append({"poc": poc, "slice": sl, "nal": nal, "qp": fqp, "tid": tid, "wt": wt, "et": et,
+                     "ref": not (top_tid > 0 and tid == top_tid and sl != "I"),
+                     "y": py, "u": py + chroma[0] + rng.gauss(0, 0.2), "v": py + chroma[1] + rng.gauss(0, 0.2)})
+    # chuẩn hóa: tổng bits / thời gian khớp mô hình, bitrate nhân hệ số cờ (PSNR giữ nguyên = BD-rate)
+    total_bits = bpp * w * h * len(pics) * rate_k
+    sw, se = sum(p["wt"] for p in pics), sum(p["et"] for p in pics)
+    for p in pics:
+        p["bits"] = max(64, int(round(total_bits * p["wt"] / sw / 8)) * 8)
+        p["et"] = t_frame * len(pics) * p["et"] / se
+    return {"w": w, "h": h, "fps": fps, "pics": pics}
+
+def summarize(sim, bitdepth=10):
+    # như Analyze: PSNR = trung bình PSNR từng frame, YUV-PSNR từ MSE gộp (4:2:0 -> 4:1:1)
+    pics = sim["pics"]
+    n = len(pics)
+    maxv = (255 << (bitdepth - 8)) ** 2
+    mse = {c: sum(maxv / 10 ** (p[c] / 10) for p in pics) / n for c in "yuv"}
+    comb = (4 * mse["y"] + mse["u"] + mse["v"]) / 6
+    return {"frames": n, "bitrate": sum(p["bits"] for p in pics) * sim["fps"] / 1000 / n,
+            "y": sum(p["y"] for p in pics) / n, "u": sum(p["u"] for p in pics) / n, "v": sum(p["v"] for p in pics) / n,
+            "yuv": 10 * math.log10(maxv / comb), "user_s": sum(p["et"] for p in pics)}
+
+# ------------------------- output -------------------------
+
+def hexd(x):
+    return "%x" % struct.unpack("<Q", struct.pack("<d", x))[0]
+
+def tool_cfg_lines(opts):
+    out = []
+    for ln in TOOL_CFG:
+        def sub(m):
+            opt = CFG_LABELS.get(m.group(1), m.group(1))
+            return f"{m.group(1)}:{opts[opt]}" if opt in opts and re.fullmatch(r'\d+', opts[opt]) else m.group(0)
+        out.append(re.sub(r'(?<= )([A-Za-z]+):(\d+)\b(?!/)', sub, ln))
+    return out
+
+def poc_line(p, hex_psnr):
+    # như EncGOP.cpp: picture không được tham chiếu in slice type chữ thường (c += 32) -> "b-SLICE"
+    c = p["slice"] if p.get("ref", True) else p["slice"].lower()
+    s = "POC %4d LId: %2d TId: %1d ( %s, %c-SLICE, QP %d ) %10d bits" % (p["poc"], 0, p["tid"], p["nal"], c, p["qp"], p["bits"])
+    s += " [Y %6.4f dB    U %6.4f dB    V %6.4f dB]" % (p["y"], p["u"], p["v"])
+    if hex_psnr:
+        s += " [xY %16s xU %16s xV %16s]" % (hexd(p["y"]), hexd(p["u"]), hexd(p["v"]))
+    return s + " [ET %5.0f ]" % p["et"]
+
+def table(s, hex_psnr):
+    hdr = "\tTotal Frames |  Bitrate      Y-PSNR   U-PSNR   V-PSNR   YUV-PSNR "
+    row = "\t%-8d     a  %-12.4f %-8.4f %-8.4f %-8.4f %-8.4f " % (s["frames"], s["bitrate"], s["y"], s["u"], s["v"], s["yuv"])
+    if hex_psnr:
+        hdr += "xY-PSNR          xU-PSNR          xV-PSNR          "
+        row += "%-16s %-16s %-16s " % (hexd(s["y"]), hexd(s["u"]), hexd(s["v"]))
+    return ["", "LayerId  0", hdr, row, ""]
+
+def wait(seconds, burn):
+    # đốt CPU phần `burn`, sleep phần còn lại
+    if seconds <= 0: return
+    end_burn = time.perf_counter() + seconds * burn
+    x = 0
+    while time.perf_counter() < end_burn:
+        x = (x * 1103515245 + 12345) & 0x7fffffff
+    time.sleep(seconds * (1 - burn))
+
+def write_sized(path, nbytes):
+    # bitstream / recon: file sparse đúng kích thước; FIFO (--recon-fifo) -> ghi frame xám thật
+    if not path or path == os.devnull: return
+    p = Path(path)
+    if p.exists() and stat.S_ISFIFO(p.stat().st_mode):
+        with open(p, "wb") as f:
+            chunk = b"\x00\x02" * (1 << 16)
+            while nbytes > 0:
+                f.write(chunk[:nbytes]); nbytes -= len(chunk)
+        return
+    with open(p, "wb") as f:
+        f.truncate(nbytes)
+
+def header_text(opts):
+    plat = {"win32": "Windows", "darwin": "Mac OS X"}.get(sys.platform, "Linux")
+    return (f"\nVVCSoftware: VTM Encoder Version {VERSION} [{plat}][Python {sys.version_info[0]}.{sys.version_info[1]}][64 bit] [SIMD=NONE] \n\n"
+            + "\n".join(tool_cfg_lines(opts)) + "\n\n\n" + time.strftime(" started @ %a %b %d %H:%M:%S %Y") + "\n")
+
+def footer_text(s, hex_psnr):
+    return ("\n".join(table(s, hex_psnr)) + "\n" + time.strftime(" finished @ %a %b %d %H:%M:%S %Y") + "\n"
+            + " Total Time: %12.3f sec. [user] %12.3f sec. [elapsed]\n" % (s["user_s"], s["user_s"]))
+
+def summary_row(s):
+    return "%f\t %f\t %f\t %f\t %f\n" % (s["bitrate"], s["y"], s["u"], s["v"], s["yuv"])
+
+def run_model(argv):
+    opts, cli, cfg, gop, cli_fake = parse_argv(argv)
+    fake = fake_cfg(cli_fake)
+    sim = simulate(opts, cli, cfg, gop, fake)
+    s = summarize(sim, int(opts.get("InternalBitDepth", 10)))
+    return opts, cli, fake, sim, s
+
+def emulate(argv):
+    """In-process: (log text, summary row, metrics) của 1 lần chạy không lỗi, không chờ (bench_analysis sinh corpus)."""
+    opts, _, _, sim, s = run_model(argv)
+    hex_psnr = opts.get("PrintHexPSNR", "0") not in ("0", "")
+    pocs = "".join(poc_line(p, hex_psnr) + "\n" for p in sim["pics"])
+    return header_text(opts) + pocs + footer_text(s, hex_psnr), summary_row(s), s
+
+def main(argv):
+    opts, cli, fake, sim, s = run_model(argv)
+    hex_psnr = opts.get("PrintHexPSNR", "0") not in ("0", "")
+    name = Path(opts.get("InputFile", "")).stem
+    job = (fake["Seed"], name, opts.get("QP"), sorted((k, v) for k, v in cli.items() if k not in IO_KEYS))
+
+    # lỗi giả lập: cố định theo job; xảy ra ở frame thứ fail_at
+    fail_mode = None
+    if _unit(job, "fail") < float(fake["Fail"]):
+        modes = [m.strip() for m in fake["FailModes"].split(",") if m.strip()]
+        fail_mode = modes[int(_unit(job, "mode") * len(modes))]
+        fail_at = int(_unit(job, "at") * len(sim["pics"]))
+
+    mem = None
+    if float(fake["MemMb"]) > 0:
+        mem = bytearray(int(float(fake["MemMb"]) * (1 << 20)))
+        mem[::4096] = b"\x01" * len(range(0, len(mem), 4096))  # chạm mọi page -> RSS thật
+
+    out = sys.stdout
+    wall = float(fake["Sleep"]) + s["user_s"] * float(fake["TimeScale"])
+    burn = min(1.0, max(0.0, float(fake["Burn"])))
+    out.write(header_text(opts))
+    out.flush()
+    for i, p in enumerate(sim["pics"]):
+        if fail_mode is not None and i == fail_at:
+            out.flush()
+            if fail_mode == "exit":
+                sys.stderr.write("\nERROR: In function \"xCompressGOP\": fake encoder failure injected\n")
+                return 1
+            if fail_mode == "crash":
+                os.abort()
+            if fail_mode == "hang":
+                time.sleep(float(fake["HangS"]))
+                return 1
+            return 0  # truncate
+        wait(wall * p["et"] / s["user_s"] if s["user_s"] else 0, burn)
+        out.write(poc_line(p, hex_psnr) + "\n")
+        out.flush()
+
+    out.write(footer_text(s, hex_psnr))
+    out.flush()
+
+    if opts.get("SummaryOutFilename"):
+        with open(opts["SummaryOutFilename"], "a") as f:
+            f.write(summary_row(s))
+    write_sized(opts.get("BitstreamFile"), sum(p["bits"] for p in sim["pics"]) // 8)
+    depth = int(opts.get("OutputBitDepth") or opts.get("InternalBitDepth", 10))
+    write_sized(opts.get("ReconFile"), sim["w"] * sim["h"] * 3 // 2 * len(sim["pics"]) * (2 if depth > 8 else 1))
+    del mem
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
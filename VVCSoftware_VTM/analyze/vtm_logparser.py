@@ -2,7 +2,8 @@
 # vtm_logparser.py
 # Parse EncoderApp logs to obtain bitrate (kbps) and PSNR-Y for each run.
 import re
-from pathlib import Path
+from run_archive import read_text
+from vtm_summary import encoder_metrics
 
 BITRATE_PATTERNS = [
     r'Bitrate\s*\(kbps\)\s*[:=]\s*([0-9.]+)',  # SUMMARY table
@@ -19,7 +20,10 @@ def parse_log_for_metrics(log_path: str):
     """
     Returns (bitrate_kbps, psnr_y) or (None, None) if not found.
     """
-    text = Path(log_path).read_text(errors="ignore")
+    text = read_text(log_path)
+    s = encoder_metrics(log_path, text)  # SummaryOutFilename written next to the log
+    if s:
+        return s["bitrate_kbps"], s["psnr_y"]
     br = None
     psnr_y = None
     for pat in BITRATE_PATTERNS:
@@ -1,7 +1,10 @@
 import re
-from pathlib import Path
+from run_archive import read_text
+from vtm_summary import encoder_metrics
 def parse_log_for_metrics(log_path:str):
-    t=Path(log_path).read_text(errors="ignore")
+    t=read_text(log_path)
+    s=encoder_metrics(log_path,t)  # SummaryOutFilename của job; không có -> scrape log như cũ
+    if s: return s["bitrate_kbps"],s["psnr_y"]
     br=None;py=None
     for pat in [r'Bitrate\s*\(kbps\)\s*[:=]\s*([0-9.]+)', r'Bitrate\s*[:=]\s*([0-9.]+)\s*kbps']:
         m=re.search(pat,t,flags=re.I)
@@ -10,3 +13,10 @@ def parse_log_for_metrics(log_path:str):
         m=re.search(pat,t,flags=re.I)
         if m: py=float(m.group(1)); break
     return br,py
+def parse_log_for_time(log_path:str):
+    # encode time (s): "Total Time ... [elapsed]" nếu có, nếu không thì cộng [ET n] của các POC
+    t=read_text(log_path)
+    m=re.search(r'Total\s+Time:\s*([0-9.]+)\s*sec\.\s*\[user\]\s*([0-9.]+)\s*sec\.\s*\[elapsed\]',t)
+    if m: return float(m.group(2))
+    ets=re.findall(r'\bPOC\b.*?\[ET\s+([0-9.]+)\s*\]',t)
+    return float(sum(float(x) for x in ets)) if ets else None
@@ -1,7 +1,7 @@
 import re
-from pathlib import Path
+from run_archive import read_text
 def parse_log_for_metrics(log_path:str):
-    t=Path(log_path).read_text(errors="ignore")
+    t=read_text(log_path)
     br=None;py=None
     for pat in [r'Bitrate\s*\(kbps\)\s*[:=]\s*([0-9.]+)', r'Bitrate\s*[:=]\s*([0-9.]+)\s*kbps']:
         m=re.search(pat,t,flags=re.I)
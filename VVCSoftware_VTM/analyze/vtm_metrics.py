@@ -0,0 +1,221 @@
+# vtm_metrics.py
+# HTTP endpoint cục bộ cho sweep đang chạy (thay cho tail [progress] / win_analyze_later --watch):
+#   GET /metrics -> Prometheus text format: job theo state, encode giây + frames/s theo class độ phân giải,
+#                   worker utilisation, maxRSS của encoder, RSS orchestrator, failures/timeouts
+#   GET /bdrate  -> JSON: BD-rate (PSNR-Y) từng phần, mỗi (group, tool, seq) so với anchor trên các QP đã xong
+# Server chạy trong thread daemon (http.server, không cần thư viện ngoài); số liệu cập nhật từ event loop.
+#
+# Runner: orchestrate_vtm.py --metrics-port 9109 [--metrics-bind 0.0.0.0]
+#   scrape_configs: - job_name: vtm_sweep  static_configs: [{targets: ["encfarm01:9109"]}]
+import json, threading, time, warnings
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from results_db import CTC_CLASS, SEQ_RE
+
+STATES = ["queued", "running", "done", "failed", "timeout"]
+MIN_BD_QPS = 3  # như win_analyze_later: >= 3 QP chung mới tính BD-rate
+
+def res_class(seq):
+    """Class CTC (A..E) theo WxH của sequence; ngoài CTC -> "WxH", không rõ -> "unknown"."""
+    w, h = seq.get("width"), seq.get("height")
+    if not (w and h):
+        m = SEQ_RE.search(str(seq.get("name", "")))
+        if not m: return "unknown"
+        w, h = m.group(1), m.group(2)
+    w, h = int(w), int(h)
+    return CTC_CLASS.get((w, h), f"{w}x{h}")
+
+def count_frames(log_text):
+    # 1 dòng "POC ..." / frame đã encode
+    return sum(1 for ln in log_text.splitlines() if ln.startswith("POC"))
+
+def self_rss_bytes():
+    try:
+        for ln in Path("/proc/self/status").read_text().splitlines():
+            if ln.startswith("VmRSS:"):
+                return int(ln.split()[1]) * 1024
+    except Exception:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+def _lbl(**kv):
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in kv.items()) + "}"
+
+class SweepMetrics:
+    """Số liệu sống của sweep + HTTP server; SweepMetrics(0) = tắt, mọi method là no-op."""
+
+    def __init__(self, port=0, bind="127.0.0.1", slots=1, total=0):
+        self.enabled = bool(port)
+        if not self.enabled: return
+        self.lock = threading.Lock()
+        self.slots, self.total = slots, total
+        self.t_start = time.time()
+        self.started = 0
+        self.states = dict.fromkeys(STATES[2:], 0)
+        self.failures = defaultdict(int)              # status (RC=1, ERR:OSError, TIMEOUT) -> count
+        self.enc_s = defaultdict(float)               # class -> giây encode (log Total Time)
+        self.frames = defaultdict(int)                # class -> frames
+        self.jobs_cls = defaultdict(int)              # class -> job đã xong
+        self.rss_max = defaultdict(int)               # class -> maxrss lớn nhất (byte)
+        self.busy_s, self.t_busy = 0.0, time.monotonic()
+        self.rd = defaultdict(dict)                   # (group, tool, anchor, seq) -> {qp: (kbps, psnr_y)}
+        self.server = ThreadingHTTPServer((bind, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"[metrics] http://{host}:{port}/metrics  http://{host}:{port}/bdrate")
+
+    @classmethod
+    def from_args(cls, args, slots, total):
+        return cls(getattr(args, "metrics_port", 0), getattr(args, "metrics_bind", "127.0.0.1"), slots, total)
+
+    # ---- cập nhật từ runner ----
+
+    def _tick(self):
+        # tích phân số job đang chạy theo thời gian -> worker-seconds bận
+        now = time.monotonic()
+        self.busy_s += (self.started - sum(self.states.values())) * (now - self.t_busy)
+        self.t_busy = now
+
+    def job_started(self):
+        if not self.enabled: return
+        with self.lock:
+            self._tick()
+            self.started += 1
+
+    def job_result(self, job, seq, res, br, py, tenc, log_text):
+        """Sau khi parse log: encode time/frames/RSS theo class, điểm RD cho BD-rate từng phần."""
+        if not self.enabled: return
+        cls = res_class(seq)
+        frames = count_frames(log_text) or seq.get("frames") or 0
+        with self.lock:
+            if res.get("status") == "DONE":
+                self.jobs_cls[cls] += 1
+                if tenc == tenc and tenc:
+                    self.enc_s[cls] += tenc
+                    self.frames[cls] += int(frames)
+                if res.get("maxrss_kb"):
+                    self.rss_max[cls] = max(self.rss_max[cls], res["maxrss_kb"] * 1024)
+                if job.get("rep", 0) == 0 and br == br and py == py and br and py:
+                    self.rd[(job["group"], job["tool"], job["anchor"], job["seq"])][job["qp"]] = (br, py)
+
+    def job_finished(self, status):
+        if not self.enabled: return
+        with self.lock:
+            self._tick()
+            state = "done" if status == "DONE" else "timeout" if status == "TIMEOUT" else "failed"
+            self.states[state] += 1
+            if state != "done":
+                self.failures[status] += 1
+
+    def close(self):
+        if not self.enabled: return
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ---- render ----
+
+    def prometheus(self):
+        with self.lock:
+            self._tick()
+            finished = sum(self.states.values())
+            states = {"queued": max(0, self.total - self.started), "running": self.started - finished, **self.states}
+            up = time.time() - self.t_start
+            out = []
+            def metric(name, kind, help_, samples):
+                out.append(f"# HELP {name} {help_}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, v in samples:
+                    out.append(f"{name}{_lbl(**labels) if labels else ''} {v}")
+            metric("vtm_sweep_start_time_seconds", "gauge", "Unix time orchestrator started", [({}, self.t_start)])
+            metric("vtm_jobs_planned", "gauge", "Jobs planned in this sweep", [({}, self.total)])
+            metric("vtm_jobs", "gauge", "Jobs by state", [({"state": s}, states[s]) for s in STATES])
+            metric("vtm_job_failures_total", "counter", "Failed jobs by runner status (RC=n, TIMEOUT, ERR:...)",
+                   [({"status": k}, v) for k, v in sorted(self.failures.items())])
+            classes = sorted(self.jobs_cls)
+            metric("vtm_encode_jobs_total", "counter", "Successful encodes by resolution class",
+                   [({"res_class": c}, self.jobs_cls[c]) for c in classes])
+            metric("vtm_encode_seconds_total", "counter", "Encoder-reported encode time by resolution class",
+                   [({"res_class": c}, round(self.enc_s[c], 3)) for c in classes])
+            metric("vtm_encode_frames_total", "counter", "Encoded frames by resolution class",
+                   [({"res_class": c}, self.frames[c]) for c in classes])
+            metric("vtm_encode_fps", "gauge", "Frames per encode-second of a single encoder by resolution class",
+                   [({"res_class": c}, round(self.frames[c] / self.enc_s[c], 4)) for c in classes if self.enc_s[c] > 0])
+            metric("vtm_encoder_maxrss_bytes", "gauge", "Largest encoder peak RSS seen by resolution class",
+                   [({"res_class": c}, self.rss_max[c]) for c in classes if self.rss_max[c]])
+            metric("vtm_workers", "gauge", "Worker slots (--max-parallel)", [({}, self.slots)])
+            metric("vtm_workers_busy", "gauge", "Worker slots running a job", [({}, states["running"])])
+            metric("vtm_worker_busy_seconds_total", "counter", "Integral of busy worker slots over time",
+                   [({}, round(self.busy_s, 3))])
+            metric("vtm_worker_utilization", "gauge", "Busy worker-seconds / (slots * uptime) since start",
+                   [({}, round(self.busy_s / (self.slots * up), 4) if up > 0 else 0.0)])
+            rss = self_rss_bytes()
+            if rss is not None:
+                metric("vtm_orchestrator_rss_bytes", "gauge", "Resident memory of the orchestrator", [({}, rss)])
+        return "\n".join(out) + "\n"
+
+    def bdrate(self):
+        from bdrate import bd_rate
+        with self.lock:
+            rd = {k: dict(v) for k, v in self.rd.items()}
+            done, total = sum(self.states.values()), self.total
+        rows, per_tool = [], defaultdict(list)
+        for (grp, tool, anchor, seq), pts in sorted(rd.items()):
+            if grp == "Baseline": continue
+            ref = rd.get(("Baseline", anchor, anchor, seq), {})
+            common = sorted(set(ref) & set(pts))
+            row = {"group": grp, "tool": tool, "anchor": anchor, "seq": seq,
+                   "bd_rate_psnrY_percent": None, "qps_used": common, "status": f"NEED_{MIN_BD_QPS - len(common)}_QP"}
+            if len(common) >= MIN_BD_QPS:
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")  # 3 điểm + polyfit bậc 3 -> RankWarning, như win_analyze_later
+                        bd = bd_rate([ref[q][0] for q in common], [ref[q][1] for q in common],
+                                     [pts[q][0] for q in common], [pts[q][1] for q in common])
+                    row["bd_rate_psnrY_percent"] = round(bd, 4)
+                    row["status"] = "OK"
+                    per_tool[(grp, tool, anchor)].append(row["bd_rate_psnrY_percent"])
+                except Exception as e:
+                    row["status"] = f"BDERR:{e.__class__.__name__}"
+            rows.append(row)
+        summary = [{"group": g, "tool": t, "anchor": a, "n_seq": len(v), "avg_bd_rate_psnrY_percent": round(sum(v) / len(v), 4)}
+                   for (g, t, a), v in sorted(per_tool.items())]
+        return {"time": time.time(), "jobs_finished": done, "jobs_planned": total, "summary": summary, "rows": rows}
+
+    def _handler(self):
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0].rstrip("/")
+                try:
+                    if path == "/metrics":
+                        body, ctype = metrics.prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                    elif path == "/bdrate":
+                        body, ctype = json.dumps(metrics.bdrate(), ensure_ascii=False), "application/json"
+                    elif path == "":
+                        body, ctype = "vtm sweep: /metrics (Prometheus), /bdrate (JSON)\n", "text/plain; charset=utf-8"
+                    else:
+                        self.send_error(404); return
+                except Exception as e:
+                    self.send_error(500, f"{e.__class__.__name__}: {e}"); return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            def log_message(self, *a):
+                pass  # không chen log scrape vào output sweep
+        return Handler
+
+def add_metrics_args(ap):
+    ap.add_argument("--metrics-port", type=int, default=0, help="Mở HTTP /metrics (Prometheus) + /bdrate (JSON) ở port này (0 = tắt)")
+    ap.add_argument("--metrics-bind", default="127.0.0.1", help="Địa chỉ bind; 0.0.0.0 để Prometheus ngoài máy scrape")
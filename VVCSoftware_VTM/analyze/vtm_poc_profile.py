@@ -0,0 +1,144 @@
+# vtm_poc_profile.py
+# Per-POC encoder time / bits breakdown by temporal layer (TId), slice type and slice QP,
+# then diff anchor vs test to see WHERE a tool saves (or costs) encoder time.
+#
+# Usage:
+#   python vtm_poc_profile.py --runs collected_runs_snapshot.csv --out-dir poc_profile
+#   python vtm_poc_profile.py --runs runs_out_ablation\results.csv --out-dir poc_profile   # orchestrate_vtm layout
+import argparse, csv, re
+from pathlib import Path
+from collections import defaultdict, OrderedDict
+
+from run_archive import read_text, resolve
+
+# POC    8 LId:  0 TId: 2 ( TRAIL, B-SLICE, QP 23 )      25792 bits [Y 43.9718 dB    U 46.5204 dB    V 46.3443 dB] [ET    20 ] ...
+# POC    1 LId:  0 TId: 5 ( TRAIL, b-SLICE, QP 28 )       1432 bits [Y 42.1034 dB    U 45.8810 dB    V 45.7702 dB] [ET     3 ] ...
+# slice type chữ thường = picture không được tham chiếu (EncGOP.cpp: c += 32) -> RA là cả TId cao nhất
+POC_LINE = re.compile(
+    r'^POC\s+(\d+)\s+LId:\s*(\d+)\s+TId:\s*(\d+)\s+\(\s*([A-Z_0-9]+),\s*([IPBipb])-SLICE,\s*QP\s+(-?\d+)\s*\)\s+'
+    r'(\d+)\s+bits\s+\[Y\s+([0-9.]+|inf)\s+dB.*?\[ET\s+([0-9.]+)\s*\]', re.M)
+
+# group -> anchor baseline (win_* layout dùng lower-case, orchestrate_vtm dùng Perf_Add/...)
+GROUP_ANCHOR = {"perf_ablate": "Baseline_Ref", "speed_ablate": "Baseline_Ref",
+                "perf_add": "Baseline_Min", "speed_add": "Baseline_Min"}
+
+def parse_poc_lines(text: str):
+    out = []
+    for m in POC_LINE.finditer(text):
+        out.append({"poc": int(m.group(1)), "lid": int(m.group(2)), "tid": int(m.group(3)),
+                    "nal": m.group(4), "slice": m.group(5).upper(), "referenced": m.group(5).isupper(),
+                    "slice_qp": int(m.group(6)),
+                    "bits": int(m.group(7)), "psnr_y": float(m.group(8)), "et_s": float(m.group(9))})
+    return out
+
+def profile_frames(frames, keys=("tid", "slice", "slice_qp")):
+    # {key tuple: {frames, bits, et_s, psnr_y_sum}}
+    prof = OrderedDict()
+    for f in sorted(frames, key=lambda f: tuple(f[k] for k in keys)):
+        k = tuple(f[x] for x in keys)
+        p = prof.setdefault(k, {"frames": 0, "bits": 0, "et_s": 0.0, "psnr_y_sum": 0.0})
+        p["frames"] += 1; p["bits"] += f["bits"]; p["et_s"] += f["et_s"]; p["psnr_y_sum"] += f["psnr_y"]
+    return prof
+
+def load_runs(csv_path):
+    """
+    Accept both per-run CSV layouts:
+      - win_* / collectors: group, experiment, sequence, qp, ..., log
+      - orchestrate_vtm results.csv: group, tool, seq, qp, ... (log = <out_dir>/<tag>_<seq>_QP<qp>/enc.log)
+    """
+    rows = []
+    root = Path(csv_path).parent
+    with open(csv_path, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            try: qp = int(float(r["qp"]))
+            except: continue
+            if "experiment" in r:
+                grp, exp, seq, log = r["group"], r["experiment"], r["sequence"], r.get("log", "")
+            else:
+                grp, exp, seq = r["group"], r["tool"], r["seq"]
+                tag = exp if grp == "Baseline" else f"{grp}_{exp}"
+                log = str(root / f"{tag}_{seq}_QP{qp}" / "enc.log")
+            if grp.lower() in ("baseline", "baselines"):
+                grp = "baseline"
+            rows.append({"group": grp, "experiment": exp, "sequence": seq, "qp": qp, "log": log})
+    return rows
+
+def run_profiles(runs):
+    profs = {}
+    for r in runs:
+        if not r["log"] or not resolve(r["log"]): continue  # enc.log hoặc enc.log.gz/.xz (--log-codec, archive)
+        frames = parse_poc_lines(read_text(Path(r["log"])))
+        if frames:
+            profs[(r["group"], r["experiment"], r["sequence"], r["qp"])] = frames
+    return profs
+
+def diff_profiles(profs, anchor_ref="Baseline_Ref", anchor_min="Baseline_Min", keys=("tid", "slice")):
+    """
+    Sum anchor vs test per key over all (sequence, QP) runs present in both,
+    and report each key's share of the tool's total ET delta.
+    """
+    names = {"Baseline_Ref": anchor_ref, "Baseline_Min": anchor_min}
+    acc = defaultdict(lambda: defaultdict(lambda: [0, 0.0, 0.0, 0, 0]))  # (grp,exp,anchor) -> key -> [runs, etA, etT, bitsA, bitsT]
+    for (grp, exp, seq, qp), frames in profs.items():
+        if grp == "baseline": continue
+        anchor = names[GROUP_ANCHOR.get(grp.lower(), "Baseline_Ref")]
+        ref = profs.get(("baseline", anchor, seq, qp))
+        if ref is None: continue
+        pa, pt = profile_frames(ref, keys), profile_frames(frames, keys)
+        for k in set(pa) | set(pt):
+            a = pa.get(k, {"et_s": 0.0, "bits": 0}); t = pt.get(k, {"et_s": 0.0, "bits": 0})
+            c = acc[(grp, exp, anchor)][k]
+            c[0] += 1; c[1] += a["et_s"]; c[2] += t["et_s"]; c[3] += a["bits"]; c[4] += t["bits"]
+
+    rows = []
+    for (grp, exp, anchor), per_key in acc.items():
+        tot_delta = sum(c[2]-c[1] for c in per_key.values())
+        for k in sorted(per_key):
+            n, eta, ett, ba, bt = per_key[k]
+            row = {"group": grp, "experiment": exp, "anchor": anchor}
+            row.update(dict(zip(keys, k)))
+            row.update({"n_runs": n, "et_anchor_s": eta, "et_test_s": ett, "delta_et_s": ett-eta,
+                        "delta_et_pct": (ett/eta-1.0)*100.0 if eta > 0 else None,
+                        "share_of_delta": (ett-eta)/tot_delta if tot_delta else None,
+                        "bits_anchor": ba, "bits_test": bt,
+                        "delta_bits_pct": (bt/ba-1.0)*100.0 if ba > 0 else None})
+            rows.append(row)
+    return rows
+
+def write_csv(path, rows, header):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=header); w.writeheader(); [w.writerow(r) for r in rows]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", required=True, help="Per-run CSV (collected_runs_snapshot.csv / quickfire_runs.csv / results.csv)")
+    ap.add_argument("--out-dir", default="poc_profile")
+    ap.add_argument("--anchor-ref-name", default="Baseline_Ref")
+    ap.add_argument("--anchor-min-name", default="Baseline_Min")
+    ap.add_argument("--diff-by-qp", action="store_true", help="Diff theo (TId, slice, slice QP) thay vì (TId, slice)")
+    args = ap.parse_args()
+
+    out = Path(args.out_dir); out.mkdir(parents=True, exist_ok=True)
+    profs = run_profiles(load_runs(args.runs))
+
+    # per-run profile: TId x slice type x slice QP
+    run_rows = []
+    for (grp, exp, seq, qp), frames in profs.items():
+        tot_et = sum(f["et_s"] for f in frames) or 1.0
+        for (tid, sl, sqp), p in profile_frames(frames).items():
+            run_rows.append({"group": grp, "experiment": exp, "sequence": seq, "qp": qp,
+                             "tid": tid, "slice": sl, "slice_qp": sqp, "frames": p["frames"], "bits": p["bits"],
+                             "et_s": p["et_s"], "et_share": p["et_s"]/tot_et, "psnr_y_mean": p["psnr_y_sum"]/p["frames"]})
+    write_csv(out / "poc_profile_runs.csv", run_rows,
+              ["group","experiment","sequence","qp","tid","slice","slice_qp","frames","bits","et_s","et_share","psnr_y_mean"])
+
+    keys = ("tid", "slice", "slice_qp") if args.diff_by_qp else ("tid", "slice")
+    diff = diff_profiles(profs, args.anchor_ref_name, args.anchor_min_name, keys)
+    write_csv(out / "poc_profile_diff.csv", diff,
+              ["group","experiment","anchor", *keys, "n_runs","et_anchor_s","et_test_s","delta_et_s","delta_et_pct",
+               "share_of_delta","bits_anchor","bits_test","delta_bits_pct"])
+
+    print(f"[OK] {len(profs)} runs profiled -> {out / 'poc_profile_runs.csv'}, {out / 'poc_profile_diff.csv'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# vtm_runner.py
+# Launcher chung cho mọi runner (orchestrate_vtm, ablation_runner, win_ablation_runner, win_ablation_fast,
+# win_quickfire_runner): argv exec không qua shell, stdout+stderr -> log (nén được, run_archive.log_sink),
+# process group riêng để timeout kill cả cây, và priority control:
+#   Linux : nice, ioprio (ioprio_set syscall), CPU affinity, cgroup v2 cpu.max / memory.max (thư mục được delegate)
+#   Windows: nice > 0 -> BELOW_NORMAL, nice >= 15 -> IDLE; timeout -> taskkill /T
+# Mọi thiết lập áp từ process cha ngay sau spawn (không preexec_fn -> an toàn khi gọi từ nhiều thread,
+# subprocess dùng được vfork/posix_spawn).
+#
+# Job spec (dict, xem job_spec): argv, log, codec, timeout_s, nice, ioprio, core, cgroup, env, cwd, echo
+# Result record (RESULT_FIELDS): retcode, status (DONE | RC=<n> | TIMEOUT | ERR:<Exc>), wall_s, user_s, sys_s, maxrss_kb, pid
+#
+#   python vtm_runner.py --nice 10 --ioprio idle --cg-cpus 1 --cg-mem 4G --timeout-sec 60 --log run.log -- EncoderApp -c enc.cfg ...
+import argparse, ctypes, itertools, os, platform, shlex, signal, subprocess, sys, threading, time
+from pathlib import Path
+
+from run_archive import CODEC_SUFFIX, log_sink
+
+RESULT_FIELDS = ["retcode", "status", "wall_s", "user_s", "sys_s", "maxrss_kb", "pid"]
+IOPRIO_CLASSES = {"none": 0, "rt": 1, "be": 2, "idle": 3}
+# __NR_ioprio_set theo kiến trúc (không có trong os/stdlib)
+IOPRIO_SET_NR = {"x86_64": 251, "amd64": 251, "aarch64": 30, "arm64": 30, "i386": 289, "i686": 289,
+                 "armv7l": 314, "ppc64le": 273, "riscv64": 30, "s390x": 282}
+BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+IDLE_PRIORITY_CLASS = 0x00000040
+CREATE_NEW_PROCESS_GROUP = 0x00000200
+_CG_IDS = itertools.count()
+_warned = set()
+
+def _warn_once(key, msg):
+    if key not in _warned:
+        _warned.add(key); print(f"[runner] {msg}")
+
+def job_spec(argv, log, codec=None, timeout_s=0, nice=0, ioprio=None, core=None, cgroup=None, env=None, cwd=None,
+             echo=False):
+    """
+    One launch. argv: list (argv[0] = executable, no shell); log: stdout+stderr target (codec -> log.<ext>);
+    ioprio: "idle" | "be:<0-7>" | "rt:<0-7>"; cgroup: {"root": dir, "cpus": float, "mem": "4G"} or None;
+    env: extra variables on top of os.environ; echo: also copy the child's output to our stdout.
+    """
+    return {"argv": [str(a) for a in argv], "log": str(log), "codec": codec or None, "timeout_s": timeout_s or 0,
+            "nice": nice or 0, "ioprio": ioprio, "core": core, "cgroup": cgroup, "env": env, "cwd": cwd, "echo": echo}
+
+def cmdline(argv):
+    """Printable form of argv (for --dry / logs only; never executed through a shell)."""
+    return subprocess.list2cmdline(argv) if os.name == "nt" else shlex.join(argv)
+
+def with_input(argv, yuv):
+    """argv with the "-i <yuv>" operand replaced (staged copy from SeqCache)."""
+    i = argv.index("-i")
+    return argv[:i+1] + [str(yuv)] + argv[i+2:]
+
+# ------------------------- priority control -------------------------
+
+def _ioprio_value(spec):
+    cls, _, lvl = str(spec).partition(":")
+    if cls not in IOPRIO_CLASSES:
+        raise ValueError(f"ioprio must be idle | be:<0-7> | rt:<0-7>, got {spec!r}")
+    return (IOPRIO_CLASSES[cls] << 13) | (int(lvl) if lvl else (0 if cls == "idle" else 4))
+
+def set_ioprio(pid, spec):
+    nr = IOPRIO_SET_NR.get(platform.machine().lower())
+    if nr is None or not sys.platform.startswith("linux"):
+        _warn_once("ioprio", f"ioprio not supported on {sys.platform}/{platform.machine()}; ignored"); return False
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(nr, 1, pid, _ioprio_value(spec)) != 0:  # IOPRIO_WHO_PROCESS
+        _warn_once("ioprio-err", f"ioprio_set failed: {os.strerror(ctypes.get_errno())}"); return False
+    return True
+
+def parse_size(s):
+    # "4G" / "512M" / "1048576" -> bytes (cgroup memory.max)
+    s = str(s).strip().upper()
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+def cgroup_create(cg):
+    """Per-job cgroup v2 dir under cg['root'] with cpu.max / memory.max; None (warned once) if not writable."""
+    d = Path(cg["root"]) / f"job_{os.getpid()}_{next(_CG_IDS)}"
+    try:
+        d.mkdir(parents=True)
+        if not (d / "cgroup.procs").exists():  # kernel tự tạo file này -> không có = không phải cgroup v2
+            raise OSError("not a cgroup v2 hierarchy")
+        if cg.get("cpus"):
+            period = 100000
+            (d / "cpu.max").write_text(f"{int(float(cg['cpus']) * period)} {period}")
+        if cg.get("mem"):
+            (d / "memory.max").write_text(str(parse_size(cg["mem"])))
+            if (d / "memory.swap.max").exists():
+                (d / "memory.swap.max").write_text("0")
+        return d
+    except OSError as e:
+        _warn_once("cgroup", f"cgroup limits unavailable under {cg['root']} ({e}); running without them")
+        try: d.rmdir()
+        except OSError: pass
+        return None
+
+def cgroup_finish(d):
+    # memory.peak (kernel >= 5.19) -> KB; rồi xoá cgroup (đã rỗng vì process đã được reap)
+    peak = None
+    try:
+        peak = int((d / "memory.peak").read_text()) // 1024
+    except (OSError, ValueError):
+        pass
+    for _ in range(50):
+        try:
+            d.rmdir(); break
+        except OSError:
+            time.sleep(0.02)
+    return peak
+
+def apply_limits(pid, spec, cg_dir=None):
+    """Priority/affinity/cgroup of a freshly spawned child, set from the parent (best effort, warned once)."""
+    if cg_dir is not None:
+        try:
+            (cg_dir / "cgroup.procs").write_text(str(pid))
+        except OSError as e:
+            _warn_once("cgroup-procs", f"cannot move pid into {cg_dir}: {e}")
+    if os.name == "nt":
+        if spec["core"] is not None:
+            from timing_harness import pin_pid
+            pin_pid(pid, spec["core"])
+        return
+    if spec["nice"]:
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + spec["nice"])
+        except OSError as e:
+            _warn_once("nice", f"setpriority failed: {e}")
+    if spec["ioprio"]:
+        set_ioprio(pid, spec["ioprio"])
+    if spec["core"] is not None:
+        try:
+            os.sched_setaffinity(pid, {spec["core"]})
+        except (AttributeError, OSError):
+            from timing_harness import pin_pid
+            pin_pid(pid, spec["core"])
+
+def kill_tree(p):
+    """Kill the child's whole process group (POSIX) / process tree (Windows)."""
+    try:
+        if os.name == "nt":
+            subprocess.call(["taskkill", "/T", "/F", "/PID", str(p.pid)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(p.pid, signal.SIGKILL)
+    except (OSError, ProcessLookupError):
+        try: p.kill()
+        except OSError: pass
+
+# ------------------------- launch -------------------------
+
+def _wait(p, timeout_s):
+    """(retcode, timed_out, (user_s, sys_s, maxrss_kb)); wait4 rusage on POSIX, timeout via timer + kill_tree."""
+    fired = []
+    killer = None
+    if timeout_s:
+        killer = threading.Timer(timeout_s, lambda: (fired.append(1), kill_tree(p))); killer.daemon = True; killer.start()
+    try:
+        if hasattr(os, "wait4"):
+            _, status, ru = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+            rusage = (ru.ru_utime, ru.ru_stime, ru.ru_maxrss)
+        else:
+            p.wait(); rusage = (None, None, None)
+    finally:
+        if killer is not None: killer.cancel()
+    return p.returncode, bool(fired), rusage
+
+def _pump(src, sink):
+    # echo mode: child stdout -> log + console
+    for chunk in iter(lambda: src.read1(1 << 16), b""):
+        sink.write(chunk)
+        try:
+            sys.stdout.buffer.write(chunk); sys.stdout.flush()
+        except Exception:
+            pass
+
+def run_job(spec):
+    """Run one job spec to completion (blocking, thread-safe); returns the result record."""
+    env = dict(os.environ, **{k: str(v) for k, v in (spec.get("env") or {}).items()}) if spec.get("env") else None
+    cg_dir = cgroup_create(spec["cgroup"]) if spec.get("cgroup") and os.name != "nt" else None
+    res = {"retcode": None, "status": None, "wall_s": None, "user_s": None, "sys_s": None, "maxrss_kb": None, "pid": None}
+    t0 = time.time()
+    try:
+        with log_sink(spec["log"], spec["codec"]) as logf:
+            kw = {"stdout": subprocess.PIPE if spec["echo"] else logf, "stderr": subprocess.STDOUT,
+                  "stdin": subprocess.DEVNULL, "env": env, "cwd": spec.get("cwd")}
+            if os.name == "nt":
+                prio = IDLE_PRIORITY_CLASS if spec["nice"] >= 15 else BELOW_NORMAL_PRIORITY_CLASS if spec["nice"] > 0 else 0
+                kw["creationflags"] = prio | CREATE_NEW_PROCESS_GROUP
+            else:
+                kw["start_new_session"] = True  # pgid = pid -> kill_tree
+            res["t_spawn"] = time.perf_counter()  # mốc cho vtm_trace: spawn = Popen + limits, encode = tới khi exit
+            p = subprocess.Popen(spec["argv"], **kw)
+            res["pid"] = p.pid
+            apply_limits(p.pid, spec, cg_dir)
+            res["t_run"] = time.perf_counter()
+            pump = None
+            if spec["echo"]:
+                pump = threading.Thread(target=_pump, args=(p.stdout, logf), daemon=True); pump.start()
+            rc, timed_out, (ut, st, rss) = _wait(p, spec["timeout_s"])
+            res["t_exit"] = time.perf_counter()
+            if pump is not None:
+                pump.join(); p.stdout.close()
+        res.update(retcode=rc, user_s=ut, sys_s=st, maxrss_kb=rss,
+                   status="TIMEOUT" if timed_out else "DONE" if rc == 0 else f"RC={rc}")
+    except Exception as e:
+        res.update(retcode=-1, status=f"ERR:{e.__class__.__name__}")
+    finally:
+        res["wall_s"] = time.time() - t0
+        if cg_dir is not None:
+            peak = cgroup_finish(cg_dir)
+            if peak: res["maxrss_kb"] = peak
+    return res
+
+# ------------------------- CLI glue for the front-ends -------------------------
+
+def add_runner_args(ap, nice=0, timeout=True):
+    # win_* front-end truyền nice=10: trên Windows = BELOW_NORMAL như trước khi dùng chung launcher
+    g = ap.add_argument_group("launcher (vtm_runner)")
+    g.add_argument("--nice", type=int, default=nice, help="Tăng niceness (Windows: >0 BELOW_NORMAL, >=15 IDLE)")
+    g.add_argument("--ioprio", default=None, help="Linux I/O priority: idle | be:<0-7> | rt:<0-7>")
+    g.add_argument("--cgroup-root", default="", help="Thư mục cgroup v2 đã delegate, vd /sys/fs/cgroup/vtm")
+    g.add_argument("--cg-cpus", type=float, default=0, help="cpu.max mỗi job (số CPU, vd 1.0)")
+    g.add_argument("--cg-mem", default="", help="memory.max mỗi job, vd 4G")
+    if timeout:
+        g.add_argument("--timeout-sec", type=int, default=0, help="Kill cả process group của job sau N giây")
+    return g
+
+def limits_from_args(args):
+    """job_spec keyword args from add_runner_args options."""
+    cg = None
+    if args.cgroup_root and (args.cg_cpus or args.cg_mem):
+        cg = {"root": args.cgroup_root, "cpus": args.cg_cpus, "mem": args.cg_mem}
+    if args.ioprio:
+        _ioprio_value(args.ioprio)  # validate sớm
+    return {"nice": args.nice, "ioprio": args.ioprio, "cgroup": cg, "timeout_s": getattr(args, "timeout_sec", 0)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", required=True)
+    ap.add_argument("--log-codec", default="", choices=[""] + list(CODEC_SUFFIX))
+    ap.add_argument("--core", type=int, default=None)
+    ap.add_argument("--echo", action="store_true")
+    add_runner_args(ap)
+    ap.add_argument("argv", nargs=argparse.REMAINDER)
+    args = ap.parse_args()
+    argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+    if not argv:
+        ap.error("missing command after --")
+    res = run_job(job_spec(argv, args.log, args.log_codec, core=args.core, echo=args.echo, **limits_from_args(args)))
+    print(" ".join(f"{k}={res[k]}" for k in RESULT_FIELDS))
+    sys.exit(0 if res["status"] == "DONE" else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# vtm_summary.py
+# Machine-readable EncoderApp metrics instead of scraping the console table.
+# Runners add `summary_args(log_path)` to each job:
+#   --SummaryOutFilename=<log>.summary.txt  -> Analyze::printSummary: "%f\t %f\t %f\t %f\t %f[\t mseY..YUV]\n"
+#                                              (bitrate kbps, Y/U/V-PSNR, YUV-PSNR; 4:0:0 = 2 fields), append mode
+#   --PrintHexPSNR=1                         -> console "a" row gets xY/xU/xV-PSNR = IEEE-754 bits of the exact doubles
+# and parsers call encoder_metrics(log_path, text) first; the old regexes stay as fallback for logs of older runs.
+#
+#   python vtm_summary.py runs_out_ablation\Baseline_Ref_BasketballPass_416x240_50_QP22\enc.log
+import re, struct, sys
+from pathlib import Path
+
+from run_archive import plain_name, read_text, resolve
+
+SUMMARY_FIELDS = ("bitrate_kbps", "psnr_y", "psnr_u", "psnr_v", "psnr_yuv", "mse_y", "mse_u", "mse_v", "mse_yuv")
+# số cột hợp lệ: 4:0:0 (bitrate, Y), 4:2:x (5), 4:2:x + PrintSequenceMSE (9)
+SUMMARY_WIDTHS = {2: SUMMARY_FIELDS[:2], 5: SUMMARY_FIELDS[:5], 9: SUMMARY_FIELDS}
+FLOAT_RE = re.compile(r'^[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?$|^[+-]?(?:nan|inf)$', re.I)
+HEX_COLS = {"xY-PSNR": "psnr_y", "xU-PSNR": "psnr_u", "xV-PSNR": "psnr_v"}
+TABLE_HDR_RE = re.compile(r'^\s*Total Frames\s*\|\s*(.+?)\s*$', re.M)
+
+def summary_path_for(log_path):
+    # <job_dir>/enc.log -> enc.summary.txt ; <seq>_QP<qp>.log(.xz) -> <seq>_QP<qp>.summary.txt
+    return plain_name(log_path).with_suffix(".summary.txt")
+
+def summary_args(log_path):
+    return [f"--SummaryOutFilename={summary_path_for(log_path)}", "--PrintHexPSNR=1"]
+
+def reset_summary(log_path):
+    # EncoderApp mở file summary ở chế độ append -> xóa bản của lần chạy trước
+    Path(summary_path_for(log_path)).unlink(missing_ok=True)
+
+def read_summary_file(path):
+    """
+    Strict reader: first line = m_gcAnalyzeAll of layer 0 (later lines: WPSNR / field / other layers).
+    None when the file does not exist; ValueError when its layout is not one EncoderApp writes.
+    """
+    p = resolve(path)
+    if p is None: return None
+    lines = [ln for ln in read_text(p).splitlines() if ln.strip()]
+    if not lines:
+        raise ValueError(f"{p}: empty summary file")
+    cols = lines[0].split()
+    if len(cols) not in SUMMARY_WIDTHS or not all(FLOAT_RE.match(c) for c in cols):
+        raise ValueError(f"{p}: unexpected summary layout {lines[0]!r}")
+    return dict(zip(SUMMARY_WIDTHS[len(cols)], map(float, cols)))
+
+def _hex_double(h):
+    return struct.unpack("<d", int(h, 16).to_bytes(8, "little"))[0]
+
+def parse_hex_psnr(text):
+    """Exact Y/U/V-PSNR from the PrintHexPSNR columns of the first 'a' summary row; {} if not printed."""
+    m = TABLE_HDR_RE.search(text)
+    if not m: return {}
+    names = m.group(1).split()
+    for ln in text[m.end():].splitlines():
+        if not ln.strip(): continue
+        vals = ln.split()[2:]  # "<frames> a <bitrate> ..." ; names bắt đầu từ Bitrate
+        out = {}
+        for n, v in zip(names, vals):
+            if n in HEX_COLS:
+                try:
+                    out[HEX_COLS[n]] = _hex_double(v)
+                except ValueError:
+                    return {}
+        return out
+    return {}
+
+def encoder_metrics(log_path, text=None):
+    """
+    Summary-file metrics (+ exact hex PSNR from the log when present) for one EncoderApp run, or None
+    when the run has no summary file -> caller falls back to scraping the log.
+    """
+    try:
+        res = read_summary_file(summary_path_for(log_path))
+    except ValueError as e:
+        print(f"[summary] {e}; falling back to log")
+        return None
+    if res is None: return None
+    if text is None:
+        text = read_text(log_path)
+    res.update(parse_hex_psnr(text))
+    res["source"] = "summary"
+    return res
+
+if __name__ == "__main__":
+    for lp in sys.argv[1:]:
+        print(lp, encoder_metrics(lp))
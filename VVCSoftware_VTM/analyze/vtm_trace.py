@@ -0,0 +1,160 @@
+# vtm_trace.py
+# Timeline của 1 sweep dạng Chrome trace-event JSON (mở bằng chrome://tracing hoặc ui.perfetto.dev):
+#   - mỗi worker slot 1 track: span "job" (group/tool/seq/QP, status) + con: stage, spawn, encode, parse, decode, write
+#   - track "queue": thời gian chờ slot của từng job (async span, chồng nhau = hàng đợi dài)
+#   - counter: running (số job đang chạy), mem_avail_mb, load1 (lấy mẫu mỗi --trace-interval giây)
+# Ghi streaming theo JSON Array Format (']' cuối là optional) -> sweep bị kill giữa chừng vẫn mở được trace.
+#
+# Runner: orchestrate_vtm.py / win_quickfire_runner.py --trace sweep_trace.json [--trace-interval 1]
+import itertools, json, os, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+from timing_harness import load_avg
+
+PID = 1          # process "sweep": track slot + main
+QUEUE_PID = 2    # process "queue": async span chờ slot
+
+def mem_avail_mb():
+    try:
+        for ln in Path("/proc/meminfo").read_text().splitlines():
+            if ln.startswith("MemAvailable:"):
+                return int(ln.split()[1]) / 1024.0
+    except Exception:
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2 ** 20
+    except Exception:
+        return None
+
+class Tracer:
+    """Thread-safe trace writer; Tracer(None) = tắt, mọi method là no-op (call site không cần if)."""
+
+    def __init__(self, path, name="sweep", interval=1.0):
+        self.enabled = bool(path)
+        if not self.enabled: return
+        self.path = Path(path)
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+        self.free, self.n_slots, self.running = [], 0, 0
+        self.ids = itertools.count(1)
+        self.f = open(self.path, "w", encoding="utf-8")
+        self.f.write("[\n")
+        self._emit({"ph": "M", "pid": PID, "name": "process_name", "args": {"name": name}})
+        self._emit({"ph": "M", "pid": QUEUE_PID, "name": "process_name", "args": {"name": "queue"}})
+        self._emit({"ph": "M", "pid": PID, "tid": 0, "name": "thread_name", "args": {"name": "main"}})
+        self.stop = threading.Event()
+        self.sampler = None
+        if interval > 0:
+            self.sampler = threading.Thread(target=self._sample, args=(interval,), daemon=True)
+            self.sampler.start()
+
+    @classmethod
+    def from_args(cls, args, name):
+        return cls(getattr(args, "trace", ""), name, getattr(args, "trace_interval", 1.0))
+
+    def us(self, t):
+        # perf_counter() -> µs kể từ lúc mở trace
+        return round((t - self.t0) * 1e6, 1)
+
+    def _emit(self, ev, flush=False):
+        line = json.dumps(ev, separators=(",", ":"), default=str)
+        with self.lock:
+            self.f.write(line + ",\n")
+            if flush:  # đẩy buffer ra đĩa: sweep bị kill chỉ mất event của job đang chạy
+                self.f.flush()
+
+    def _sample(self, interval):
+        while not self.stop.wait(interval):
+            self.counters()
+
+    def counters(self):
+        if not self.enabled: return
+        ts = self.us(time.perf_counter())
+        mem, load = mem_avail_mb(), load_avg()
+        if mem is not None:
+            self._emit({"ph": "C", "pid": PID, "name": "mem_avail_mb", "ts": ts, "args": {"MB": round(mem, 1)}})
+        if load is not None:
+            self._emit({"ph": "C", "pid": PID, "name": "load1", "ts": ts, "args": {"load": load}})
+        with self.lock:
+            self.f.flush()  # mỗi nhịp lấy mẫu
+
+    # ---- slots ----
+
+    def acquire(self):
+        """Slot id nhỏ nhất đang rảnh (= tid của track); slot mới -> metadata thread_name."""
+        if not self.enabled: return None
+        with self.lock:
+            if self.free:
+                self.free.sort()
+                tid = self.free.pop(0)
+                new = False
+            else:
+                self.n_slots += 1
+                tid, new = self.n_slots, True
+            self.running += 1
+            running = self.running
+        if new:
+            self._emit({"ph": "M", "pid": PID, "tid": tid, "name": "thread_name", "args": {"name": f"slot {tid:02d}"}})
+            self._emit({"ph": "M", "pid": PID, "tid": tid, "name": "thread_sort_index", "args": {"sort_index": tid}})
+        self._emit({"ph": "C", "pid": PID, "name": "running", "ts": self.us(time.perf_counter()), "args": {"jobs": running}})
+        return tid
+
+    def release(self, tid):
+        if not self.enabled or tid is None: return
+        with self.lock:
+            self.free.append(tid)
+            self.running -= 1
+            running = self.running
+        # span job + con của nó đã ghi trước release -> flush sau mỗi job
+        self._emit({"ph": "C", "pid": PID, "name": "running", "ts": self.us(time.perf_counter()), "args": {"jobs": running}},
+                   flush=True)
+
+    # ---- events ----
+
+    def span(self, tid, name, t0, t1, args=None, cat="job"):
+        """Complete event [t0, t1] (perf_counter giây) trên track tid (0 = main)."""
+        if not self.enabled or t0 is None or t1 is None: return
+        ev = {"ph": "X", "pid": PID, "tid": tid or 0, "name": name, "cat": cat, "ts": self.us(t0),
+              "dur": round(max(0.0, t1 - t0) * 1e6, 1)}
+        if args: ev["args"] = args
+        self._emit(ev)
+
+    @contextmanager
+    def phase(self, tid, name, args=None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.span(tid, name, t0, time.perf_counter(), args)
+
+    def queued(self, label, t0, t1, args=None):
+        """Thời gian chờ slot: async span trên process "queue"."""
+        if not self.enabled: return
+        i = next(self.ids)
+        base = {"pid": QUEUE_PID, "tid": 0, "cat": "queue", "name": "queue wait", "id": i}
+        self._emit({**base, "ph": "b", "ts": self.us(t0), "args": {"job": label, **(args or {})}})
+        self._emit({**base, "ph": "e", "ts": self.us(t1)})
+
+    def runner_phases(self, tid, res):
+        """spawn / encode từ các mốc perf_counter mà vtm_runner.run_job ghi vào result."""
+        self.span(tid, "spawn", res.get("t_spawn"), res.get("t_run"))
+        self.span(tid, "encode", res.get("t_run"), res.get("t_exit"),
+                  {"user_s": res.get("user_s"), "maxrss_kb": res.get("maxrss_kb"), "status": res.get("status")})
+
+    def close(self):
+        if not self.enabled: return
+        self.stop.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        self.counters()
+        with self.lock:
+            self.f.write(json.dumps({"ph": "M", "pid": PID, "name": "process_labels",
+                                     "args": {"labels": f"{self.n_slots} slots"}}) + "\n]\n")
+            self.f.close()
+        print(f"[trace] {self.path} ({self.n_slots} slots) -> chrome://tracing / ui.perfetto.dev")
+
+def add_trace_args(ap):
+    ap.add_argument("--trace", default="", help="Ghi Chrome trace-event JSON của sweep (chrome://tracing, Perfetto)")
+    ap.add_argument("--trace-interval", type=float, default=1.0, help="Chu kỳ lấy mẫu counter mem/load (giây, 0 = tắt)")
@@ -0,0 +1,189 @@
+# vvc_nal_scan.py
+# Annex-B VVC bitstream scanner: memory-map the .vvc/.bin, find start codes with a vectorised NumPy
+# search, parse the 2-byte NAL headers (type, nuh_layer_id, TemporalId) and group NALs into pictures
+# / access units. Gives per-AU sizes, bits per temporal layer and the exact bitrate for a frame rate
+# (same count as VTM's summary: every byte on disk incl. start codes and parameter sets).
+#
+# Usage:
+#   python vvc_nal_scan.py str.bin --fps 50 --frames au_sizes.csv
+#   python vvc_nal_scan.py --root runs_out_ablation\COARSE --fps-default 30 --out bitstreams.csv
+#   (win_collect_and_analyze_v4 dùng bitstream làm fallback khi log bị cắt)
+import argparse, csv, re
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from run_archive import codec_of, iter_files, plain_name, read_bytes, resolve
+
+# ITU-T H.266 Table 5
+NAL_TYPE_NAMES = ["TRAIL", "STSA", "RADL", "RASL", "RSV_VCL_4", "RSV_VCL_5", "RSV_VCL_6", "IDR_W_RADL",
+                  "IDR_N_LP", "CRA", "GDR", "RSV_IRAP_11", "OPI", "DCI", "VPS", "SPS", "PPS", "PREFIX_APS",
+                  "SUFFIX_APS", "PH", "AUD", "EOS", "EOB", "PREFIX_SEI", "SUFFIX_SEI", "FD", "RSV_NVCL_26",
+                  "RSV_NVCL_27", "UNSPEC_28", "UNSPEC_29", "UNSPEC_30", "UNSPEC_31"]
+VCL_MAX = 11
+IRAP = (7, 8, 9, 10)
+# non-VCL types that open a new picture unit when they follow the last VCL of a picture (7.4.2.4.4)
+PU_START_TYPES = np.array([12, 13, 14, 15, 16, 17, 19, 20, 23, 26, 28, 29])
+MAX_TID = 7
+SEQ_QP_RE = re.compile(r'^(?P<seq>.+)_QP(?P<qp>\d+)$', re.I)
+STREAM_FIELDS = ["bitstream", "sequence", "qp", "bytes", "nals", "pictures", "aus", "irap", "fps", "bitrate_kbps"] + \
+                [f"tid{t}_bits" for t in range(MAX_TID)]
+FRAME_FIELDS = ["au", "pic", "layer", "tid", "nal_type", "nals", "bytes", "vcl_bytes"]
+
+def find_start_codes(buf, chunk=64 << 20):
+    """Offsets of every 00 00 01 in `buf` (uint8 array/memmap), scanned in chunks so RAM stays flat."""
+    n = len(buf); out = []
+    for s in range(0, max(0, n - 2), chunk):
+        e = min(n, s + chunk + 2)
+        w = buf[s:e]
+        # 0x01 hiếm (~1/256) -> lọc theo byte 3 trước rồi mới kiểm tra 2 byte 0 đứng trước
+        c = np.flatnonzero(w[2:] == 1)
+        c = c[(w[c] == 0) & (w[c + 1] == 0)]
+        out.append(c + s)
+    return np.concatenate(out) if out else np.zeros(0, np.int64)
+
+def scan_nals(path):
+    """
+    Per-NAL arrays for one Annex-B file. `size` spans start code + payload + trailing zeros, so
+    size.sum() == file size (leading zero_byte of a 4-byte start code belongs to the next NAL).
+    """
+    path = Path(path)
+    if codec_of(path):  # bitstream đã archive (run_archive --bitstreams): giải nén vào RAM
+        buf = np.frombuffer(read_bytes(path), dtype=np.uint8)
+        nbytes = len(buf)
+    else:
+        nbytes = path.stat().st_size
+        buf = np.memmap(path, dtype=np.uint8, mode="r") if nbytes >= 5 else None
+    empty = np.zeros(0, np.int64)
+    if nbytes < 5:
+        return {"bytes": nbytes, "start": empty, "size": empty, "type": empty, "layer": empty, "tid": empty, "ph_in_sh": empty}
+    sc = find_start_codes(buf)
+    sc = sc[sc + 4 < nbytes]  # header phải nằm trọn trong file
+    if not len(sc):
+        return {"bytes": nbytes, "start": empty, "size": empty, "type": empty, "layer": empty, "tid": empty, "ph_in_sh": empty}
+    start = sc - ((sc > 0) & (buf[np.maximum(sc - 1, 0)] == 0))
+    start[0] = 0
+    size = np.diff(np.append(start, nbytes))
+    h0, h1 = buf[sc + 3].astype(np.int64), buf[sc + 4].astype(np.int64)
+    typ = h1 >> 3
+    # slice header bit đầu = sh_picture_header_in_slice_header_flag (1 -> slice này là cả picture)
+    b2 = buf[np.minimum(sc + 5, nbytes - 1)].astype(np.int64)
+    ph_in_sh = (typ <= VCL_MAX) & (sc + 5 < nbytes) & ((b2 >> 7) == 1)
+    res = {"bytes": nbytes, "start": start, "size": size, "type": typ, "layer": h0 & 0x3F,
+           "tid": (h1 & 7) - 1, "ph_in_sh": ph_in_sh}
+    del buf
+    return res
+
+def group_pictures(nals):
+    """
+    Picture units in decode order: a candidate (PU_START_TYPES or a VCL carrying its own PH) opens a new
+    picture iff some VCL NAL lies between it and the previous candidate. New AU when nuh_layer_id does not increase.
+    """
+    typ = nals["type"]
+    if not len(typ):
+        return {k: np.zeros(0, np.int64) for k in ("first", "au", "nals", "bytes", "vcl_bytes", "layer", "tid", "nal_type")}
+    is_vcl = typ <= VCL_MAX
+    cand = np.flatnonzero(np.isin(typ, PU_START_TYPES) | nals["ph_in_sh"])
+    if not len(cand) or cand[0] != 0:
+        cand = np.concatenate(([0], cand))
+    vcl_before = np.concatenate(([0], np.cumsum(is_vcl)))[cand]
+    first = cand[np.concatenate(([True], np.diff(vcl_before) > 0))]
+    pic_of = np.cumsum(np.isin(np.arange(len(typ)), first)) - 1
+    n_pic = len(first)
+    size = nals["size"]
+    pbytes = np.bincount(pic_of, weights=size, minlength=n_pic).astype(np.int64)
+    vbytes = np.bincount(pic_of, weights=np.where(is_vcl, size, 0), minlength=n_pic).astype(np.int64)
+    pnals = np.bincount(pic_of, minlength=n_pic)
+    # layer / TId / type của picture = của VCL NAL đầu tiên (param sets có TId 0)
+    vidx = np.flatnonzero(is_vcl)
+    fv = np.full(n_pic, len(typ), np.int64)
+    np.minimum.at(fv, pic_of[vidx], vidx)
+    has = fv < len(typ)
+    fv = np.where(has, fv, 0)
+    layer = np.where(has, nals["layer"][fv], -1)
+    tid = np.where(has, nals["tid"][fv], -1)
+    ptype = np.where(has, typ[fv], -1)
+    au = np.cumsum(np.concatenate(([True], layer[1:] <= layer[:-1]))) - 1
+    return {"first": first, "au": au, "nals": pnals, "bytes": pbytes, "vcl_bytes": vbytes,
+            "layer": layer, "tid": tid, "nal_type": ptype}
+
+def scan_bitstream(path, fps=None):
+    """Summary dict (STREAM_FIELDS) + per-picture arrays for one bitstream."""
+    nals = scan_nals(path)
+    pics = group_pictures(nals)
+    # trailing non-VCL không tạo picture mới nên picture không có VCL chỉ có thể là rác đầu file
+    vcl = pics["tid"] >= 0
+    n_au = int(pics["au"][vcl].max() + 1) if vcl.any() else 0
+    tid_bits = np.bincount(np.clip(pics["tid"][vcl], 0, MAX_TID - 1), weights=pics["bytes"][vcl] * 8, minlength=MAX_TID)
+    m = SEQ_QP_RE.match(plain_name(path).stem) or SEQ_QP_RE.match(Path(path).parent.name)
+    summ = {"bitstream": str(path), "sequence": m.group("seq") if m else "", "qp": int(m.group("qp")) if m else None,
+            "bytes": nals["bytes"], "nals": len(nals["type"]), "pictures": int(vcl.sum()), "aus": n_au,
+            "irap": int(np.isin(pics["nal_type"], IRAP).sum()), "fps": fps,
+            # như VTM: tổng bits (cả SPS/PPS/SEI) / số frame * fps
+            "bitrate_kbps": nals["bytes"] * 8.0 / n_au * fps / 1000.0 if fps and n_au else None}
+    summ.update({f"tid{t}_bits": int(tid_bits[t]) for t in range(MAX_TID)})
+    return summ, pics
+
+def frame_rows(pics):
+    return [{"au": int(a), "pic": i, "layer": int(l), "tid": int(t),
+             "nal_type": NAL_TYPE_NAMES[ty] if ty >= 0 else "", "nals": int(n), "bytes": int(b), "vcl_bytes": int(v)}
+            for i, (a, l, t, ty, n, b, v) in enumerate(zip(pics["au"], pics["layer"], pics["tid"], pics["nal_type"],
+                                                          pics["nals"], pics["bytes"], pics["vcl_bytes"]))]
+
+def bitstream_for(log_path):
+    # orchestrate_vtm: <job_dir>/str.bin ; win_* runners: <seq>_QP<qp>.vvc cạnh log
+    lp = plain_name(log_path)
+    for cand in (lp.parent / "str.bin", lp.with_suffix(".vvc")):
+        cand = resolve(cand)
+        if cand is not None and cand.stat().st_size > 0:
+            return cand
+    return None
+
+def bitrate_from_bitstream(log_path, fps):
+    """Exact kbps from the bitstream next to a log, or None when there is none / it has no pictures."""
+    bs = bitstream_for(log_path)
+    if bs is None: return None
+    try:
+        return scan_bitstream(bs, fps)[0]["bitrate_kbps"]
+    except (OSError, ValueError):
+        return None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("bitstreams", nargs="*", help=".vvc / .bin files")
+    ap.add_argument("--root", default=None, help="Quét đệ quy *.vvc và str.bin dưới thư mục này")
+    ap.add_argument("--fps", type=float, default=None, help="Frame rate; mặc định lấy từ tên sequence (_50, _60...)")
+    ap.add_argument("--fps-default", type=int, default=30)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--out", default="bitstreams.csv")
+    ap.add_argument("--frames", default=None, help="CSV per picture/AU (chỉ khi quét 1 file)")
+    args = ap.parse_args()
+
+    from win_collect_and_analyze_v4 import infer_fps_from_seqname
+    paths = [Path(p) for p in args.bitstreams]
+    if args.root:
+        root = Path(args.root)
+        paths += sorted(iter_files(root, ("*.vvc", "str.bin")))
+    if not paths:
+        raise SystemExit("no bitstreams (pass files or --root)")
+
+    def one(p):
+        m = SEQ_QP_RE.match(plain_name(p).stem) or SEQ_QP_RE.match(p.parent.name)
+        fps = args.fps or infer_fps_from_seqname(m.group("seq") if m else p.stem, args.fps_default)
+        return scan_bitstream(p, fps)
+
+    # memmap + NumPy nhả GIL trong phần quét -> thread pool là đủ
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        res = list(ex.map(one, paths))
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=STREAM_FIELDS); w.writeheader(); [w.writerow(s) for s, _ in res]
+    if args.frames and len(res) == 1:
+        with open(args.frames, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=FRAME_FIELDS); w.writeheader(); w.writerows(frame_rows(res[0][1]))
+    for s, _ in res[:20]:
+        br = f"{s['bitrate_kbps']:.4f} kbps @ {s['fps']:g} fps" if s["bitrate_kbps"] is not None else "n/a"
+        print(f"{s['bitstream']}: {s['aus']} AU, {s['nals']} NAL, {s['bytes']} B -> {br}")
+    print(f"[OK] {len(res)} bitstreams -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,18 @@
 # Usage:
 #   pip install pyyaml numpy
 #   python win_ablation_fast.py --yaml your_experiment_ablation.yaml --workers 24 --topk 5
-import argparse, os, sys, shlex, subprocess, json, math, statistics
+import argparse, os, sys, json, math, statistics
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 
+from vtm_summary import reset_summary, summary_args
 from vtm_logparser_win import parse_log_for_metrics
+from run_archive import resolve
 from bdrate_win import bd_rate
-
-CREATE_BELOW_NORMAL = 0x00004000
-
-def quote_win(p: str) -> str:
-    if p is None: return ""
-    p = str(p)
-    if " " in p or "(" in p or ")" in p:
-        return f'"{p}"'
-    return p
+from seq_cache import SeqCache, seq_bytes
+from proxy_clips import FIDELITY_LEVELS, apply_fidelity
+from vtm_runner import add_runner_args, job_spec, limits_from_args, run_job, with_input
 
 def build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, args_list, out_dir, frames_override=None, nobitstream=False):
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -26,24 +22,17 @@ def build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, args_list, out_dir, frames
     log_path  = out_dir / f"{seq['name']}_QP{qp}.log"
 
     frames = frames_override if frames_override is not None else seq.get('frames', 64)
-    b_arg = "NUL" if nobitstream else str(bitstream)
+    b_arg = os.devnull if nobitstream else str(bitstream)  # NUL (Windows) / /dev/null
 
     base = [
-        quote_win(vtm_bin), "-c", quote_win(base_cfg),
-        "-i", quote_win(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
+        str(vtm_bin), "-c", str(base_cfg),
+        "-i", str(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
         "-fr", str(seq['fps']), "-f", str(frames), "-q", str(qp),
-        "-b", quote_win(b_arg),
+        "-b", b_arg,
     ]
-    full = base + fixed_args + args_list
-    cmd = " ".join(full) + f" > {quote_win(str(log_path))} 2>&1"
-    return cmd, bitstream, log_path
-
-def run_cmd(cmd):
-    try:
-        rc = subprocess.call(cmd, shell=True, creationflags=CREATE_BELOW_NORMAL)
-        return rc
-    except Exception:
-        return -1
+    argv = base + summary_args(log_path) + fixed_args + args_list
+    reset_summary(log_path)
+    return argv, bitstream, log_path
 
 def average(lst):
     lst2=[x for x in lst if x is not None]
@@ -60,13 +49,21 @@ def main():
     ap.add_argument("--topk", type=int, default=5, help="Top-K experiments per group to keep")
     ap.add_argument("--out_yaml", default="experiment_shortlist.yaml")
     ap.add_argument("--summary", default="ablation_summary_coarse.csv")
+    ap.add_argument("--fidelity", default="full",
+                    help=f"Screening trên proxy clip: {list(FIDELITY_LEVELS)} hoặc frames=16,scale=2,stride=1,crop=0.5")
+    ap.add_argument("--proxy-dir", default="", help="Cache proxy YUV (mặc định <output_dir>/proxy_cache)")
+    ap.add_argument("--stage-dir", default="", help="Cache input YUV (tmpfs/NVMe); 'auto' = /dev/shm hoặc temp")
+    ap.add_argument("--stage-cap", default="", help="Giới hạn dung lượng cache, vd 64G")
+    add_runner_args(ap, nice=10)
     args = ap.parse_args()
+    limits = limits_from_args(args)
 
     cfg = yaml.safe_load(Path(args.yaml).read_text(encoding="utf-8"))
     vtm_bin = cfg["vtm_bin"]; base_cfg = cfg["base_cfg"]
     out_root = Path(cfg.get("output_dir","./runs_out_ablation"))
     fixed_args = cfg.get("fixed_args", [])
-    sequences = cfg["sequences"]
+    sequences = apply_fidelity(cfg["sequences"], args.fidelity, args.proxy_dir or out_root / "proxy_cache", args.frames)
+    coarse_root = "COARSE" if args.fidelity == "full" else f"COARSE_{args.fidelity.replace('=', '').replace(',', '_')}"
     coarse_qps = [int(x) for x in args.qps.split(",")]
 
     # Build experiment groups per phase
@@ -96,44 +93,59 @@ def main():
     for seq in sequences:
         for b in baseline_defs:
             for qp in coarse_qps:
-                out_dir = out_root / "COARSE" / "baselines" / b["name"] / seq["name"] / f"QP{qp}"
+                out_dir = out_root / coarse_root / "baselines" / b["name"] / seq["name"] / f"QP{qp}"
                 cmd, bs, logp = build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, b.get("args",[]),
                                           out_dir, frames_override=args.frames, nobitstream=args.nobitstream)
-                jobs.append(("baseline", b["name"], seq["name"], qp, cmd, str(logp)))
+                jobs.append(("baseline", b["name"], seq["name"], qp, cmd, str(logp), seq))
 
     for (group_name, items) in groups:
         if group_name == "baselines": continue
         for seq in sequences:
             for it in items:
                 for qp in coarse_qps:
-                    out_dir = out_root / "COARSE" / group_name / it["name"] / seq["name"] / f"QP{qp}"
+                    out_dir = out_root / coarse_root / group_name / it["name"] / seq["name"] / f"QP{qp}"
                     cmd, bs, logp = build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, it.get("args",[]),
                                               out_dir, frames_override=args.frames, nobitstream=args.nobitstream)
-                    jobs.append((group_name, it["name"], seq["name"], qp, cmd, str(logp)))
+                    jobs.append((group_name, it["name"], seq["name"], qp, cmd, str(logp), seq))
 
     # Randomize job order to better fill cores
     import random
     random.shuffle(jobs)
 
+    # Staging: 16 frame đầu của mỗi sequence được copy 1 lần vào cache
+    cache = SeqCache.from_args(args.stage_dir, args.stage_cap)
+    if cache is not None:
+        for j in jobs:
+            cache.plan(j[6]["yuv"])
+
+    def launch(j):
+        argv, logp, seq = j[4], j[5], j[6]
+        if cache is None:
+            return run_job(job_spec(argv, logp, **limits))["retcode"]
+        with cache.staged(seq["yuv"], seq_bytes(seq, args.frames)) as yuv:
+            return run_job(job_spec(with_input(argv, yuv), logp, **limits))["retcode"]
+
     # Run in parallel
     print(f"[INFO] Coarse stage: {len(jobs)} runs, qps={coarse_qps}, frames={args.frames}, nobitstream={args.nobitstream}")
     rows_detail = []
     from collections import defaultdict
     rd_anchor = defaultdict(lambda: {"bitrate":{}, "psnr":{}})
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        fut2job = {ex.submit(run_cmd, j[4]): j for j in jobs}
+        fut2job = {ex.submit(launch, j): j for j in jobs}
         for fut in as_completed(fut2job):
-            group_name, exp_name, seq_name, qp, cmd, logp = fut2job[fut]
+            group_name, exp_name, seq_name, qp, cmd, logp, _ = fut2job[fut]
             rc = fut.result()
             if rc != 0:
                 print(f"[WARN] rc={rc} for {group_name}:{exp_name} {seq_name} QP{qp}")
             br, py = (None, None)
-            if Path(logp).exists():
+            if resolve(logp):
                 br, py = parse_log_for_metrics(logp)
             rows_detail.append({"group": group_name, "experiment": exp_name, "sequence": seq_name, "qp": qp, "bitrate_kbps": br, "psnrY_dB": py})
             if group_name == "baseline" and exp_name == anchor_name and br is not None and py is not None:
                 rd_anchor[seq_name]["bitrate"][qp] = br
                 rd_anchor[seq_name]["psnr"][qp] = py
+    if cache is not None:
+        print(cache.summary())
 
     # Compute BD-Rate vs anchor for each experiment/sequence
     rows_summary = []
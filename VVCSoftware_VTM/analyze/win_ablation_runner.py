@@ -3,48 +3,33 @@
 # Usage:
 #   pip install pyyaml numpy
 #   python win_ablation_runner.py --yaml your_experiment_ablation.yaml --workers 28
-import argparse, os, sys, shlex, subprocess, json
+import argparse, csv, os, sys, json
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import yaml
+from vtm_summary import reset_summary, summary_args
 from vtm_logparser_win import parse_log_for_metrics
+from run_archive import resolve
 from bdrate_win import bd_rate
-
-CREATE_BELOW_NORMAL = 0x00004000  # Windows process priority hint
-
-def quote_win(p: str) -> str:
-    # Properly quote Windows paths with spaces/backslashes for cmd.exe
-    if not p:
-        return p
-    p = str(p)
-    if " " in p or "(" in p or ")" in p:
-        return f'"{p}"'
-    return p
+from vtm_runner import add_runner_args, job_spec, limits_from_args, run_job
 
 def build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, args_list, out_dir):
     out_dir.mkdir(parents=True, exist_ok=True)
     bitstream = out_dir / f"{seq['name']}_QP{qp}.vvc"
     log_path  = out_dir / f"{seq['name']}_QP{qp}.log"
 
-    # Compose full command for EncoderApp
+    # Compose full argv for EncoderApp (no shell: paths with spaces need no quoting)
     base = [
-        quote_win(vtm_bin), "-c", quote_win(base_cfg),
-        "-i", quote_win(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
+        str(vtm_bin), "-c", str(base_cfg),
+        "-i", str(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
         "-fr", str(seq['fps']), "-f", str(seq['frames']), "-q", str(qp),
-        "-b", quote_win(str(bitstream)),
+        "-b", str(bitstream),
     ]
     # fixed args come first, then experiment args
-    full = base + fixed_args + args_list
-    cmd = " ".join(full) + f" > {quote_win(str(log_path))} 2>&1"
-    return cmd, bitstream, log_path
-
-def run_cmd(cmd):
-    try:
-        rc = subprocess.call(cmd, shell=True, creationflags=CREATE_BELOW_NORMAL)
-        return rc
-    except Exception as e:
-        return -1
+    argv = base + summary_args(log_path) + fixed_args + args_list
+    reset_summary(log_path)
+    return argv, bitstream, log_path
 
 def main():
     ap = argparse.ArgumentParser()
@@ -52,7 +37,9 @@ def main():
     ap.add_argument("--workers", type=int, default=28, help="Max parallel processes (leave headroom on 32T CPU)")
     ap.add_argument("--summary", default="ablation_summary_win.csv")
     ap.add_argument("--phase", choices=["perf_add","perf_ablate","speed_add","speed_ablate","all"], default="all")
+    add_runner_args(ap, nice=10)  # mặc định = BELOW_NORMAL như trước
     args = ap.parse_args()
+    limits = limits_from_args(args)
 
     cfg = yaml.safe_load(Path(args.yaml).read_text(encoding="utf-8"))
 
@@ -105,15 +92,15 @@ def main():
     # Run in parallel
     print(f"[INFO] Launching {len(jobs)} encodes with up to {args.workers} workers...")
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        fut2job = {ex.submit(run_cmd, j[4]): j for j in jobs}
+        fut2job = {ex.submit(run_job, job_spec(j[4], j[5], **limits)): j for j in jobs}
         for fut in as_completed(fut2job):
             group_name, exp_name, seq_name, qp, cmd, logp = fut2job[fut]
-            rc = fut.result()
+            rc = fut.result()["retcode"]
             if rc != 0:
                 print(f"[WARN] Non-zero exit for {group_name}:{exp_name} {seq_name} QP{qp} (rc={rc})")
             # Parse metrics if log exists
             br, py = (None, None)
-            if Path(logp).exists():
+            if resolve(logp):
                 br, py = parse_log_for_metrics(logp)
 
             # Store baseline metrics
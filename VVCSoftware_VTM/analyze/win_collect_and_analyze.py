@@ -13,10 +13,11 @@
 import argparse, re, csv
 from pathlib import Path
 from collections import defaultdict
+from run_archive import read_text, iter_logs
 
 def parse_log_for_metrics(log_path: str):
     try:
-        t = Path(log_path).read_text(errors="ignore")
+        t = read_text(log_path)
     except Exception:
         return None, None
     import re
@@ -79,7 +80,7 @@ def main():
     rows = []
     qp_re = re.compile(r"^QP(\d+)$", re.I)
 
-    for p in root.rglob("*.log"):
+    for p in iter_logs(root):
         try:
             qp_dir = p.parent.name
             m = qp_re.match(qp_dir)
@@ -11,6 +11,7 @@
 import argparse, re, csv
 from pathlib import Path
 from collections import defaultdict
+from run_archive import read_text, iter_logs
 
 # ---- Robust parsers ---------------------------------------------------------
 SUMMARY_BITRATE = re.compile(r'Bitrate\s*\(kbps\)\s*[:=]\s*([0-9.]+)', re.I)
@@ -35,7 +36,7 @@ def parse_log_for_metrics_robust(log_path: str):
       3) Bitrate: pull from SUMMARY or ANY_BITRATE fallback.
     """
     try:
-        text = Path(log_path).read_text(errors="ignore")
+        text = read_text(log_path)
     except Exception:
         return None, None
 
@@ -114,7 +115,7 @@ def main():
     rows = []
     qp_re = re.compile(r"^QP(\d+)$", re.I)
 
-    for p in root.rglob("*.log"):
+    for p in iter_logs(root):
         try:
             qp_dir = p.parent.name
             m = qp_re.match(qp_dir)
@@ -12,6 +12,7 @@
 import argparse, re, csv
 from pathlib import Path
 from collections import defaultdict
+from run_archive import read_text, iter_logs
 
 # ---- Parsers ---------------------------------------------------------
 POC_Y_BRACKETS  = re.compile(r'\bPOC\b.*?\[.*?Y\s*([0-9]+(?:\.[0-9]+)?)\s*dB', re.I)
@@ -23,13 +24,7 @@ ANY_BITRATE2    = re.compile(r'Avg\.?\s*bitrate\s*[:=]\s*([0-9.]+)\s*kbps', re.I
 LAYER_HDR = re.compile(r'Total\s+Frames\s*\|\s*Bitrate\s*Y-PSNR', re.I)
 
 def read_text_auto(log_path):
-    p = Path(log_path)
-    for enc in ("utf-8", "utf-16-le", None):
-        try:
-            return p.read_text(encoding=enc, errors="ignore")
-        except Exception:
-            continue
-    return ""
+    return read_text(log_path)  # plain / .gz / .xz / .bz2 / .zst
 
 def parse_layer_summary(text):
     m = LAYER_HDR.search(text)
@@ -139,7 +134,7 @@ def main():
     rows = []
     qp_re = re.compile(r"^QP(\d+)$", re.I)
 
-    for p in root.rglob("*.log"):
+    for p in iter_logs(root):
         try:
             qp_dir = p.parent.name
             m = qp_re.match(qp_dir)
@@ -3,6 +3,8 @@
 import argparse, re, csv, math
 from pathlib import Path
 from collections import defaultdict
+from run_archive import read_text, iter_logs  # read_text: plain / .gz / .xz / .bz2 / .zst, re-exported
+from vtm_summary import encoder_metrics
 
 # -------- Regex / Helpers --------
 POC_BITS_LINE   = re.compile(r'\bPOC\b.*?\b([0-9]+)\s+bits\b', re.I)
@@ -10,20 +12,14 @@ POC_Y_BRACKETS  = re.compile(r'\bPOC\b.*?\[.*?Y\s*([0-9]+(?:\.[0-9]+)?)\s*dB', r
 POC_Y_PSNR      = re.compile(r'\bPOC\b.*?(?:PSNR|PSNRY)\s*Y[:\s]*([0-9]+(?:\.[0-9]+)?)', re.I)
 LAYER_HDR       = re.compile(r'Total\s+Frames\s*\|\s*Bitrate\s*Y-PSNR', re.I)
 QP_DIR_RE       = re.compile(r'^QP(\d+)$', re.I)
-
-def read_text(p: Path) -> str:
-    for enc in ("utf-8", "utf-16-le", None):
-        try:
-            return p.read_text(encoding=enc, errors="ignore")
-        except Exception:
-            continue
-    return ""
+TOTAL_TIME_RE   = re.compile(r'Total\s+Time:\s*([0-9.]+)\s*sec\.\s*\[user\]\s*([0-9.]+)\s*sec\.\s*\[elapsed\]', re.I)
+POC_ET          = re.compile(r'\bPOC\b.*?\[ET\s+([0-9.]+)\s*\]', re.I)
 
 def parse_layer_summary(text: str):
     m = LAYER_HDR.search(text)
     if not m: return None, None
-    # hàng ngay sau header, bỏ dòng rỗng
-    for ln in text[m.end():].splitlines():
+    # hàng ngay sau header, bỏ dòng rỗng (phần còn lại của dòng header: U/V/YUV-PSNR, xY-PSNR... thì bỏ qua)
+    for ln in text[m.end():].splitlines()[1:]:
         s = ln.strip()
         if not s: continue
         cols = re.split(r'\s+', s)
@@ -45,9 +41,17 @@ def infer_fps_from_seqname(seq: str, fps_default: int):
         except: pass
     return fps_default
 
-def parse_log_metrics(log_path: str, seqname: str, fps_default: int):
+def parse_log_time(text: str):
+    # elapsed từ "Total Time"; log bị cắt -> cộng [ET n] theo POC
+    m = TOTAL_TIME_RE.search(text)
+    if m: return float(m.group(2))
+    ets = [float(x) for x in POC_ET.findall(text)]
+    return float(sum(ets)) if ets else None
+
+def parse_log_metrics(log_path: str, seqname: str, fps_default: int, with_time: bool = False):
     text = read_text(Path(log_path))
-    br, py = parse_layer_summary(text)
+    s = encoder_metrics(log_path, text)  # <seq>_QP<qp>.summary.txt (SummaryOutFilename) nếu runner có ghi
+    br, py = (s["bitrate_kbps"], s["psnr_y"]) if s else parse_layer_summary(text)
 
     if py is None:  # fallback: trung bình PSNR-Y theo POC
         ys = [float(x) for x in POC_Y_BRACKETS.findall(text)]
@@ -56,11 +60,19 @@ def parse_log_metrics(log_path: str, seqname: str, fps_default: int):
         if ys:
             py = sum(ys)/len(ys)
 
-    if br is None:  # fallback: tự tính bitrate từ tổng bits theo POC
+    if br is None:  # fallback 1: bitstream cạnh log (<seq>_QP<qp>.vvc / str.bin) -> bitrate chính xác
+        try:
+            from vvc_nal_scan import bitrate_from_bitstream
+            br = bitrate_from_bitstream(log_path, infer_fps_from_seqname(seqname, fps_default))
+        except ImportError:  # numpy
+            pass
+    if br is None:  # fallback 2: tự tính bitrate từ tổng bits theo POC
         bits = [int(x) for x in POC_BITS_LINE.findall(text)]
         if bits:
             fps = infer_fps_from_seqname(seqname, fps_default)
             br = (sum(bits)/max(1,len(bits))) * fps / 1000.0  # kbps
+    if with_time:
+        return br, py, parse_log_time(text)
     return br, py
 
 # -------- BD-Rate --------
@@ -115,7 +127,7 @@ def main():
         raise SystemExit(f"ROOT not found: {root}")
 
     rows = []
-    for p in root.rglob("*.log"):
+    for p in iter_logs(root):
         qpdir = p.parent.name
         m = QP_DIR_RE.match(qpdir)
         if not m: 
@@ -130,13 +142,13 @@ def main():
         else:
             group = group_parent.name; exp = exp_or_seq_parent.name
 
-        br, py = parse_log_metrics(str(p), seq, args.fps_default)
+        br, py, tenc = parse_log_metrics(str(p), seq, args.fps_default, with_time=True)
         rows.append({"group":group,"experiment":exp,"sequence":seq,"qp":qp,
-                     "bitrate_kbps":br,"psnrY_dB":py,"log":str(p)})
+                     "bitrate_kbps":br,"psnrY_dB":py,"enc_time_s":tenc,"log":str(p)})
 
     # Ảnh chụp đã thu thập
     with open("collected_runs_snapshot.csv","w",newline="",encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["group","experiment","sequence","qp","bitrate_kbps","psnrY_dB","log"])
+        w = csv.DictWriter(f, fieldnames=["group","experiment","sequence","qp","bitrate_kbps","psnrY_dB","enc_time_s","log"])
         w.writeheader(); [w.writerow(r) for r in rows]
 
     # Build RD points cho anchor
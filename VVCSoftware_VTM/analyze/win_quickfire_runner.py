@@ -10,58 +10,40 @@
 #   - --coarse sets qps=27,32,37 and frames=16, and --nobitstream
 #   - --inherit PERFADD=Baseline_Min  --> perf_add experiments will append Baseline_Min args automatically
 #   - --skip-baselines Baseline_Min   --> do not launch Baseline_Min anchors now (they're slow); analyze later
+#   - --fidelity half                  --> encode cached proxy clips (16 frames, 1/2 x 1/2) under <output_dir>/PROXY_half
+#   - --stage-dir D:\vtm_cache --stage-cap 64G --> copy/hard-link each source YUV to a fast local cache first
+#   - --log-codec xz                   --> logs streamed through a compressor (<seq>_QP<qp>.log.xz)
+#   - --trace quickfire_trace.json     --> Chrome trace: 1 track/worker slot (queue wait, spawn, encode), parse/CSV on 'main'
 
-import argparse, os, sys, shlex, subprocess, json, csv, time
+import argparse, os, sys, json, csv, time
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import yaml
-from vtm_logparser_win import parse_log_for_metrics
-
-CREATE_BELOW_NORMAL = 0x00004000
-CREATE_NEW_PROCESS_GROUP = 0x00000200
-
-def quote_win(p: str) -> str:
-    if p is None: return ""
-    p = str(p)
-    if any(ch in p for ch in [' ', '(', ')']):
-        return f'"{p}"'
-    return p
+from vtm_summary import reset_summary, summary_args
+from vtm_logparser_win import parse_log_for_metrics, parse_log_for_time
+from seq_cache import SeqCache, seq_bytes
+from proxy_clips import FIDELITY_LEVELS, apply_fidelity
+from run_archive import CODEC_SUFFIX, resolve
+from vtm_runner import add_runner_args, job_spec, limits_from_args, run_job, with_input
+from vtm_trace import Tracer, add_trace_args
 
 def build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, args_list, out_dir, frames_override=None, nobitstream=False):
     out_dir.mkdir(parents=True, exist_ok=True)
     bitstream = out_dir / f"{seq['name']}_QP{qp}.vvc"
     log_path  = out_dir / f"{seq['name']}_QP{qp}.log"
     frames = frames_override if frames_override is not None else seq.get('frames', 64)
-    b_arg = "NUL" if nobitstream else str(bitstream)
+    b_arg = os.devnull if nobitstream else str(bitstream)  # NUL (Windows) / /dev/null
 
     base = [
-        quote_win(vtm_bin), "-c", quote_win(base_cfg),
-        "-i", quote_win(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
+        str(vtm_bin), "-c", str(base_cfg),
+        "-i", str(seq['yuv']), "-wdt", str(seq['width']), "-hgt", str(seq['height']),
         "-fr", str(seq['fps']), "-f", str(frames), "-q", str(qp),
-        "-b", quote_win(b_arg),
+        "-b", b_arg,
     ]
-    full = base + fixed_args + (args_list or [])
-    cmd = " ".join(full)
-    return cmd, str(log_path)
-
-def run_one(cmd, log_path, timeout_sec=None):
-    # shell=True for CLI flags; BELOW_NORMAL priority to stay responsive
-    with open(log_path, "w", encoding="utf-8", errors="ignore") as logf:
-        try:
-            p = subprocess.Popen(cmd + f" 2>&1", shell=True, stdout=logf,
-                                 creationflags=CREATE_BELOW_NORMAL|CREATE_NEW_PROCESS_GROUP)
-            rc = p.wait(timeout=timeout_sec) if timeout_sec and timeout_sec>0 else p.wait()
-            status = "DONE" if rc == 0 else f"RC={rc}"
-        except subprocess.TimeoutExpired:
-            try:
-                p.terminate()
-            except Exception:
-                pass
-            status = "TIMEOUT"
-        except Exception as e:
-            status = f"ERR:{e.__class__.__name__}"
-    return status
+    argv = base + summary_args(log_path) + fixed_args + (args_list or [])
+    reset_summary(log_path)
+    return argv, str(log_path)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -71,14 +53,22 @@ def main():
     ap.add_argument("--qps", default="", help="Override QPs, e.g., 27,32,37")
     ap.add_argument("--frames", type=int, default=0, help="Override frames per run")
     ap.add_argument("--nobitstream", action="store_true")
-    ap.add_argument("--timeout-sec", type=int, default=0, help="Kill a job if it exceeds this many seconds")
     ap.add_argument("--skip-baselines", default="", help="Comma-separated baseline names to skip launching now")
     ap.add_argument("--inherit", action="append", default=[],
                     help="Format GROUP=BASELINE_NAME (e.g., PERFADD=Baseline_Min) to inherit BASELINE args for all items in GROUP.")
     ap.add_argument("--groups", default="perf_ablate,perf_add", help="Which groups to run: comma-separated from {perf_ablate,perf_add,speed_ablate,speed_add}")
     ap.add_argument("--manifest", default="manifest_quickfire.json")
     ap.add_argument("--csv", default="quickfire_runs.csv")
+    ap.add_argument("--fidelity", default="full",
+                    help=f"Screening trên proxy clip: {list(FIDELITY_LEVELS)} hoặc frames=16,scale=2,stride=1,crop=0.5")
+    ap.add_argument("--proxy-dir", default="", help="Cache proxy YUV (mặc định <output_dir>/proxy_cache)")
+    ap.add_argument("--stage-dir", default="", help="Cache input YUV (tmpfs/NVMe); 'auto' = /dev/shm hoặc temp")
+    ap.add_argument("--stage-cap", default="", help="Giới hạn dung lượng cache, vd 64G")
+    ap.add_argument("--log-codec", default="", choices=[""] + list(CODEC_SUFFIX), help="Nén log khi ghi: gz/xz/bz2/zst")
+    add_runner_args(ap, nice=10)
+    add_trace_args(ap)
     args = ap.parse_args()
+    limits = limits_from_args(args)
 
     cfg = yaml.safe_load(Path(args.yaml).read_text(encoding="utf-8"))
 
@@ -99,6 +89,11 @@ def main():
         frames_override = args.frames if args.frames>0 else None
         nobit = args.nobitstream
 
+    # Proxy clips: sequence entry được thay bằng YUV đã cắt/thu nhỏ, build_cmd không cần biết
+    if args.fidelity != "full":
+        sequences = apply_fidelity(sequences, args.fidelity, args.proxy_dir or out_root / "proxy_cache", frames_override)
+        out_root = out_root / f"PROXY_{args.fidelity.replace('=', '').replace(',', '_')}"
+
     # Parse group selections
     wanted_groups = [g.strip() for g in args.groups.split(",") if g.strip()]
     group_keys = [g for g in ["perf_ablate","perf_add","speed_ablate","speed_add"] if g in cfg and g in wanted_groups]
@@ -126,7 +121,8 @@ def main():
                 out_dir = out_root / "baselines" / b["name"] / seq["name"] / f"QP{qp}"
                 cmd, logp = build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, b.get("args",[]),
                                       out_dir, frames_override=frames_override, nobitstream=nobit)
-                jobs.append({"group":"baseline","exp":b["name"],"seq":seq["name"],"qp":qp,"cmd":cmd,"log":logp})
+                jobs.append({"group":"baseline","exp":b["name"],"seq":seq["name"],"qp":qp,"cmd":cmd,"log":logp,
+                             "yuv":seq["yuv"],"yuv_bytes":seq_bytes(seq, frames_override)})
 
     # Experiments by group
     for gk in group_keys:
@@ -142,37 +138,72 @@ def main():
                     out_dir = out_root / gk / exp_name / seq["name"] / f"QP{qp}"
                     cmd, logp = build_cmd(vtm_bin, base_cfg, seq, qp, fixed_args, exp_args,
                                           out_dir, frames_override=frames_override, nobitstream=nobit)
-                    jobs.append({"group":gk,"exp":exp_name,"seq":seq["name"],"qp":qp,"cmd":cmd,"log":logp})
+                    jobs.append({"group":gk,"exp":exp_name,"seq":seq["name"],"qp":qp,"cmd":cmd,"log":logp,
+                                 "yuv":seq["yuv"],"yuv_bytes":seq_bytes(seq, frames_override)})
 
     # Shuffle to fill cores evenly
     import random; random.shuffle(jobs)
 
+    # Staging: mỗi sequence được copy 1 lần vào cache, các job cùng sequence đọc từ đó
+    cache = SeqCache.from_args(args.stage_dir, args.stage_cap)
+    if cache is not None:
+        for j in jobs:
+            cache.plan(j["yuv"])
+
+    tracer = Tracer.from_args(args, "win_quickfire_runner")
+
+    def launch(j, t_q):
+        tid = tracer.acquire()
+        t0 = time.perf_counter()
+        label = f"{j['group']}/{j['exp']} {j['seq']} QP{j['qp']}"
+        tracer.queued(label, t_q, t0)
+        res = {"status": "ERR"}
+        try:
+            if cache is None:
+                res = run_job(job_spec(j["cmd"], j["log"], args.log_codec, **limits))
+            else:
+                t_s = time.perf_counter()
+                with cache.staged(j["yuv"], j["yuv_bytes"]) as yuv:
+                    tracer.span(tid, "stage", t_s, time.perf_counter())
+                    res = run_job(job_spec(with_input(j["cmd"], yuv), j["log"], args.log_codec, **limits))
+            tracer.runner_phases(tid, res)
+            return res["status"]
+        finally:
+            tracer.span(tid, label, t0, time.perf_counter(), {"status": res["status"], "queue_wait_s": round(t0 - t_q, 3)})
+            tracer.release(tid)
+
     # Run
     print(f"[INFO] Quickfire: {len(jobs)} runs, qps={qps}, frames={frames_override or 'YAML'}, nobitstream={nobit}, timeout={args.timeout_sec}s")
     rows = []
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        fut2job = {ex.submit(run_one, j["cmd"], j["log"], args.timeout_sec): j for j in jobs}
+        fut2job = {ex.submit(launch, j, time.perf_counter()): j for j in jobs}
         for fut in as_completed(fut2job):
             j = fut2job[fut]
             status = fut.result()
-            br, py = (None, None)
+            br, py, tenc = (None, None, None)
             try:
-                if Path(j["log"]).exists():
-                    br, py = parse_log_for_metrics(j["log"])
+                with tracer.phase(0, "parse", {"job": f"{j['exp']} {j['seq']} QP{j['qp']}"}):
+                    if resolve(j["log"]):
+                        br, py = parse_log_for_metrics(j["log"])
+                        tenc = parse_log_for_time(j["log"])
             except Exception:
                 pass
             row = {"group":j["group"], "experiment":j["exp"], "sequence":j["seq"], "qp":j["qp"],
-                   "bitrate_kbps": br, "psnrY_dB": py, "status": status, "log": j["log"]}
+                   "bitrate_kbps": br, "psnrY_dB": py, "enc_time_s": tenc, "status": status, "log": j["log"]}
             rows.append(row)
             # Progressive print
             print(f"[{status:8s}] {j['group']} | {j['exp']} | {j['seq']} | QP{j['qp']}")
 
+    if cache is not None:
+        print(cache.summary())
+
     # Write outputs
     csv_path = Path(args.csv)
-    with csv_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["group","experiment","sequence","qp","bitrate_kbps","psnrY_dB","status","log"])
+    with tracer.phase(0, "write csv"), csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["group","experiment","sequence","qp","bitrate_kbps","psnrY_dB","enc_time_s","status","log"])
         w.writeheader()
         for r in rows: w.writerow(r)
+    tracer.close()
 
     manifest = {"yaml": args.yaml, "qps": qps, "frames": frames_override, "nobitstream": nobit,
                 "jobs": jobs, "skip_baselines": list(skip_baselines), "inherit": inherit_map}
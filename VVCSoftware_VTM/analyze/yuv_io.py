@@ -0,0 +1,139 @@
+# yuv_io.py
+# Memory-mapped planar YUV reader (4:0:0 / 4:2:0 / 4:2:2 / 4:4:4, 8-bit or 10/16-bit LE).
+# Hands out zero-copy NumPy views: per frame, per frame range, with temporal stride and crop.
+# Nothing is read from disk until a view is actually touched, so 1080p/4K sources stream.
+#
+# Usage:
+#   from yuv_io import YuvReader
+#   r = YuvReader.from_seq(seq)                      # seq entry from the experiment YAML
+#   y, u, v = r.frame(0)                             # (H, W) views
+#   Y = r.plane("y", start=0, stop=32, step=4)       # (T, H, W) view, no copy
+#   python yuv_io.py BasketballPass_416x240_50.yuv --width 416 --height 240
+import argparse
+from pathlib import Path
+import numpy as np
+
+# (sub_x, sub_y) per chroma format; None = no chroma planes
+CHROMA_SUBSAMPLING = {"400": None, "420": (2, 2), "422": (2, 1), "444": (1, 1)}
+
+class YuvReader:
+    def __init__(self, path, width, height, chroma="420", bitdepth=8, frames=None):
+        self.path = str(path)
+        self.width, self.height = int(width), int(height)
+        self.chroma = str(chroma)
+        if self.chroma not in CHROMA_SUBSAMPLING:
+            raise ValueError(f"unsupported chroma format {chroma!r} (expected one of {list(CHROMA_SUBSAMPLING)})")
+        self.bitdepth = int(bitdepth)
+        self.dtype = np.dtype(np.uint8) if self.bitdepth <= 8 else np.dtype("<u2")
+
+        sub = CHROMA_SUBSAMPLING[self.chroma]
+        self.cw = self.ch = 0
+        if sub:
+            self.cw = (self.width + sub[0] - 1) // sub[0]
+            self.ch = (self.height + sub[1] - 1) // sub[1]
+        # (name, offset in samples within a frame, h, w)
+        ysz, csz = self.width * self.height, self.cw * self.ch
+        self._planes = {"y": (0, self.height, self.width)}
+        if sub:
+            self._planes["u"] = (ysz, self.ch, self.cw)
+            self._planes["v"] = (ysz + csz, self.ch, self.cw)
+        self.frame_samples = ysz + 2 * csz
+        self.frame_bytes = self.frame_samples * self.dtype.itemsize
+
+        size = Path(self.path).stat().st_size
+        n = size // self.frame_bytes
+        self.num_frames = min(n, int(frames)) if frames else n
+        self._mm = np.memmap(self.path, dtype=self.dtype, mode="r",
+                             shape=(self.num_frames * self.frame_samples,)) if self.num_frames else None
+
+    @classmethod
+    def from_seq(cls, seq, path=None, bitdepth=None):
+        """Experiment YAML entry: { name, yuv, width, height, fps, frames, [bitdepth], [chroma] }."""
+        return cls(path or seq["yuv"], seq["width"], seq["height"],
+                   chroma=str(seq.get("chroma", "420")),
+                   bitdepth=bitdepth or seq.get("bitdepth", 8),
+                   frames=None if path else seq.get("frames"))
+
+    @classmethod
+    def recon_for(cls, seq, recon_path, bitdepth=10):
+        # --ReconFile của EncoderApp ghi theo OutputBitDepth (mặc định = InternalBitDepth, CTC = 10 -> 16-bit LE)
+        return cls(recon_path, seq["width"], seq["height"], chroma=str(seq.get("chroma", "420")), bitdepth=bitdepth)
+
+    def __len__(self):
+        return self.num_frames
+
+    @property
+    def max_value(self):
+        return (1 << self.bitdepth) - 1
+
+    def plane(self, name, start=0, stop=None, step=1, crop=None):
+        """
+        Zero-copy (T, H, W) view of plane 'y'/'u'/'v' for frames range(start, stop, step).
+        crop = (x, y, w, h) in luma samples; chroma crop is scaled by the subsampling.
+        """
+        if self._mm is None:
+            raise ValueError(f"{self.path}: no complete frame")
+        if step < 1:
+            raise ValueError("temporal step must be >= 1")
+        off, h, w = self._planes[name]
+        start, stop, step = slice(start, stop, step).indices(self.num_frames)
+        t = max(0, (stop - start + step - 1) // step)
+        isz = self.dtype.itemsize
+        if t == 0:
+            # range rỗng (start >= num_frames, ...): offset có thể vượt buffer -> trả (0, h, w) thay vì lỗi strides
+            view = np.empty((0, h, w), dtype=self.dtype)
+        else:
+            view = np.ndarray(shape=(t, h, w), dtype=self.dtype, buffer=self._mm,
+                              offset=(start * self.frame_samples + off) * isz,
+                              strides=(step * self.frame_bytes, w * isz, isz))
+        if crop is not None:
+            x, y, cw, ch = crop
+            if name != "y":
+                sx, sy = CHROMA_SUBSAMPLING[self.chroma]
+                x, cw, y, ch = x // sx, cw // sx, y // sy, ch // sy
+            view = view[:, y:y + ch, x:x + cw]
+        return view
+
+    def planes(self, start=0, stop=None, step=1, crop=None):
+        return {p: self.plane(p, start, stop, step, crop) for p in self._planes}
+
+    def frame(self, i, crop=None):
+        # tuple (Y, U, V) của 1 frame; (Y,) với 4:0:0
+        return tuple(self.plane(p, i, i + 1, 1, crop)[0] for p in self._planes)
+
+    def iter_chunks(self, chunk=8, start=0, stop=None, step=1, crop=None):
+        """Yield (first_frame_index, planes dict) in chunks of `chunk` output frames."""
+        start, stop, step = slice(start, stop, step).indices(self.num_frames)
+        span = chunk * step
+        for s in range(start, stop, span):
+            yield s, self.planes(s, min(s + span, stop), step, crop)
+
+    def close(self):
+        # mapping được giải phóng khi view cuối cùng bị thu hồi
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("yuv")
+    ap.add_argument("--width", type=int, required=True)
+    ap.add_argument("--height", type=int, required=True)
+    ap.add_argument("--chroma", default="420", choices=list(CHROMA_SUBSAMPLING))
+    ap.add_argument("--bitdepth", type=int, default=8)
+    ap.add_argument("--step", type=int, default=1)
+    args = ap.parse_args()
+
+    with YuvReader(args.yuv, args.width, args.height, args.chroma, args.bitdepth) as r:
+        print(f"{r.path}: {r.num_frames} frames, {r.width}x{r.height} {r.chroma} {r.bitdepth}-bit, "
+              f"{r.frame_bytes} bytes/frame")
+        for s, pl in r.iter_chunks(chunk=16, step=args.step):
+            means = ", ".join(f"{k}={float(v.mean()):.2f}" for k, v in pl.items())
+            print(f"  frames {s}..{s + (pl['y'].shape[0] - 1) * args.step}: {means}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# yuv_metrics.py
+# Independent quality metrics from source + reconstruction YUVs (no re-encode needed):
+# PSNR per plane, SSIM / MS-SSIM / XPSNR (luma), vectorised over whole frame blocks and
+# spread across a process pool by frame chunks. Per-frame rows go next to the run.
+# --fifo: consume recon frames from a named pipe (orchestrate_vtm --recon-fifo), nothing hits disk.
+#
+# Usage:
+#   # one pair
+#   python yuv_metrics.py --src BasketballPass_416x240_50.yuv --rec rec.yuv --width 416 --height 240 --rec-bitdepth 10
+#   # whole sweep (orchestrate_vtm results.csv, recon enabled) -> <job_dir>/metrics_frames.csv + metrics_runs.csv
+#   python yuv_metrics.py --exp experiment_ablation.yaml --results runs_out_ablation\results.csv --workers 16
+#   # streaming (started by orchestrate_vtm before EncoderApp opens the pipe)
+#   python yuv_metrics.py --fifo job/recon.fifo --src seq.yuv --width 416 --height 240 --out job/metrics_frames.csv
+import argparse, csv, json, math, os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from yuv_io import YuvReader
+
+MSSSIM_WEIGHTS = np.array([0.0448, 0.2856, 0.3001, 0.2363, 0.1333])
+FRAME_FIELDS = ["frame", "psnr_y", "psnr_u", "psnr_v", "psnr_yuv", "ssim_y", "msssim_y", "xpsnr_y"]
+RUN_FIELDS = ["group", "tool", "seq", "qp", "bitrate_kbps", "frames"] + FRAME_FIELDS[1:]
+# trần số mẫu luma mỗi chunk (~2 frame 1080p, ~150 MB đỉnh cho SSIM/MS-SSIM float32) -> RAM/worker không phụ thuộc độ phân giải
+CHUNK_LUMA = 1 << 22
+
+def chunk_frames(reader, chunk):
+    return max(1, min(chunk, CHUNK_LUMA // (reader.width * reader.height)))
+
+# ------------------------- kernels (vectorised over a (T, H, W) block) -------------------------
+
+def _gauss(n=11, sigma=1.5):
+    x = np.arange(n) - (n - 1) / 2.0
+    g = np.exp(-x * x / (2 * sigma * sigma))
+    return g / g.sum()
+
+_G = _gauss()
+
+def _filt(x, g=_G):
+    # separable 'valid' Gaussian filter on the last two axes, float32, cộng dồn từng tap:
+    # bộ nhớ ~3 block (T, H, W) thay vì 1 bản copy (T, H, W-10, 11) mỗi trục
+    x = np.asarray(x, dtype=np.float32)
+    g = g.astype(np.float32)
+    n = len(g)
+    for axis in (-1, -2):
+        m = x.shape[axis] - n + 1
+        tap = lambda k: x[..., k:k + m] if axis == -1 else x[..., k:k + m, :]
+        y = tap(0) * g[0]
+        tmp = np.empty_like(y)
+        for k in range(1, n):
+            np.multiply(tap(k), g[k], out=tmp)
+            y += tmp
+        x = y
+    return x
+
+def to_common(a, bd_a, b, bd_b):
+    """Float64 copies of both blocks at the larger bit depth (left shift like VTM)."""
+    bd = max(bd_a, bd_b)
+    return a.astype(np.float64) * (1 << (bd - bd_a)), b.astype(np.float64) * (1 << (bd - bd_b)), bd
+
+def mse(a, b):
+    d = a - b
+    return (d * d).mean(axis=(-2, -1))
+
+def psnr_from_mse(m, bitdepth):
+    peak = float(255 << (bitdepth - 8))  # VTM dùng 255 << (bitDepth-8)
+    with np.errstate(divide="ignore"):
+        return np.where(m > 0, 10.0 * np.log10(peak * peak / np.maximum(m, 1e-20)), np.inf)
+
+def _ssim_terms(a, b, bitdepth):
+    L = float((1 << bitdepth) - 1)
+    c1, c2 = (0.01 * L) ** 2, (0.03 * L) ** 2
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    mu_a, mu_b = _filt(a), _filt(b)
+    mu_ab = mu_a * mu_b
+    mu_aa_bb = mu_a * mu_a; mu_aa_bb += mu_b * mu_b
+    del mu_a, mu_b
+    lum = (2 * mu_ab + c1) / (mu_aa_bb + c1)
+    # cs = (2 sab + c2) / (saa + sbb + c2), sigma tính từng cái rồi bỏ ngay
+    num = _filt(a * b); num -= mu_ab; num *= 2; num += c2
+    den = _filt(a * a); den += _filt(b * b); den -= mu_aa_bb; den += c2
+    num /= den
+    return lum, num
+
+def ssim(a, b, bitdepth):
+    if min(a.shape[-2:]) < len(_G):
+        return np.full(a.shape[:-2], np.nan)  # nhỏ hơn cửa sổ 11 tap: không định nghĩa
+    lum, cs = _ssim_terms(a, b, bitdepth)
+    return (lum * cs).mean(axis=(-2, -1))
+
+def _down2(x):
+    h, w = x.shape[-2] // 2 * 2, x.shape[-1] // 2 * 2
+    x = x[..., :h, :w]
+    return 0.25 * (x[..., 0::2, 0::2] + x[..., 1::2, 0::2] + x[..., 0::2, 1::2] + x[..., 1::2, 1::2])
+
+def msssim(a, b, bitdepth, weights=MSSSIM_WEIGHTS):
+    """MS-SSIM (Wang 2003); scales that would be smaller than the window are dropped and weights renormalised."""
+    scales = []
+    for s in range(len(weights)):
+        if min(a.shape[-2:]) < len(_G):
+            break
+        lum, cs = _ssim_terms(a, b, bitdepth)
+        scales.append(cs.mean(axis=(-2, -1)))
+        last_lum = lum.mean(axis=(-2, -1))
+        a, b = _down2(a), _down2(b)
+    if not scales:
+        return np.full(a.shape[:-2], np.nan)  # block nhỏ hơn cửa sổ ngay từ scale đầu
+    w = weights[:len(scales)] / weights[:len(scales)].sum()
+    vals = np.stack(scales[:-1] + [scales[-1] * last_lum])
+    return np.prod(np.maximum(vals, 1e-12) ** w[:, None], axis=0)
+
+def _highpass(x):
+    # 3x3 [-1 -2 -1; -2 12 -2; -1 -2 -1] ('valid'), đo độ hoạt động không gian
+    c = x[..., 1:-1, 1:-1]
+    edge = x[..., :-2, 1:-1] + x[..., 2:, 1:-1] + x[..., 1:-1, :-2] + x[..., 1:-1, 2:]
+    corner = x[..., :-2, :-2] + x[..., :-2, 2:] + x[..., 2:, :-2] + x[..., 2:, 2:]
+    return 12 * c - 2 * edge - corner
+
+def _blocks(x, b):
+    t, h, w = x.shape
+    h, w = h // b * b, w // b * b
+    return x[:, :h, :w].reshape(t, h // b, b, w // b, b)
+
+def xpsnr(a, b, bitdepth, a_prev=None):
+    """
+    XPSNR-style luma metric (Helmrich et al.): block SSE weighted by sqrt(a_pic / a_k), where a_k is the
+    block's spatial (+ temporal, if a_prev given) activity. Approximation, not bit-exact with the reference tool.
+    """
+    t, h, w = a.shape
+    bs = max(8, int(round(128 * math.sqrt(h * w / (3840 * 2160)) / 4)) * 4)
+    act = np.abs(_highpass(a))
+    act = np.pad(act, ((0, 0), (1, 1), (1, 1)), mode="edge")
+    if a_prev is not None:
+        act = act + 2 * np.abs(a - a_prev)
+    a_min = float(1 << (bitdepth - 6))
+    a_k = np.maximum(_blocks(act, bs).mean(axis=(2, 4)), a_min) ** 2
+    a_pic = np.exp(np.log(a_k).mean(axis=(1, 2), keepdims=True))
+    wk = np.sqrt(a_pic / a_k)
+    d = a - b
+    sse = _blocks(d * d, bs).sum(axis=(2, 4))
+    n = sse.shape[1] * sse.shape[2] * bs * bs
+    return psnr_from_mse((wk * sse).sum(axis=(1, 2)) / n, bitdepth)
+
+def block_metrics(src_planes, src_bd, rec_planes, rec_bd, want_ssim=True, want_msssim=True,
+                  want_xpsnr=False, src_prev_y=None):
+    """Metrics for a block of frames; plane dicts of (T, H, W) arrays. Returns dict of (T,) arrays."""
+    out, mses, npix = {}, {}, {}
+    bd = max(src_bd, rec_bd)
+    for p in src_planes:
+        a, b, _ = to_common(src_planes[p], src_bd, rec_planes[p], rec_bd)
+        mses[p] = mse(a, b); npix[p] = a.shape[-1] * a.shape[-2]
+        out[f"psnr_{p}"] = psnr_from_mse(mses[p], bd)
+        if p == "y":
+            if want_ssim: out["ssim_y"] = ssim(a, b, bd)
+            if want_msssim: out["msssim_y"] = msssim(a, b, bd)
+            if want_xpsnr:
+                prev = None if src_prev_y is None else src_prev_y.astype(np.float64) * (1 << (bd - src_bd))
+                out["xpsnr_y"] = xpsnr(a, b, bd, prev)
+    # YUV-PSNR như VTM: MSE trung bình theo số mẫu của cả 3 plane
+    tot = sum(mses[p] * npix[p] for p in mses) / sum(npix.values())
+    out["psnr_yuv"] = psnr_from_mse(tot, bd)
+    return out
+
+# ------------------------- process pool over frame chunks -------------------------
+
+def _prev_y(src, start, stop):
+    # frame trước của mỗi frame trong [start, stop) (frame 0 dùng chính nó) cho hoạt động thời gian XPSNR
+    y = src.plane("y", max(start - 1, 0), stop - 1)
+    return np.concatenate([src.plane("y", 0, 1), y]) if start == 0 else y
+
+def _chunk_job(src_spec, rec_spec, start, stop, want_ssim, want_msssim, want_xpsnr=False):
+    src = YuvReader(*src_spec); rec = YuvReader(*rec_spec)
+    m = block_metrics(src.planes(start, stop), src.bitdepth, rec.planes(start, stop), rec.bitdepth,
+                      want_ssim, want_msssim, want_xpsnr, _prev_y(src, start, stop) if want_xpsnr else None)
+    return start, {k: v.tolist() for k, v in m.items()}
+
+def compute_pair(src, rec, workers=None, chunk=4, want_ssim=True, want_msssim=True, pool=None, want_xpsnr=False):
+    """src/rec: YuvReader. Returns list of per-frame dicts (frame index = recon frame index)."""
+    n = min(len(src), len(rec))
+    chunk = chunk_frames(src, chunk)
+    spec = lambda r: (r.path, r.width, r.height, r.chroma, r.bitdepth)
+    tasks = [(spec(src), spec(rec), s, min(s + chunk, n), want_ssim, want_msssim, want_xpsnr)
+             for s in range(0, n, chunk)]
+    own = pool is None
+    if own:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    try:
+        results = list(pool.map(_chunk_job, *zip(*tasks))) if tasks else []
+    finally:
+        if own:
+            pool.shutdown()
+    rows = []
+    for start, m in sorted(results):
+        for i in range(len(m["psnr_y"])):
+            rows.append({"frame": start + i, **{k: v[i] for k, v in m.items()}})
+    return rows
+
+def stream_pair(fifo, src, rec_bitdepth=10, chunk=8, want_ssim=True, want_msssim=True, want_xpsnr=True):
+    """
+    Read recon frames from a named pipe (path or open binary file) in output order, score them against the memmapped source
+    chunk by chunk and drop them. On error keep draining so EncoderApp never blocks / gets SIGPIPE.
+    Returns (rows, error).
+    """
+    geo_dtype = np.dtype(np.uint8) if rec_bitdepth <= 8 else np.dtype("<u2")
+    chunk = chunk_frames(src, chunk)  # 1 consumer / job --recon-fifo đang chạy -> chunk bị chặn theo kích thước frame
+    n_samples = src.frame_samples
+    frame_bytes = n_samples * geo_dtype.itemsize
+    rows, err, pos = [], None, 0
+    f = open(fifo, "rb", buffering=0) if isinstance(fifo, (str, Path)) else fifo
+    with f:
+        while True:
+            buf = bytearray()
+            while len(buf) < chunk * frame_bytes:
+                b = f.read(chunk * frame_bytes - len(buf))
+                if not b: break
+                buf += b
+            t = len(buf) // frame_bytes
+            if t == 0: break
+            if err is None:
+                try:
+                    stop = min(pos + t, len(src))
+                    if stop > pos:
+                        arr = np.frombuffer(bytes(buf[:t * frame_bytes]), dtype=geo_dtype).reshape(t, n_samples)
+                        rec = {p: arr[:stop - pos, off:off + h * w].reshape(-1, h, w)
+                               for p, (off, h, w) in src._planes.items()}
+                        m = block_metrics(src.planes(pos, stop), src.bitdepth, rec, rec_bitdepth,
+                                          want_ssim, want_msssim, want_xpsnr,
+                                          _prev_y(src, pos, stop) if want_xpsnr else None)
+                        for i in range(stop - pos):
+                            rows.append({"frame": pos + i, **{k: float(v[i]) for k, v in m.items()}})
+                except Exception as e:
+                    err = f"{type(e).__name__}: {e}"
+            pos += t
+            if len(buf) < chunk * frame_bytes: break
+    return rows, err
+
+def summarize(rows):
+    # trung bình theo frame (như VTM tính PSNR trung bình); inf (lossless) bị bỏ
+    out = {}
+    for k in FRAME_FIELDS[1:]:
+        vals = [r[k] for r in rows if k in r and math.isfinite(r[k])]
+        out[k] = sum(vals) / len(vals) if vals else None
+    out["frames"] = len(rows)
+    return out
+
+def write_frames(path, rows):
+    fields = [f for f in FRAME_FIELDS if not rows or f in rows[0]]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore"); w.writeheader(); [w.writerow(r) for r in rows]
+
+# ------------------------- sweep mode -------------------------
+
+def sweep(exp, results_csv, workers, rec_bitdepth, want_ssim, want_msssim, want_xpsnr=False):
+    """Every job in orchestrate_vtm results.csv whose recon YUV exists -> metrics_frames.csv + one summary row."""
+    seqs = {s["name"]: s for s in exp["sequences"]}
+    root = Path(results_csv).parent
+    out = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, \
+         open(results_csv, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            seq = seqs.get(r["seq"])
+            if seq is None or "yuv" not in seq: continue
+            qp = int(float(r["qp"]))
+            tag = r["tool"] if r["group"] == "Baseline" else f"{r['group']}_{r['tool']}"
+            job_dir = root / f"{tag}_{seq['name']}_QP{qp}"
+            rec_path = job_dir / f"{tag}_{seq['name']}_QP{qp}.yuv"
+            if not rec_path.exists(): continue
+            rows = compute_pair(YuvReader.from_seq(seq), YuvReader.recon_for(seq, rec_path, rec_bitdepth),
+                                chunk=4, want_ssim=want_ssim, want_msssim=want_msssim, pool=pool, want_xpsnr=want_xpsnr)
+            write_frames(job_dir / "metrics_frames.csv", rows)
+            out.append({"group": r["group"], "tool": r["tool"], "seq": r["seq"], "qp": qp,
+                        "bitrate_kbps": r.get("bitrate_kbps"), **summarize(rows)})
+            print(f"[metrics] {tag} {seq['name']} QP{qp}: {len(rows)} frames")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--src"); ap.add_argument("--rec")
+    ap.add_argument("--width", type=int); ap.add_argument("--height", type=int)
+    ap.add_argument("--chroma", default="420")
+    ap.add_argument("--src-bitdepth", type=int, default=8)
+    ap.add_argument("--rec-bitdepth", type=int, default=10, help="OutputBitDepth của recon (CTC: 10)")
+    ap.add_argument("--out", default=None, help="CSV per-frame (pair mode) / summary (sweep mode)")
+    ap.add_argument("--exp", help="Experiment YAML (sweep mode)")
+    ap.add_argument("--results", help="orchestrate_vtm results.csv (sweep mode)")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--no-ssim", action="store_true")
+    ap.add_argument("--no-msssim", action="store_true")
+    ap.add_argument("--xpsnr", action="store_true", help="Thêm XPSNR (luma); luôn bật ở --fifo")
+    ap.add_argument("--fifo", help="Named pipe recon (stream mode, thay cho --rec)")
+    ap.add_argument("--frames", type=int, default=None, help="FramesToBeEncoded (stream mode)")
+    ap.add_argument("--summary-json", default=None, help="Stream mode: ghi summarize() ra JSON")
+    args = ap.parse_args()
+
+    if args.fifo:
+        # mở pipe TRƯỚC mọi thứ có thể lỗi để EncoderApp không bị treo ở open()
+        pipe = open(args.fifo, "rb", buffering=0)
+        try:
+            src = YuvReader(args.src, args.width, args.height, args.chroma, args.src_bitdepth, args.frames)
+            rows, err = stream_pair(pipe, src, args.rec_bitdepth, want_ssim=not args.no_ssim,
+                                    want_msssim=not args.no_msssim, want_xpsnr=True)
+        except Exception as e:
+            while pipe.read(1 << 20): pass
+            rows, err = [], f"{type(e).__name__}: {e}"
+        pipe.close()
+        write_frames(args.out or "metrics_frames.csv", rows)
+        summ = {**summarize(rows), "error": err}
+        if args.summary_json:
+            Path(args.summary_json).write_text(json.dumps(summ), encoding="utf-8")
+        print("[OK]" if err is None else f"[ERR] {err}", summ)
+        return
+
+    if args.exp and args.results:
+        import yaml
+        exp = yaml.safe_load(Path(args.exp).read_text(encoding="utf-8"))
+        rows = sweep(exp, args.results, args.workers, args.rec_bitdepth, not args.no_ssim, not args.no_msssim, args.xpsnr)
+        out = Path(args.out) if args.out else Path(args.results).parent / "metrics_runs.csv"
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=RUN_FIELDS, extrasaction="ignore")
+            w.writeheader(); [w.writerow(r) for r in rows]
+        print(f"[OK] {len(rows)} runs -> {out}")
+        return
+
+    if not (args.src and args.rec and args.width and args.height):
+        ap.error("pair mode needs --src --rec --width --height (or use --exp + --results)")
+    src = YuvReader(args.src, args.width, args.height, args.chroma, args.src_bitdepth)
+    rec = YuvReader(args.rec, args.width, args.height, args.chroma, args.rec_bitdepth)
+    rows = compute_pair(src, rec, args.workers, want_ssim=not args.no_ssim, want_msssim=not args.no_msssim,
+                        want_xpsnr=args.xpsnr)
+    write_frames(args.out or "metrics_frames.csv", rows)
+    print("[OK]", {k: (round(v, 4) if isinstance(v, float) else v) for k, v in summarize(rows).items()})
+
+if __name__ == "__main__":
+    main()